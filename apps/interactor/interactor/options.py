@@ -20,6 +20,27 @@ class port_spec(sb.Spec):
         return sb.integer_spec().normalise(meta, val)
 
 
+class snapshot_spec(sb.Spec):
+    """
+    The file the device finder remembers devices in, which defaults to
+    interactor_devices.json next to the configuration. An empty string means
+    devices are not remembered.
+    """
+
+    def normalise_empty(self, meta):
+        config_root = os.getcwd()
+        if "config_root" in meta.everything:
+            config_root = meta.everything["config_root"]
+
+        return os.path.join(config_root, "interactor_devices.json")
+
+    def normalise_filled(self, meta, val):
+        val = sb.string_spec().normalise(meta, val)
+        if not val:
+            return None
+        return val
+
+
 class Options(dictobj.Spec):
     host = dictobj.Field(host_spec, help="The host to serve the server on")
 
@@ -31,3 +52,9 @@ class Options(dictobj.Spec):
         ),
         help="Database options",
     )
+
+    device_finder_snapshot = dictobj.Field(
+        snapshot_spec(),
+        formatted=True,
+        help="File used to remember devices between restarts of the server",
+    )
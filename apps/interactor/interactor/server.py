@@ -49,7 +49,11 @@ class Server(Server):
         self.cleaners.append(self.db_queue.finish)
         self.db_queue.start()
 
-        self.finder = Finder(sender, final_future=self.final_future)
+        self.finder = Finder(
+            sender,
+            final_future=self.final_future,
+            snapshot_file=self.server_options.device_finder_snapshot,
+        )
         self.finder._merged_options_formattable = True
         self.cleaners.append(self.finder.finish)
 
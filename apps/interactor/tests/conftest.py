@@ -69,6 +69,8 @@ def make_options(host=None, port=None, database=None, memory=True):
     options = {}
     if database or memory:
         options = {"database": database or {"uri": ":memory:"}}
+    if memory:
+        options["device_finder_snapshot"] = ""
 
     if host is not None:
         options["host"] = host
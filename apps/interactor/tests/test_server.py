@@ -69,6 +69,7 @@ describe "Server":
         assert isinstance(server.daemon, DeviceFinderDaemon)
         assert isinstance(server.finder, Finder)
         assert server.daemon.finder is server.finder
+        assert server.finder.snapshot_file is None
 
         V.FakeCommander.assert_called_once_with(
             store,
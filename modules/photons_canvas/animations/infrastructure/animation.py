@@ -10,10 +10,13 @@ log = logging.getLogger("photons_canvas.animations.infrastructure.animation")
 
 
 class Animation:
+    frames = None
+
     every = 0.075
     retries = False
     duration = 0
     num_seconds = None
+    full_refresh = 0.5
     message_timeout = 0.3
     random_orientations = False
     skip_next_transition = False
@@ -27,6 +30,7 @@ class Animation:
         "retries",
         "duration",
         "num_seconds",
+        "full_refresh",
         "message_timeout",
         "random_orientations",
         "skip_next_transition",
@@ -54,6 +58,9 @@ class Animation:
         async def tick():
             async with self.ticker as ticks:
                 async for result in ticks:
+                    # Skip this tick if we haven't finished with the last one
+                    if self.frames is not None and not self.frames.start_frame(self):
+                        continue
                     yield result
 
         def errors(e):
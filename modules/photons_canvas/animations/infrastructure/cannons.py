@@ -79,16 +79,16 @@ class Cannon:
         raise NotImplementedError("Don't know how to make messages!")
 
     async def fire(self, ts, serial, msgs):
-        if serial not in self.writers:
-            self.writers[serial] = Writer(self.afr.found[serial][Services.UDP])
-
+        """Send these messages to this serial and return False if they were dropped"""
         if self.sem.should_drop(serial):
-            return
+            return False
 
         async for write, result in self.make_messages(serial, msgs):
             self.sem.add(serial, result)
             await write()
 
+        return True
+
 
 class FastNetworkCannon(Cannon):
     """
@@ -99,7 +99,11 @@ class FastNetworkCannon(Cannon):
     async def make_messages(self, serial, msgs):
         for msg in msgs:
             msg.update({"source": self.afr.source, "sequence": self.afr.seq(serial)})
-            yield partial(self.writers[serial].write, msg), None
+            yield partial(self.write, msg), None
+
+    async def write(self, msg):
+        with hp.just_log_exceptions(log, reraise=[asyncio.CancelledError]):
+            await self.afr.send_no_reply(msg, msg)
 
 
 class NoisyNetworkCannon(Cannon):
@@ -114,10 +118,16 @@ class NoisyNetworkCannon(Cannon):
     <inflight_limit> acks waiting to be received.
     """
 
+    def writer_for(self, serial):
+        """Return the Writer for this serial, making it the first time it's needed"""
+        if serial not in self.writers:
+            self.writers[serial] = Writer(self.afr.found[serial][Services.UDP])
+        return self.writers[serial]
+
     async def make_messages(self, serial, msgs):
         for i, msg in enumerate(msgs):
             msg.update({"source": self.afr.source, "sequence": self.afr.seq(serial)})
-            writer = self.writers[serial]
+            writer = self.writer_for(serial)
 
             t = await writer.t()
 
@@ -0,0 +1,205 @@
+"""
+Keeping animations on time.
+
+Animations tick every ``every`` seconds. If making a frame takes longer than
+that, or sending to a device can't keep up, then we skip frames rather than
+letting them queue up behind each other.
+
+The ``AnimationRunner`` has a ``FrameScheduler`` as ``runner.frames`` that
+records how long frames take to make and send.
+"""
+from photons_app import helpers as hp
+
+from contextlib import contextmanager
+import logging
+import bisect
+import time
+
+log = logging.getLogger("photons_canvas.animations.infrastructure.frames")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.075, 0.1, 0.2, 0.5, 1)
+
+
+class Histogram:
+    """
+    Counts of durations in buckets
+
+    Each bucket counts the durations that are at most that many seconds and
+    more than the previous bucket. Durations larger than the last bucket are
+    counted separately.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, duration):
+        self.counts[bisect.bisect_left(self.buckets, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    @property
+    def mean(self):
+        if not self.count:
+            return 0
+        return self.total / self.count
+
+    def as_dict(self):
+        buckets = {f"<={bucket}": count for bucket, count in zip(self.buckets, self.counts)}
+        buckets[f">{self.buckets[-1]}"] = self.counts[-1]
+        return {"count": self.count, "mean": self.mean, "max": self.max, "buckets": buckets}
+
+
+class DeviceRate:
+    """
+    How often we send frames to one device
+
+    When the cannon keeps dropping frames for this device, we send it every
+    second frame, then every fourth frame and so on up to ``max_slowdown``.
+    After ``recover_after`` frames in a row aren't dropped we send to it twice
+    as often again.
+    """
+
+    def __init__(self, slow_after, recover_after, max_slowdown):
+        self.slow_after = slow_after
+        self.max_slowdown = max_slowdown
+        self.recover_after = recover_after
+
+        self.drops = 0
+        self.sends = 0
+        self.slowdown = 1
+        self.sending = False
+        self.last_sent = None
+
+    def ready(self, every, now):
+        if self.sending:
+            return False
+        if self.last_sent is None:
+            return True
+        # Allow for frames that arrive slightly earlier than every seconds apart
+        return now - self.last_sent >= every * (self.slowdown - 0.5)
+
+    def record(self, dropped):
+        if dropped:
+            self.sends = 0
+            self.drops += 1
+            if self.drops >= self.slow_after and self.slowdown < self.max_slowdown:
+                self.drops = 0
+                self.slowdown *= 2
+                return True
+        else:
+            self.drops = 0
+            self.sends += 1
+            if self.sends >= self.recover_after and self.slowdown > 1:
+                self.sends = 0
+                self.slowdown //= 2
+                return True
+
+        return False
+
+
+class FrameScheduler:
+    """
+    Decides which frames are made and sent, and records how long they take
+
+    compute
+        A ``Histogram`` of how long it took to make each frame
+
+    send
+        A ``Histogram`` of how long it took to send a frame to a device
+
+    skipped_frames
+        How many ticks were skipped because the previous frame wasn't finished
+
+    skipped_sends
+        How many frames weren't sent to a device because it was still sending
+        the previous frame or it has been slowed down
+
+    The other options are given to the ``DeviceRate`` for each device.
+    """
+
+    def __init__(self, *, slow_after=3, recover_after=20, max_slowdown=8, buckets=DEFAULT_BUCKETS):
+        self.slow_after = slow_after
+        self.max_slowdown = max_slowdown
+        self.recover_after = recover_after
+
+        self.send = Histogram(buckets)
+        self.compute = Histogram(buckets)
+
+        self.busy = set()
+        self.devices = {}
+        self.skipped_sends = 0
+        self.skipped_frames = 0
+
+    def device(self, serial):
+        rate = self.devices.get(serial)
+        if rate is None:
+            rate = self.devices[serial] = DeviceRate(
+                self.slow_after, self.recover_after, self.max_slowdown
+            )
+        return rate
+
+    def start_frame(self, key):
+        """
+        Return whether a frame should be made for this key
+
+        This is False if the last frame for this key hasn't finished yet.
+        """
+        if key in self.busy:
+            self.skipped_frames += 1
+            return False
+        self.busy.add(key)
+        return True
+
+    def finish_frame(self, key, took=None):
+        """Record that the frame for this key is finished and how long it took to make"""
+        self.busy.discard(key)
+        if took is not None:
+            self.compute.add(took)
+
+    def should_send(self, serial, every):
+        """Return whether we should send this frame to this device"""
+        now = time.time()
+        rate = self.device(serial)
+        if not rate.ready(every, now):
+            self.skipped_sends += 1
+            return False
+
+        rate.last_sent = now
+        rate.sending = True
+        return True
+
+    @contextmanager
+    def sending(self, serial):
+        """
+        Used to wrap sending a frame to a device after ``should_send`` says yes
+
+        This yields a function to call with whether the frame was dropped.
+        """
+        rate = self.device(serial)
+        start = time.time()
+
+        def record(dropped):
+            if rate.record(dropped):
+                log.info(
+                    hp.lc("Changed how often we send to device", serial=serial, every=rate.slowdown)
+                )
+
+        try:
+            yield record
+        finally:
+            rate.sending = False
+            self.send.add(time.time() - start)
+
+    def as_dict(self):
+        return {
+            "compute": self.compute.as_dict(),
+            "send": self.send.as_dict(),
+            "skipped_frames": self.skipped_frames,
+            "skipped_sends": self.skipped_sends,
+            "slowdown": {serial: rate.slowdown for serial, rate in sorted(self.devices.items())},
+        }
@@ -9,6 +9,7 @@ from contextlib import contextmanager
 from collections import defaultdict
 import logging
 import asyncio
+import time
 import sys
 
 log = logging.getLogger("photons_canvas.infrastructure.state")
@@ -33,7 +34,8 @@ def catch_finish(reraise_exceptions=True):
 
 
 class State:
-    def __init__(self, final_future):
+    def __init__(self, final_future, frames=None):
+        self.frames = frames
         self.final_future = final_future
 
         self.state = None
@@ -91,6 +93,9 @@ class State:
             self.animation = animation
             self.background = background
 
+            if self.frames is not None:
+                self.animation.frames = self.frames
+
             self.canvas = Canvas()
             await self.add_collected(
                 [[p.clone_real_part() for p in ps] for ps in self.by_device.values()]
@@ -124,16 +129,24 @@ class State:
                             raise result.value
 
                         if result.context is AnimationEvent.Types.TICK:
-                            if not self:
-                                continue
-                            async for messages in self.send_canvas(
-                                await self.process_event(AnimationEvent.Types.TICK)
-                            ):
-                                yield messages
+                            start = time.time()
+                            try:
+                                if not self:
+                                    continue
+                                async for messages in self.send_canvas(
+                                    await self.process_event(AnimationEvent.Types.TICK)
+                                ):
+                                    yield messages
+                            finally:
+                                if self.frames is not None:
+                                    self.frames.finish_frame(self.animation, time.time() - start)
 
                         else:
                             await self.process_event(result.context, result.value)
         finally:
+            if self.frames is not None:
+                self.frames.finish_frame(self.animation)
+
             if started and not sys.exc_info()[0]:
                 with catch_finish(reraise_exceptions=False):
                     await asyncio.sleep(self.animation.every)
@@ -155,6 +168,7 @@ class State:
                 duration=self.animation.duration,
                 acks=self.animation.retries,
                 randomize=self.animation.random_orientations,
+                full_refresh=self.animation.full_refresh,
             )
         )
         yield msgs
@@ -1,3 +1,4 @@
+from photons_canvas.animations.infrastructure.frames import FrameScheduler
 from photons_canvas.animations.infrastructure.finish import Finish
 from photons_canvas.animations.run_options import make_run_options
 from photons_canvas.animations.infrastructure.state import State
@@ -29,6 +30,7 @@ class AnimationRunner:
             final_future, name="AnimationRunner::__init__[final_future]"
         )
         self.original_canvas = Canvas()
+        self.frames = FrameScheduler()
 
         self.collected = {}
 
@@ -59,7 +61,7 @@ class AnimationRunner:
         cannon = self.make_cannon()
 
         animations = self.run_options.animations_iter
-        self.combined_state = State(self.final_future)
+        self.combined_state = State(self.final_future, frames=self.frames)
 
         async with self.reinstate(), hp.TaskHolder(
             self.final_future, name="AnimationRunner::run[task_holder]"
@@ -73,7 +75,7 @@ class AnimationRunner:
                     if self.run_options.combined:
                         await self.combined_state.add_collected(collected)
                     else:
-                        state = State(self.final_future)
+                        state = State(self.final_future, frames=self.frames)
                         await state.add_collected(collected)
                         self.transfer_error(
                             ts, ts.add(self.animate(ts, cannon, state, animations)),
@@ -124,7 +126,10 @@ class AnimationRunner:
                             by_serial[msg.serial].append(msg)
 
                         for serial, msgs in by_serial.items():
-                            ts.add(cannon.fire(ts, serial, msgs))
+                            if self.frames.should_send(serial, animation.every):
+                                ts.add(self.fire(ts, cannon, state, serial, msgs))
+                            else:
+                                self.forget_sent(state, serial)
                 except asyncio.CancelledError:
                     raise
                 except Finish:
@@ -132,6 +137,19 @@ class AnimationRunner:
                 except Exception:
                     log.exception("Unexpected error running animation")
 
+    async def fire(self, ts, cannon, state, serial, msgs):
+        with self.frames.sending(serial) as record:
+            dropped = not await cannon.fire(ts, serial, msgs)
+            if dropped:
+                self.forget_sent(state, serial)
+            record(dropped=dropped)
+
+    def forget_sent(self, state, serial):
+        """Make the parts on this device send all their colours in the next frame"""
+        for part in state.canvas.parts:
+            if part.device.serial == serial:
+                part.forget_sent()
+
     async def collect_parts(self, ts):
         async with hp.tick(
             self.run_options.rediscover_every,
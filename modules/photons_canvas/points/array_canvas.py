@@ -0,0 +1,244 @@
+"""
+A canvas that keeps its colours in a numpy array.
+
+``Canvas.msgs`` calls a ``layer(point, canvas)`` function for every point on
+every frame. An ``ArrayCanvas`` instead holds a ``(height, width, 4)`` array of
+``(hue, saturation, brightness, kelvin)`` floats over the bounds of a
+``Canvas`` and knows the slice of that array that belongs to each part. This
+means an animation can make the colours for every point in one go with a
+vectorised layer.
+
+A vectorised layer is a callable with a truthy ``vectorised`` attribute that
+takes in an ``ArrayCanvas`` and returns an array with the same shape as
+``array_canvas.colors``. Points without a colour are ``nan``. For example:
+
+.. code-block:: python
+
+    from photons_canvas.points.array_canvas import vectorised
+
+
+    @vectorised
+    def layer(canvas):
+        colors = canvas.empty()
+        colors[:] = (0, 0, 1, 3500)
+        colors[..., 0] = canvas.cols() * 10 % 360
+        return colors
+
+
+    msgs = canvas.msgs(layer)
+
+Layers that take in ``(point, canvas)`` can be given to ``ArrayCanvas.msgs``
+and are used via ``PointLayer``.
+
+``Canvas.as_array`` keeps the ``ArrayCanvas`` it makes and hands it on to
+clones of the canvas until the parts on the canvas change. This means an
+animation updates the same array every frame rather than making a new one.
+
+numpy is an optional dependency of photons. ``ArrayCanvas`` will complain if
+it is used when numpy is not installed.
+"""
+from photons_canvas.points import helpers as php
+
+from photons_app.errors import PhotonsAppError
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class NumpyNotInstalled(PhotonsAppError):
+    desc = "numpy must be installed to use an ArrayCanvas"
+
+
+def vectorised(layer):
+    """Mark this layer as one that takes in an ArrayCanvas and returns an array"""
+    layer.vectorised = True
+    return layer
+
+
+class PointLayer:
+    """
+    Used to give a ``layer(point, canvas)`` function to an ``ArrayCanvas``
+
+    The layer is called once for every point in the parts on the canvas and is
+    given the ``Canvas`` that the ``ArrayCanvas`` was made from.
+    """
+
+    vectorised = True
+
+    def __init__(self, layer):
+        self.layer = layer
+
+    def __call__(self, canvas):
+        colors = canvas.empty()
+        top, left = canvas.top, canvas.left
+
+        seen = set()
+        for part in canvas.slices:
+            for point in php.Points.all_points(part.bounds):
+                if point in seen:
+                    continue
+                seen.add(point)
+
+                color = self.layer(point, canvas.canvas)
+                if color is not None:
+                    colors[top - point[1], point[0] - left] = tuple(color)
+
+        return colors
+
+
+class ArrayCanvas:
+    """
+    The colours of a ``Canvas`` in a ``(height, width, 4)`` numpy array
+
+    canvas
+        The ``Canvas`` this was made from
+
+    colors
+        The array of colours. The first row is the top of the canvas and the
+        first column is the left of the canvas. Points without a colour are
+        ``nan``.
+
+    slices
+        A dictionary of ``{part: (rows, cols)}`` where rows and cols are the
+        slices of ``colors`` that the part covers.
+
+    covered
+        A ``(height, width)`` array of booleans saying which points are in a
+        part.
+    """
+
+    def __init__(self, canvas):
+        if np is None:
+            raise NumpyNotInstalled()
+
+        self.canvas = canvas
+        self.layout = self.layout_for(canvas)
+
+        if canvas.width is None:
+            self.top, self.left, self.width, self.height = 0, 0, 0, 0
+        else:
+            self.top, self.left = canvas.top, canvas.left
+            self.width, self.height = canvas.width, canvas.height
+
+        self.slices = {part: self.slice_for(part.bounds) for part in canvas.parts}
+
+        self.covered = np.zeros(self.shape[:2], dtype=bool)
+        for rows, cols in self.slices.values():
+            self.covered[rows, cols] = True
+
+        self.colors = self.empty()
+        for point, color in canvas.points.items():
+            index = self.index(point)
+            if index is not None and color is not None:
+                self.colors[index] = tuple(color)
+
+    @classmethod
+    def layout_for(kls, canvas):
+        """Return what an ``ArrayCanvas`` for this canvas depends on"""
+        return canvas.bounds, [(id(part), part.bounds) for part in canvas.parts]
+
+    def fits(self, canvas):
+        """Return whether this can hold the colours for this canvas"""
+        return self.layout == self.layout_for(canvas)
+
+    @property
+    def shape(self):
+        return (self.height, self.width, 4)
+
+    def empty(self):
+        """Return an array the shape of this canvas without any colours"""
+        return np.full(self.shape, np.nan)
+
+    def cols(self):
+        """Return an array of the column for every point, in the shape of the canvas"""
+        return np.broadcast_to(np.arange(self.left, self.left + self.width), self.shape[:2])
+
+    def rows(self):
+        """Return an array of the row for every point, in the shape of the canvas"""
+        rows = np.arange(self.top, self.top - self.height, -1)
+        return np.broadcast_to(rows[:, None], self.shape[:2])
+
+    def index(self, point):
+        """Return ``(row, col)`` in ``colors`` for this point or None if it's outside the canvas"""
+        row = self.top - point[1]
+        col = point[0] - self.left
+        if 0 <= row < self.height and 0 <= col < self.width:
+            return row, col
+
+    def slice_for(self, bounds):
+        """Return ``(rows, cols)`` slices of ``colors`` for these bounds"""
+        (l, r), (t, b), _ = bounds
+        return (
+            slice(self.top - t, self.top - b),
+            slice(l - self.left, r - self.left),
+        )
+
+    def part_colors(self, part, colors=None):
+        """
+        Return the colours for this part as a ``(points, 4)`` array in the same
+        order as ``part.points``
+        """
+        if colors is None:
+            colors = self.colors
+        return colors[self.slices[part]].reshape(-1, 4)
+
+    def msgs(self, layer, acks=False, duration=1, randomize=False, onto=None, full_refresh=0.5):
+        """
+        Put the colours that the layer makes into ``colors`` and return
+        messages for them
+
+        If the layer is not vectorised then it's used with ``PointLayer``.
+
+        If onto is an ``ArrayCanvas`` then its colors are replaced with the
+        colours from the layer. Otherwise if onto is not None, it is treated
+        as a dictionary of ``{point: color}`` and is given the colours for the
+        points in each part. If onto is the points of our canvas then it is
+        only given the colours that have changed.
+        """
+        if not getattr(layer, "vectorised", False):
+            layer = PointLayer(layer)
+
+        colors = np.asarray(layer(self), dtype=float)
+        if colors.shape != self.shape:
+            raise PhotonsAppError(
+                "Expected layer to return an array the shape of the canvas",
+                want=self.shape,
+                got=colors.shape,
+            )
+
+        if isinstance(onto, ArrayCanvas):
+            if onto is not self:
+                onto.colors[...] = colors
+        elif onto is not None:
+            changed = self.covered
+            if onto is self.canvas.points and colors is not self.colors:
+                different = (colors != self.colors) & ~(np.isnan(colors) & np.isnan(self.colors))
+                changed = changed & different.any(axis=-1)
+
+            rows, cols = np.nonzero(changed)
+            for x, y, (h, s, b, k) in zip(
+                (cols + self.left).tolist(), (self.top - rows).tolist(), colors[changed].tolist()
+            ):
+                onto[x, y] = None if h != h else (h, s, b, int(k))
+
+        if colors is not self.colors:
+            self.colors[...] = colors
+
+        msgs = []
+
+        for part in self.slices:
+            # The part remembers these colours, so give it a copy rather than a view
+            # that changes with the next frame
+            for msg in part.msgs(
+                self.part_colors(part).copy(),
+                acks=acks,
+                duration=duration,
+                randomize=randomize,
+                force=False,
+                full_refresh=full_refresh,
+            ):
+                msgs.append(msg)
+
+        return msgs
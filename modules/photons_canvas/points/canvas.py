@@ -1,3 +1,4 @@
+from photons_canvas.points.array_canvas import ArrayCanvas
 from photons_canvas.points import helpers as php
 
 from delfick_project.norms import sb
@@ -8,6 +9,7 @@ class Canvas:
     def __init__(self):
         self._parts = {}
         self._devices = {}
+        self._array = None
 
         self.points = {}
         self._update_bounds(self.points)
@@ -22,6 +24,7 @@ class Canvas:
         return self.points.get(point)
 
     def __setitem__(self, point, color):
+        self._array = None
         contained = point in self.points
         self.points[point] = color
 
@@ -32,6 +35,7 @@ class Canvas:
         if point not in self.points:
             return
 
+        self._array = None
         del self.points[point]
         self._update_bounds({})
         self._update_bounds([p.bounds for p in self._parts] + list(self.points))
@@ -62,6 +66,9 @@ class Canvas:
         new.point_to_parts.update(self.point_to_parts)
         new.point_to_devices.update(self.point_to_devices)
 
+        # The clone carries on with our array so it isn't made again every frame
+        new._array, self._array = self._array, None
+
         if self.width is not None:
             new._update_bounds([self.bounds])
 
@@ -138,7 +145,27 @@ class Canvas:
                 cs = part.real_part.original_colors
                 yield from part.real_part.msgs(cs, duration=duration, force=True)
 
-    def msgs(self, layer, acks=False, duration=1, randomize=False, onto=None):
+    def as_array(self):
+        if self._array is None or not self._array.fits(self):
+            self._array = ArrayCanvas(self)
+        else:
+            self._array.canvas = self
+        return self._array
+
+    def msgs(self, layer, acks=False, duration=1, randomize=False, onto=None, full_refresh=0.5):
+        if getattr(layer, "vectorised", False):
+            return self.as_array().msgs(
+                layer,
+                acks=acks,
+                duration=duration,
+                randomize=randomize,
+                onto=onto,
+                full_refresh=full_refresh,
+            )
+
+        if onto is self.points:
+            self._array = None
+
         msgs = []
 
         for part in self._parts:
@@ -152,7 +179,12 @@ class Canvas:
                     onto[point] = c
 
             for msg in part.msgs(
-                cs, acks=acks, duration=duration, randomize=randomize, force=False
+                cs,
+                acks=acks,
+                duration=duration,
+                randomize=randomize,
+                force=False,
+                full_refresh=full_refresh,
             ):
                 msgs.append(msg)
 
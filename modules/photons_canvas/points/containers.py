@@ -4,13 +4,68 @@ from photons_canvas.points import helpers as php
 
 from photons_messages import LightMessages
 
+import functools
 import itertools
 import random
 import time
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 NO_MESSAGES = ()
 
 
+def is_array(colors):
+    """Return whether these colours are a numpy array"""
+    return np is not None and isinstance(colors, np.ndarray)
+
+
+@functools.lru_cache(maxsize=None)
+def reorient_order(orientation, length):
+    """Return an array of indexes that reorients an array of this many colours"""
+    return np.array(reorient(range(length), orientation))
+
+
+def changed_rectangle(colors, previous, width):
+    """
+    Return ``(x, y, width, height)`` of the smallest rectangle that covers
+    every colour that is different between these two lists of colours for a
+    grid that is ``width`` wide.
+
+    Return None if there are no differences.
+    """
+    if is_array(colors):
+        different = (colors != previous) & ~(np.isnan(colors) & np.isnan(previous))
+        indexes = np.flatnonzero(different.any(axis=-1))
+        if not len(indexes):
+            return None
+
+        xs, ys = indexes % width, indexes // width
+        left, right = int(xs.min()), int(xs.max())
+        return left, int(ys[0]), right - left + 1, int(ys[-1] - ys[0]) + 1
+
+    left = top = right = bottom = None
+
+    for i, (c1, c2) in enumerate(zip(colors, previous)):
+        if c1 == c2:
+            continue
+
+        x, y = i % width, i // width
+        if left is None:
+            left, right, top, bottom = x, x, y, y
+        else:
+            left = min(left, x)
+            right = max(right, x)
+            bottom = y
+
+    if left is None:
+        return None
+
+    return left, top, right - left + 1, bottom - top + 1
+
+
 class Part:
     def __init__(
         self,
@@ -38,6 +93,7 @@ class Part:
         self._hash = hash(self._key)
 
         self.last_msgs = []
+        self._sent_colors = None
 
         self._set_64 = Set64(
             x=0,
@@ -77,6 +133,17 @@ class Part:
     def __repr__(self):
         return f"<Part ({self.device.serial},{self.part_number})>"
 
+    @property
+    def colors(self):
+        colors = self._colors
+        if is_array(colors):
+            return [None if h != h else (h, s, b, int(k)) for h, s, b, k in colors.tolist()]
+        return colors
+
+    @colors.setter
+    def colors(self, value):
+        self._colors = value
+
     @property
     def original_colors(self):
         return self._original_colors
@@ -84,7 +151,7 @@ class Part:
     @original_colors.setter
     def original_colors(self, value):
         self._original_colors = value
-        if value is not None and self.colors is None:
+        if value is not None and self._colors is None:
             self.colors = list(value)
 
     def clone_real_part(self):
@@ -148,45 +215,131 @@ class Part:
         if randomize:
             o = self.random_orientation
 
+        if is_array(colors):
+            if o in (Orientation.RightSideUp, Orientation.FaceUp, Orientation.FaceDown):
+                return colors
+            return colors[reorient_order(o, len(colors))]
+
         return reorient(colors, o)
 
-    def msgs(self, colors, *, acks=False, duration=1, randomize=False, force=True):
-        forced = False
-        if time.time() > self.next_force_send:
-            if self.colors is not None:
-                diff = any(c1 != c2 for c1, c2 in itertools.zip_longest(colors, self.colors))
-                if not diff:
-                    diff = True
-                    forced = True
-            else:
-                diff = True
-                forced = True
+    def msgs(
+        self, colors, *, acks=False, duration=1, randomize=False, force=True, full_refresh=0.5
+    ):
+        """
+        Return messages for showing these colours on this part.
+
+        We remember the colours we last returned messages for. If these are the
+        same then we return no messages unless it's been ``full_refresh``
+        seconds since we last sent all the colours, or force is True. If those
+        messages don't get sent then call ``forget_sent`` so the next call
+        returns all the colours.
+
+        For tiles, if only some of the colours have changed, then we return a
+        Set64 for the smallest rectangle that covers those changes. These don't
+        delay the next time we send all the colours.
+
+        The colours may be a list of ``(h, s, b, k)`` or None, or a
+        ``(points, 4)`` numpy array where points without a colour are ``nan``.
+        """
+        now = time.time()
+        previous = self._sent_colors
+        self.colors = colors
 
-        elif self.colors is None or force:
-            diff = True
-            forced = True
+        if previous is not None and is_array(colors) != is_array(previous):
+            previous = None
 
+        full = force or previous is None or now > self.next_force_send
+        if previous is None:
+            changed = True
+        elif is_array(colors):
+            changed = not np.array_equal(colors, previous, equal_nan=True)
         else:
-            diff = any(c1 != c2 for c1, c2 in itertools.zip_longest(colors, self.colors))
+            changed = any(c1 != c2 for c1, c2 in itertools.zip_longest(colors, previous))
 
-        self.colors = colors
+        if not full and not changed:
+            return NO_MESSAGES
 
-        if diff or forced:
-            self.next_force_send = time.time() + 0.5
+        if not full:
+            msgs = self._delta_msgs(
+                colors, previous, acks=acks, duration=duration, randomize=randomize
+            )
+            if msgs is not None:
+                # last_msgs no longer represents what is on the device
+                self.last_msgs = []
+                self._sent_colors = colors
+                return msgs
 
-        if not diff:
-            return NO_MESSAGES
+        self.next_force_send = now + full_refresh
 
-        if (diff and not forced) or not self.last_msgs:
+        if changed or not self.last_msgs:
             self.last_msgs = self._msgs(colors, acks=acks, duration=duration, randomize=randomize)
 
+        self._sent_colors = colors
         return self.last_msgs
 
+    def forget_sent(self):
+        """
+        Forget the colours we last made messages for
+
+        For when those messages were skipped or dropped, so that the next call
+        to ``msgs`` sends all the colours rather than a delta from colours the
+        device never got.
+        """
+        self.last_msgs = []
+        self._sent_colors = None
+        self.next_force_send = 0
+
+    def _delta_msgs(self, colors, previous, acks=False, duration=1, randomize=False):
+        """
+        Return a Set64 for the rectangle of this tile that has changed
+
+        Or None if this isn't a tile or the whole tile has changed.
+
+        The tile applies every colour in a Set64 from x/y in rows of width, so
+        we fill the message with the current colours for every row from the
+        top of the rectangle to the bottom of the tile. Otherwise the pixels
+        below the rectangle would be set to the padding in the message.
+        """
+        if not self.device.cap.has_matrix or len(colors) != len(previous):
+            return None
+
+        colors = self.reorient(colors, randomize=randomize)
+        previous = self.reorient(previous, randomize=randomize)
+
+        rect = changed_rectangle(colors, previous, self.width)
+        if rect is None:
+            return NO_MESSAGES
+
+        x, y, width, height = rect
+        if width * height >= len(colors):
+            return None
+
+        bottom = len(colors) // self.width
+
+        if is_array(colors):
+            rows = colors.reshape(-1, self.width, 4)
+            cs = rows[y:bottom, x : x + width].reshape(-1, 4)
+        else:
+            cs = [
+                colors[row * self.width + col]
+                for row in range(y, bottom)
+                for col in range(x, x + width)
+            ]
+
+        kwargs = {"x": x, "y": y, "width": width, "colors": cs}
+
+        if duration != 0:
+            kwargs["duration"] = duration
+        if acks:
+            kwargs["acks"] = acks
+
+        msg = self._set_64.clone()
+        msg.update(kwargs)
+        return (msg,)
+
     def _msgs(self, colors, acks=False, duration=1, randomize=False):
         if self.device.cap.has_matrix:
-            colors = [
-                c if c is not None else None for c in self.reorient(colors, randomize=randomize)
-            ]
+            colors = self.reorient(colors, randomize=randomize)
 
             kwargs = {"colors": colors}
             if duration != 0:
@@ -203,8 +356,16 @@ class Part:
                 self.device.serial, self.device.cap, colors, duration=duration
             ).msgs
 
-        elif colors:
-            if isinstance(colors[0], tuple):
+        elif len(colors):
+            if is_array(colors):
+                h, s, b, k = np.nan_to_num(colors[0]).tolist()
+                info = {
+                    "hue": h,
+                    "saturation": s,
+                    "brightness": b,
+                    "kelvin": int(k),
+                }
+            elif isinstance(colors[0], tuple):
                 h, s, b, k = colors[0]
                 info = {
                     "hue": h,
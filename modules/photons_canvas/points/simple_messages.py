@@ -7,9 +7,13 @@ messages every 0.075 seconds we can't make them fast enough.
 
 This file contains a more manual implementation of the Set64 message that tries
 to be as efficient as possible to allow us to keep up with the animation.
+
+If numpy is installed, colours are turned into bytes for many colours at once
+with ``encode_colors``.
 """
 from photons_messages import TileMessages, MultiZoneMessages
 from photons_protocol.packing import PacketPacking
+from photons_protocol.codec import PacketCodec
 from photons_messages.fields import Color
 
 from delfick_project.norms import sb
@@ -18,6 +22,11 @@ import binascii
 import bitarray
 import struct
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 ColorCache = LRU(0xFFFF)
 
 TargetCache = LRU(1000)
@@ -63,21 +72,21 @@ def fill(color):
     elif h >= 0xFFFF:
         hb = FULL
     else:
-        hb = uint16_packer.pack(int(0xFFFF * (h / 360)))
+        hb = uint16_packer.pack(min(0xFFFF, int(0xFFFF * (h / 360))))
 
     if s <= 0:
         sb = ZERO
     elif s >= 0xFFFF:
         sb = FULL
     else:
-        sb = uint16_packer.pack(int(0xFFFF * s))
+        sb = uint16_packer.pack(min(0xFFFF, int(0xFFFF * s)))
 
     if b <= 0:
         bb = ZERO
     elif b >= 0xFFFF:
         bb = FULL
     else:
-        bb = uint16_packer.pack(int(0xFFFF * b))
+        bb = uint16_packer.pack(min(0xFFFF, int(0xFFFF * b)))
 
     if k <= 0:
         kb = ZERO
@@ -91,6 +100,44 @@ def fill(color):
     return c
 
 
+if np is not None:
+    ENCODE_DIVIDE = np.array([360, 1, 1, 1], dtype=float)
+    ENCODE_MULTIPLY = np.array([0xFFFF, 0xFFFF, 0xFFFF, 1], dtype=float)
+
+
+def encode_colors(colors, count=None):
+    """
+    Return the bytes for these ``(h, s, b, k)`` colours as a list of ``Color``
+    fields, with the same rules as ``fill``.
+
+    colors may be a list of tuples and None, or a ``(n, 4)`` numpy array where
+    rows that are ``nan`` are None. If count is given then the result is padded
+    with empty colours to that many colours.
+
+    If numpy isn't installed then this uses ``fill`` for each colour.
+    """
+    if np is None:
+        bts = b"".join(fill(color) for color in colors)
+        if count is not None:
+            bts = bts.ljust(count * 8, b"\x00")
+        return bts
+
+    if isinstance(colors, np.ndarray):
+        arr = np.nan_to_num(colors.reshape(-1, 4).astype(float), nan=0, copy=False)
+    else:
+        arr = np.array([(0, 0, 0, 0) if c is None else c for c in colors], dtype=float)
+        arr = arr.reshape(-1, 4)
+
+    arr /= ENCODE_DIVIDE
+    arr *= ENCODE_MULTIPLY
+    np.clip(arr, 0, 0xFFFF, out=arr)
+
+    bts = arr.astype("<u2").tobytes()
+    if count is not None:
+        bts = bts.ljust(count * 8, b"\x00")
+    return bts
+
+
 class Empty:
     pass
 
@@ -359,10 +406,7 @@ class Set64:
 
     @colors.setter
     def colors(self, colors):
-        b = b""
-        for color in colors:
-            b += fill(color)
-        self.payload[10 : 10 + len(colors) * 8] = b
+        self.payload[10 : 10 + len(colors) * 8] = encode_colors(colors)
 
 
 class MultizoneMessagesMaker:
@@ -380,10 +424,17 @@ class MultizoneMessagesMaker:
         else:
             yield from self.make_old_messages()
 
+    def is_array(self):
+        return np is not None and isinstance(self.colors, np.ndarray)
+
     def make_old_messages(self):
-        if not self.colors:
+        if not len(self.colors):
             return
 
+        colors = self.colors
+        if self.is_array():
+            colors = [(h, s, b, int(k)) for h, s, b, k in np.nan_to_num(colors).tolist()]
+
         end = self.zone_index
         start = self.zone_index
 
@@ -391,7 +442,7 @@ class MultizoneMessagesMaker:
 
         sections = []
 
-        for i, color in enumerate(self.colors):
+        for i, color in enumerate(colors):
             i = i + self.zone_index
 
             if current is Empty:
@@ -430,11 +481,29 @@ class MultizoneMessagesMaker:
         return msgs
 
     def make_new_messages(self):
-        if not self.colors:
+        if not len(self.colors):
             return
 
+        if len(self.colors) <= 82 and (
+            self.is_array()
+            or not any(isinstance(c, dict) or getattr(c, "is_dict", False) for c in self.colors)
+        ):
+            msg = MultiZoneMessages.SetExtendedColorZones(
+                duration=self.duration,
+                colors_count=len(self.colors),
+                target=self.serial,
+                zone_index=self.zone_index,
+                ack_required=True,
+                res_required=False,
+            )
+
+            # Give the packet the bytes for all the colours rather than a Color per zone
+            codec = PacketCodec.for_kls(MultiZoneMessages.SetExtendedColorZones)
+            codec.set_raw(msg, "colors", encode_colors(self.colors, count=82))
+            return (msg,)
+
         colors = []
-        for c in self.colors:
+        for c in np.nan_to_num(self.colors).tolist() if self.is_array() else self.colors:
             if isinstance(c, dict) or getattr(c, "is_dict", False):
                 colors.append(c)
             else:
@@ -453,4 +522,4 @@ class MultizoneMessagesMaker:
         )
 
 
-__all__ = ["Set64", "MultizoneMessagesMaker"]
+__all__ = ["Set64", "MultizoneMessagesMaker", "encode_colors"]
@@ -8,17 +8,19 @@ from photons_control.script import FromGenerator
 from photons_products import Products
 
 from delfick_project.norms import dictobj, sb, Meta, BadSpecValue
+from collections import defaultdict
 from urllib.parse import parse_qs
 from functools import partial
 import traceback
-import itertools
 import binascii
 import logging
 import fnmatch
 import asyncio
+import random
 import json
 import time
 import enum
+import os
 import re
 
 log = logging.getLogger("photons_control.device_finder")
@@ -160,6 +162,137 @@ class Collections:
         return collection
 
 
+class DeviceIndex:
+    """
+    Inverted indexes from the values of device properties to the serials of
+    the devices that have those values.
+
+    Devices update this when they are given a packet in ``set_from_pkt`` so
+    that the ``Finder`` can find devices that match a filter with set
+    operations rather than checking every device.
+
+    Group and location names aren't indexed because the name of a collection
+    can change from a packet for any device, so those are found by looking up
+    the matching collections in ``collections``.
+    """
+
+    fields = (
+        "label",
+        "power",
+        "group_id",
+        "location_id",
+        "firmware_version",
+        "product_id",
+        "product_identifier",
+        "cap",
+    )
+
+    def __init__(self, collections):
+        self.values = {}
+        self.collections = collections
+        self.index = {field: defaultdict(set) for field in self.fields}
+
+    def update(self, device):
+        """Make the index reflect the current properties on this device"""
+        serial = device.serial
+        old = self.values.get(serial, {})
+        new = self.values[serial] = {}
+
+        for field in self.fields:
+            val = device[field]
+            if val is sb.NotSpecified:
+                vals = ()
+            elif field == "cap":
+                vals = tuple(val)
+            else:
+                vals = (val,)
+
+            new[field] = vals
+            previous = old.get(field, ())
+            if previous != vals:
+                self._remove(field, serial, previous)
+                for v in vals:
+                    self.index[field][v].add(serial)
+
+    def remove(self, serial):
+        """Forget this device"""
+        for field, vals in self.values.pop(serial, {}).items():
+            self._remove(field, serial, vals)
+
+    def looks_up(self, field):
+        """Say whether ``matching`` uses this field"""
+        return field in ("serial", "group_name", "location_name") or field in self.index
+
+    def unindexed_fields(self, fltr):
+        """
+        Return the fields on this filter that ``matching`` doesn't use, or None
+        if ``matching`` doesn't use any of the fields on this filter.
+
+        Devices from ``matching`` must still be checked against these fields
+        with ``device.matches_fltr(fltr, fields=unindexed)``.
+        """
+        fields = [
+            field
+            for field in fltr.fields
+            if field not in ("refresh_info", "refresh_discovery") and fltr.has(field)
+        ]
+        unindexed = [field for field in fields if not self.looks_up(field)]
+        if len(unindexed) == len(fields):
+            return None
+        return unindexed
+
+    def matching(self, fltr):
+        """
+        Return the serials with values that match all the fields on this filter
+        that we can look up.
+
+        Fields that aren't indexed, like hue, are not considered. See
+        ``unindexed_fields``.
+        """
+        result = set(self.values)
+
+        for field in fltr.fields:
+            if field in ("refresh_info", "refresh_discovery") or not fltr.has(field):
+                continue
+            if not self.looks_up(field):
+                continue
+
+            wanted = fltr[field]
+
+            if field == "serial":
+                serials = set(wanted)
+            elif field in ("group_name", "location_name"):
+                typ = field[: -len("_name")]
+                serials = set()
+                for uuid, collection in self.collections.collections[typ].items():
+                    if any(fnmatch.fnmatch(collection.name, pat) for pat in wanted):
+                        serials.update(self.index[f"{typ}_id"].get(uuid, ()))
+            elif field in fltr.label_fields:
+                serials = set()
+                for val, found in self.index[field].items():
+                    if type(val) is str and any(fnmatch.fnmatch(val, pat) for pat in wanted):
+                        serials.update(found)
+            else:
+                serials = set()
+                for val in wanted:
+                    serials.update(self.index[field].get(val, ()))
+
+            result &= serials
+            if not result:
+                break
+
+        return result
+
+    def _remove(self, field, serial, vals):
+        index = self.index[field]
+        for v in vals:
+            found = index.get(v)
+            if found is not None:
+                found.discard(serial)
+                if not found:
+                    del index[v]
+
+
 class boolean(sb.Spec):
     """Take in int/string/bool and convert to a boolean"""
 
@@ -473,6 +606,22 @@ class InfoPoints(enum.Enum):
     LOCATION = Point(DeviceMessages.GetLocation(), ["location_id", "location_name"], 60)
 
 
+def refreshes_from(time_between_queries):
+    """
+    Return ``{point: refresh}`` for each InfoPoints using the refresh in
+    time_between_queries if it has one for that point.
+    """
+    time_between_queries = time_between_queries or {}
+
+    refreshes = {}
+    for e in InfoPoints:
+        if e.value.refresh is None:
+            refreshes[e] = None
+        else:
+            refreshes[e] = time_between_queries.get(e.name, e.value.refresh)
+    return refreshes
+
+
 class Device(dictobj.Spec):
     """
     An object representing a single device.
@@ -510,7 +659,7 @@ class Device(dictobj.Spec):
         self.point_futures[None] = hp.ResettableFuture(
             name=f"Device::setup({self.serial})[point_futures.None]"
         )
-        self.refreshing = hp.ResettableFuture(name=f"Device({self.serial})::[refreshing]")
+        self.index = None
 
     @hp.memoized_property
     def final_future(self):
@@ -557,13 +706,23 @@ class Device(dictobj.Spec):
     def info(self):
         return {k: v for k, v in self.as_dict().items() if v is not sb.NotSpecified}
 
-    def matches_fltr(self, fltr):
+    def matches_fltr(self, fltr, fields=None):
         """
         Say whether we match against the provided filter
+
+        If ``fields`` is given then only those fields are checked because the
+        other fields on the filter are already known to match.
         """
         if fltr.matches_all:
             return True
 
+        if fields is not None:
+            for field in fields:
+                val = self[field]
+                if val is not sb.NotSpecified and not fltr.matches(field, val):
+                    return False
+            return True
+
         fields = [f for f in self.fields if f != "limit"] + self.property_fields
         has_atleast_one_field = False
 
@@ -585,8 +744,37 @@ class Device(dictobj.Spec):
         collections is used for determining the group/location based on the pkt.
 
         We return a InfoPoints enum representing what type of information was set.
+        This is None if the packet only had some of the information for a point.
+
+        If the device has an ``index`` then it is updated with the new values.
+        """
+        point = self._set_from_pkt(pkt, collections)
+        if self.index is not None:
+            self.index.update(self)
+        return point
+
+    def knows(self, fltr):
+        """
+        Say whether we have all the information for the keys on this filter
+        and so may use matches_fltr without asking the device for anything
         """
-        if pkt | LightMessages.LightState:
+        if fltr.refresh_info:
+            return False
+
+        for e in InfoPoints:
+            if any(fltr.has(key) for key in e.value.keys):
+                if not self.point_futures[e].done():
+                    return False
+        return True
+
+    def _set_from_pkt(self, pkt, collections):
+        if pkt | DeviceMessages.StateLabel:
+            self.label = pkt.label
+
+        elif pkt | DeviceMessages.StatePower or pkt | LightMessages.StateLightPower:
+            self.power = "off" if pkt.level == 0 else "on"
+
+        elif pkt | LightMessages.LightState:
             self.label = pkt.label
             self.power = "off" if pkt.power == 0 else "on"
             self.hue = pkt.hue
@@ -642,62 +830,6 @@ class Device(dictobj.Spec):
         self.final_future.cancel()
         del self.final_future
 
-    async def refresh_information_loop(self, sender, time_between_queries, collections):
-        if self.refreshing.done():
-            return
-
-        self.refreshing.reset()
-        self.refreshing.set_result(True)
-        try:
-            await self._refresh_information_loop(sender, time_between_queries, collections)
-        finally:
-            self.refreshing.reset()
-
-    async def _refresh_information_loop(self, sender, time_between_queries, collections):
-        points = iter(itertools.cycle(list(InfoPoints)))
-
-        time_between_queries = time_between_queries or {}
-
-        refreshes = {}
-        for e in InfoPoints:
-            if e.value.refresh is None:
-                refreshes[e] = None
-            else:
-                refreshes[e] = time_between_queries.get(e.name, e.value.refresh)
-
-        async def gen(reference, sender, **kwargs):
-            async with hp.tick(
-                1,
-                final_future=self.final_future,
-                name=f"Device({self.serial})::refresh_information_loop[tick]",
-            ) as ticks:
-                async for info in ticks:
-                    if self.final_future.done():
-                        return
-
-                    e = next(points)
-                    fut = self.point_futures[e]
-
-                    if fut.done():
-                        refresh = refreshes[e]
-                        if refresh is None:
-                            continue
-
-                        if time.time() - fut.result() < refresh:
-                            continue
-
-                    if self.serial not in sender.found:
-                        break
-
-                    t = yield e.value.msg
-                    await t
-
-        msg = FromGenerator(gen, reference_override=self.serial)
-        async for pkt in sender(msg, self.serial, limit=self.limit, find_timeout=5):
-            point = self.set_from_pkt(pkt, collections)
-            self.point_futures[point].reset()
-            self.point_futures[point].set_result(time.time())
-
     async def matches(self, sender, fltr, collections):
         if fltr is None:
             return True
@@ -729,8 +861,12 @@ class DeviceFinderDaemon:
         final_future=None,
         search_interval=20,
         time_between_queries=None,
+        refresh_jitter=0.5,
+        snapshot_interval=60,
     ):
         self.sender = sender
+        self.refresh_jitter = refresh_jitter
+        self.snapshot_interval = snapshot_interval
         self.search_interval = search_interval
         self.time_between_queries = time_between_queries
 
@@ -759,6 +895,9 @@ class DeviceFinderDaemon:
 
     async def start(self):
         self.ts.add(self.search_loop())
+        self.ts.add(self.refresh_loop())
+        if getattr(self.finder, "snapshot_file", None):
+            self.ts.add(self.snapshot_loop())
 
     async def finish(self):
         self.final_future.cancel()
@@ -777,12 +916,7 @@ class DeviceFinderDaemon:
             refreshing.set_result(True)
 
             async for device in self.finder.find(refresh_discovery_fltr):
-                await streamer.add_coroutine(
-                    device.refresh_information_loop(
-                        self.sender, self.time_between_queries, self.finder.collections
-                    ),
-                    context=device,
-                )
+                pass
 
         async def ticks():
             async with self.hp_tick(self.search_interval, final_future=self.final_future) as ticks:
@@ -804,6 +938,37 @@ class DeviceFinderDaemon:
                     refreshing.reset()
                     await streamer.add_coroutine(add(streamer))
 
+    async def refresh_loop(self):
+        """
+        Every second ask the finder to refresh any information that is stale.
+
+        Replies to messages sent by anything using this sender also update
+        our devices, so we only ask for information nothing else has asked for
+        recently.
+        """
+        async with hp.tick(
+            1, final_future=self.final_future, name="DeviceFinderDaemon::refresh_loop[tick]"
+        ) as ticks:
+            async for _ in ticks:
+                try:
+                    await self.finder.refresh_stale(
+                        self.time_between_queries, jitter=self.refresh_jitter
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    log.exception("Failed to refresh information")
+
+    async def snapshot_loop(self):
+        """Save a snapshot of the finder every snapshot_interval seconds"""
+        async with hp.tick(
+            self.snapshot_interval,
+            final_future=self.final_future,
+            name="DeviceFinderDaemon::snapshot_loop[tick]",
+        ) as ticks:
+            async for _ in ticks:
+                self.finder.save_snapshot()
+
     async def serials(self, fltr):
         async for device in self.finder.find(fltr):
             yield device
@@ -814,9 +979,35 @@ class DeviceFinderDaemon:
 
 
 class Finder:
-    def __init__(self, sender, final_future=None, *, forget_after=30, limit=30):
+    """
+    Finds devices and information about them.
+
+    If ``snapshot_file`` is given then the devices in that file are loaded
+    when the finder is made, and ``save_snapshot`` writes our devices to it.
+    Loaded devices keep the times their information was last updated, and so
+    their information is used straight away but refreshed once it's stale.
+    """
+
+    snapshot_version = 1
+
+    # The fields on Device that are saved in a snapshot
+    snapshot_fields = (
+        "label",
+        "power",
+        "hue",
+        "saturation",
+        "brightness",
+        "kelvin",
+        "firmware_version",
+        "product_id",
+        "product_identifier",
+        "cap",
+    )
+
+    def __init__(self, sender, final_future=None, *, forget_after=30, limit=30, snapshot_file=None):
         self.sender = sender
         self.forget_after = forget_after
+        self.snapshot_file = snapshot_file
 
         self.limit = limit
         if isinstance(self.limit, int):
@@ -824,12 +1015,159 @@ class Finder:
 
         self.devices = {}
         self.last_seen = {}
+        self.refresh_due = {}
         self.searched = hp.ResettableFuture(name="Finder::__init__[searched]")
         self.collections = Collections()
+        self.index = DeviceIndex(self.collections)
         self.final_future = hp.ChildOfFuture(
             final_future or self.sender.stop_fut, name="Finder::__init__[final_future]"
         )
 
+        # Learn from every reply the sender gets, not just the ones we ask for
+        self.receiver = getattr(self.sender, "receiver", None)
+        if self.receiver is not None:
+            self.receiver.add_watcher(self.receive)
+
+        if self.snapshot_file:
+            self.load_snapshot()
+
+    def snapshot(self):
+        """Return a json serializable dictionary of our devices and collections"""
+        collections = {}
+        for typ, by_uuid in self.collections.collections.items():
+            collections[typ] = {
+                uuid: {"name": collection.name, "updated_at": collection.newest_timestamp}
+                for uuid, collection in by_uuid.items()
+                if collection.newest_timestamp is not None
+            }
+
+        devices = {}
+        for serial, device in self.devices.items():
+            info = {
+                field: device[field]
+                for field in self.snapshot_fields
+                if device[field] is not sb.NotSpecified
+            }
+            if device.group is not sb.NotSpecified:
+                info["group_id"] = device.group.uuid
+            if device.location is not sb.NotSpecified:
+                info["location_id"] = device.location.uuid
+
+            points = {
+                e.name: device.point_futures[e].result()
+                for e in InfoPoints
+                if device.point_futures[e].done()
+            }
+
+            devices[serial] = {"info": info, "points": points}
+
+        return {
+            "version": self.snapshot_version,
+            "collections": collections,
+            "devices": devices,
+        }
+
+    def restore(self, snapshot):
+        """
+        Add devices from the result of ``snapshot``
+
+        Devices we already know about are left alone. If we haven't searched
+        for devices yet then the restored serials are used as the result of
+        that search, until the next search that uses ``refresh_discovery``.
+        """
+        if self.final_future.done() or snapshot.get("version") != self.snapshot_version:
+            return
+
+        for typ in ("group", "location"):
+            for uuid, options in snapshot.get("collections", {}).get(typ, {}).items():
+                try:
+                    self.collections.add_collection(
+                        typ, uuid, options["updated_at"], str(options["name"])
+                    )
+                except (TypeError, KeyError, ValueError, AttributeError):
+                    log.warning(hp.lc("Ignoring invalid collection in snapshot", uuid=uuid))
+
+        now = time.time()
+        restored = []
+
+        for serial, options in snapshot.get("devices", {}).items():
+            if serial in self.devices:
+                continue
+
+            try:
+                device = self._restore_device(serial, options, now)
+            except (TypeError, KeyError, ValueError, AttributeError):
+                log.warning(hp.lc("Ignoring invalid device in snapshot", serial=serial))
+                continue
+
+            self.devices[serial] = device
+            self.last_seen[serial] = now
+            self.index.update(device)
+            restored.append(serial)
+
+        if restored and not self.searched.done():
+            self.searched.set_result(restored)
+
+    def load_snapshot(self):
+        """Restore devices from our snapshot_file if it exists"""
+        try:
+            with open(self.snapshot_file) as fle:
+                snapshot = json.load(fle)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as error:
+            log.warning(
+                hp.lc("Failed to read device finder snapshot", path=self.snapshot_file, error=error)
+            )
+            return
+
+        if isinstance(snapshot, dict):
+            self.restore(snapshot)
+
+    def save_snapshot(self):
+        """Write our devices to our snapshot_file if we have one and have devices"""
+        if not self.snapshot_file or not self.devices:
+            return
+
+        tmp = f"{self.snapshot_file}.tmp"
+        try:
+            directory = os.path.dirname(self.snapshot_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp, "w") as fle:
+                json.dump(self.snapshot(), fle, sort_keys=True)
+            os.replace(tmp, self.snapshot_file)
+        except OSError as error:
+            log.warning(
+                hp.lc(
+                    "Failed to write device finder snapshot", path=self.snapshot_file, error=error
+                )
+            )
+
+    def _restore_device(self, serial, options, now):
+        device = Device.FieldSpec().empty_normalise(serial=serial, limit=self.limit)
+        device.index = self.index
+
+        info = options["info"]
+        for field in self.snapshot_fields:
+            if field in info:
+                val = info[field]
+                if field == "cap":
+                    val = [str(v) for v in val]
+                device[field] = val
+
+        for typ in ("group", "location"):
+            uuid = info.get(f"{typ}_id")
+            if uuid is not None and uuid in self.collections.collections[typ]:
+                device[typ] = self.collections.collections[typ][uuid]
+
+        for name, last in options["points"].items():
+            e = InfoPoints.__members__.get(name)
+            if e is not None:
+                device.point_futures[e].set_result(min(float(last), now))
+
+        return device
+
     async def find(self, fltr):
         if self.final_future.done():
             return
@@ -848,18 +1186,33 @@ class Finder:
 
         catcher = partial(log_errors, "Failed to determine if device matched filter")
 
+        # Devices that already know everything the filter needs are matched
+        # using the index rather than a coroutine per device
+        use_index = not fltr.matches_all and not fltr.refresh_info
+
         async with hp.ResultStreamer(
             self.final_future, name="Finder::find[streamer]", error_catcher=catcher
         ) as streamer:
             for device in removed:
                 await streamer.add_coroutine(device.finish())
 
+            async def found(device):
+                fut = hp.create_future(name=f"Finder({device.serial})::find[fut]")
+                fut.set_result(True)
+                await streamer.add_task(fut, context=device)
+
+            if use_index:
+                unindexed = self.index.unindexed_fields(fltr)
+                for serial in sorted(self.index.matching(fltr)):
+                    device = self.devices.get(serial)
+                    if device is not None and device.knows(fltr):
+                        if device.matches_fltr(fltr, fields=unindexed):
+                            await found(device)
+
             for serial, device in list(self.devices.items()):
                 if fltr.matches_all:
-                    fut = hp.create_future(name=f"Finder({serial})::find[fut]")
-                    fut.set_result(True)
-                    await streamer.add_task(fut, context=device)
-                else:
+                    await found(device)
+                elif not use_index or not device.knows(fltr):
                     await streamer.add_coroutine(
                         device.matches(self.sender, fltr, self.collections), context=device
                     )
@@ -899,15 +1252,99 @@ class Finder:
                 elif result.value and result.context:
                     yield result.context
 
+    def receive(self, pkt):
+        """Update the device this packet is from with the information in it"""
+        device = self.devices.get(pkt.serial)
+        if device is None:
+            return
+
+        point = device.set_from_pkt(pkt, self.collections)
+        if point is not None:
+            device.point_futures[point].reset()
+            device.point_futures[point].set_result(time.time())
+
+    async def refresh_stale(self, time_between_queries=None, *, jitter=0.5):
+        """
+        Ask our devices for any information we don't have yet and any that is
+        older than the refresh for that point of information.
+
+        Each point is refreshed at a random time between ``1 - jitter`` and 1
+        of it's refresh after it was last updated, so that devices found at
+        the same time don't all get asked at the same time.
+        """
+        if self.final_future.done():
+            return
+
+        now = time.time()
+        found = getattr(self.sender, "found", None)
+        refreshes = refreshes_from(time_between_queries)
+
+        stale = defaultdict(list)
+        for serial, device in list(self.devices.items()):
+            if found is not None and serial not in found:
+                continue
+            for e in self._stale_points(device, refreshes, jitter, now):
+                stale[e].append(serial)
+
+        if not stale:
+            return
+
+        async def ask(e, serials):
+            async for pkt in self.sender(
+                e.value.msg, serials, limit=self.limit, find_timeout=5, priority="background"
+            ):
+                if self.receiver is None:
+                    self.receive(pkt)
+
+        catcher = partial(log_errors, "Failed to refresh information for devices")
+
+        async with hp.ResultStreamer(
+            self.final_future, name="Finder::refresh_stale[streamer]", error_catcher=catcher
+        ) as streamer:
+            for e, serials in stale.items():
+                await streamer.add_coroutine(ask(e, serials), context=e)
+            streamer.no_more_work()
+
+            async for _ in streamer:
+                pass
+
+    def _stale_points(self, device, refreshes, jitter, now):
+        due = self.refresh_due.get(device.serial)
+        if due is None:
+            due = self.refresh_due[device.serial] = {}
+
+        for e in InfoPoints:
+            fut = device.point_futures[e]
+            if not fut.done():
+                yield e
+                continue
+
+            refresh = refreshes[e]
+            if refresh is None:
+                continue
+
+            last = fut.result()
+            if e not in due or due[e][:2] != (last, refresh):
+                due[e] = (last, refresh, last + refresh * random.uniform(1 - jitter, 1))
+
+            if now >= due[e][2]:
+                yield e
+
     async def finish(self):
         self.final_future.cancel()
 
+        if self.receiver is not None:
+            self.receiver.remove_watcher(self.receive)
+
+        self.save_snapshot()
+
         async with hp.TaskHolder(
             hp.create_future(name="Finder::finish[task_holder_final_future]"),
             name="Finder::finish[task_holder]",
         ) as ts:
             for serial, device in sorted(self.devices.items()):
                 ts.add(device.finish())
+                self.index.remove(serial)
                 del self.devices[serial]
 
     async def __aenter__(self):
@@ -940,12 +1377,15 @@ class Finder:
         for serial in serials:
             if serial not in self.devices:
                 device = Device.FieldSpec().empty_normalise(serial=serial, limit=self.limit)
+                device.index = self.index
                 self.devices[serial] = device
             self.last_seen[serial] = time.time()
 
         for serial, device in list(self.devices.items()):
             if time.time() - self.last_seen[serial] > self.forget_after:
                 del self.devices[serial]
+                self.index.remove(serial)
+                self.refresh_due.pop(serial, None)
                 if serial in self.last_seen:
                     del self.last_seen[serial]
                 removed.append(device)
@@ -5,7 +5,24 @@ information, information that depends on other information, and also handles
 getting information to you as it's received without having to wait for slower
 devices.
 """
-from photons_control.planner.plans import Skip, NoMessages, Plan, PacketPlan, a_plan, make_plans
+from photons_control.planner.plans import (
+    Skip,
+    NoMessages,
+    NotResolved,
+    Plan,
+    PacketPlan,
+    a_plan,
+    make_plans,
+)
 from photons_control.planner.gatherer import Gatherer
 
-__all__ = ["Skip", "NoMessages", "Plan", "PacketPlan", "a_plan", "make_plans", "Gatherer"]
+__all__ = [
+    "Skip",
+    "NoMessages",
+    "NotResolved",
+    "Plan",
+    "PacketPlan",
+    "a_plan",
+    "make_plans",
+    "Gatherer",
+]
@@ -1,4 +1,4 @@
-from photons_control.planner.plans import Skip, NoMessages
+from photons_control.planner.plans import Skip, NoMessages, NotResolved
 
 from photons_app.errors import RunErrors, BadRunWithResults, ProgrammerError
 from photons_app import helpers as hp
@@ -8,12 +8,19 @@ from photons_transport.targets.base import Target
 from photons_control.script import find_serials
 from photons_transport import catch_errors
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import asyncio
 import time
 import uuid
 
 
+class Failed:
+    """
+    The planner gives this instead of a result for a plan that raised an
+    error when getting its information
+    """
+
+
 class PlanInfo:
     """
     Represents an instance of a plan
@@ -72,6 +79,9 @@ class Planner:
         cached results. If there are no cached results after this, then we need
         to send this message to the device.
 
+        Messages that are used by many plans are only yielded once. They don't
+        have a target so that the same message can be sent to many devices.
+
         Note that Planner.completed must not be called before this method.
         """
         sent = set()
@@ -83,8 +93,6 @@ class Planner:
 
                 if not self.session.has_received(key, self.serial) and key not in sent:
                     sent.add(key)
-                    message = message.clone()
-                    message.target = self.serial
                     yield message
 
     async def completed(self):
@@ -202,6 +210,9 @@ class Planner:
         result.
 
         We then mark the plan as done, cache the result, and return it.
+
+        If getting that result raises an error then the error is given to the
+        error_catcher and we return ``Failed`` instead of the result.
         """
         plankey = info.plankey
         instance = info.instance
@@ -215,7 +226,7 @@ class Planner:
                 raise
             except Exception as error:
                 hp.add_error(self.error_catcher, error)
-                return
+                return instance.serial, label, Failed
 
             if plankey is not None:
                 self.session.fill(plankey, instance.serial, result)
@@ -223,18 +234,85 @@ class Planner:
             return instance.serial, label, result
 
 
+def ttl_from_refresh(refresh):
+    """
+    Return how many seconds a result with this refresh may be used for
+
+    This is None if it may be used forever.
+    """
+    if refresh is False:
+        return None
+    if refresh is True:
+        return 0
+    return refresh
+
+
+class Received(OrderedDict):
+    """
+    The replies from one serial as ``{key: [(time, pkt), ...]}`` with the least
+    recently used key first
+    """
+
+    def __missing__(self, key):
+        pkts = self[key] = []
+        return pkts
+
+
+class ReceivedBySerial(OrderedDict):
+    """
+    ``{serial: Received}`` with the least recently used serial first
+    """
+
+    def __missing__(self, serial):
+        received = self[serial] = Received()
+        return received
+
+
 class Session:
     """
     The cache of results from the Gatherer. It caches the replies to individual
     messages and the final results from plans. It caches per plan/serial.
+
+    The refresh given by plans for their messages and results is remembered
+    and anything that no plan would use anymore is forgotten, at most every
+    ``sweep_every`` seconds. We keep the most lenient refresh for each message
+    because many plans may use the same message.
+
+    max_age
+        Forget anything older than this many seconds even if the plans would
+        still use it. None means only use the refresh from plans.
+
+    max_keys_per_serial
+        The most messages we remember replies to for each serial. The least
+        recently used are forgotten first. None means no limit.
+
+    max_serials
+        The most serials we remember anything for. The least recently used
+        serial is forgotten first. None means no limit.
+
+    We record ``hits``, ``misses`` and ``evictions`` as we go.
     """
 
-    def __init__(self):
-        self.received = defaultdict(lambda: defaultdict(list))
+    sweep_every = 5
+
+    def __init__(self, max_age=None, max_keys_per_serial=200, max_serials=None):
+        self.max_age = max_age
+        self.max_serials = max_serials
+        self.max_keys_per_serial = max_keys_per_serial
+
+        self.received = ReceivedBySerial()
         self.filled = defaultdict(dict)
 
+        self.ttls = {}
+        self.last_sweep = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
     def planner(self, plans, depinfo, serial, error_catcher):
         """Return a Planner instance for managing packets and results"""
+        self.maybe_sweep()
         return Planner(self, plans, depinfo, serial, error_catcher)
 
     def receive(self, pkt):
@@ -245,7 +323,22 @@ class Session:
         We also record the current time to use later for determining refreshes
         """
         key = pkt.Information.sender_message.Key
-        self.received[pkt.serial][key].append((time.time(), pkt))
+        serial = pkt.serial
+
+        received = self.received[serial]
+        received[key].append((time.time(), pkt))
+
+        self.received.move_to_end(serial)
+        received.move_to_end(key)
+
+        if self.max_keys_per_serial is not None:
+            while len(received) > self.max_keys_per_serial:
+                received.popitem(last=False)
+                self.evictions += 1
+
+        if self.max_serials is not None:
+            while len(self.received) > self.max_serials:
+                self.forget_serial(next(iter(self.received)))
 
     def fill(self, plankey, serial, result):
         """
@@ -262,19 +355,28 @@ class Session:
         Otherwise, return None
         """
         if plankey in self.filled and serial in self.filled[plankey]:
+            self.hits += 1
             return self.filled[plankey][serial][1]
+        self.misses += 1
 
     def has_received(self, key, serial):
         """Return whether this serial has received results for this key"""
-        return bool(self.received[serial].get(key))
+        received = self.received.get(serial)
+        if received and received.get(key):
+            self.hits += 1
+            received.move_to_end(key)
+            return True
+
+        self.misses += 1
+        return False
 
     def known_packets(self, serial):
         """Yield all the known reply packets from this serial"""
-        for s, pkts in self.received.items():
-            if s == serial:
-                for ps in pkts.values():
-                    for _, p in ps:
-                        yield p
+        received = self.received.get(serial)
+        if received:
+            for ps in list(received.values()):
+                for _, p in list(ps):
+                    yield p
 
     def refresh_received(self, key, serial, refresh):
         """
@@ -286,19 +388,23 @@ class Session:
         * refresh == integer - Look at the time the packet was received
           if it's been refresh seconds, then remove the result.
         """
+        self.remember_ttl(key, refresh)
+
         if refresh is False:
             return
 
+        infos = self.received.get(serial)
+        if not infos or key not in infos:
+            return
+
         now = time.time()
 
-        for s, infos in self.received.items():
-            if s == serial and key in infos:
-                if refresh is True or refresh == 0:
-                    del infos[key]
-                else:
-                    infos[key] = [(ts, i) for ts, i in infos[key] if 0 < now - ts <= refresh]
-                    if not infos[key]:
-                        del infos[key]
+        if refresh is True or refresh == 0:
+            del infos[key]
+        else:
+            infos[key] = [(ts, i) for ts, i in infos[key] if 0 < now - ts <= refresh]
+            if not infos[key]:
+                del infos[key]
 
     def refresh_filled(self, plankey, serial, refresh):
         """
@@ -310,6 +416,8 @@ class Session:
         * refresh == integer - Look at the time the result was recorded
           if it's been refresh seconds, then remove the result.
         """
+        self.remember_ttl(plankey, refresh)
+
         if refresh is False or plankey not in self.filled or serial not in self.filled[plankey]:
             return
 
@@ -322,6 +430,130 @@ class Session:
         if not self.filled[plankey]:
             del self.filled[plankey]
 
+    def remember_ttl(self, key, refresh):
+        """Remember the most lenient refresh we've seen for this key"""
+        ttl = ttl_from_refresh(refresh)
+        if key in self.ttls:
+            existing = self.ttls[key]
+            if existing is None or (ttl is not None and existing >= ttl):
+                return
+        self.ttls[key] = ttl
+
+    def max_age_for(self, key):
+        """Return how old something for this key may be or None if it can be any age"""
+        ttl = self.ttls.get(key)
+        if ttl is None:
+            return self.max_age
+        if self.max_age is None:
+            return ttl
+        return min(ttl, self.max_age)
+
+    def maybe_sweep(self):
+        """Sweep if we haven't in the last sweep_every seconds"""
+        now = time.time()
+        if self.last_sweep is None or now - self.last_sweep >= self.sweep_every:
+            self.sweep(now)
+
+    def sweep(self, now=None):
+        """Forget anything that no plan would use anymore"""
+        if now is None:
+            now = time.time()
+        self.last_sweep = now
+
+        keys = set()
+
+        for serial, infos in list(self.received.items()):
+            for key, pkts in list(infos.items()):
+                max_age = self.max_age_for(key)
+                if max_age is not None:
+                    pkts = [(ts, p) for ts, p in pkts if now - ts <= max_age]
+                    if pkts:
+                        infos[key] = pkts
+                    else:
+                        del infos[key]
+                        self.evictions += 1
+                        continue
+                keys.add(key)
+
+            if not infos:
+                del self.received[serial]
+
+        for plankey, by_serial in list(self.filled.items()):
+            max_age = self.max_age_for(plankey)
+            if max_age is not None:
+                for serial, (ts, _) in list(by_serial.items()):
+                    if now - ts > max_age:
+                        del by_serial[serial]
+                        self.evictions += 1
+
+            if by_serial:
+                keys.add(plankey)
+            else:
+                del self.filled[plankey]
+
+        self.ttls = {key: ttl for key, ttl in self.ttls.items() if key in keys}
+
+    def forget_serial(self, serial):
+        """Forget everything we know about this serial"""
+        if self.received.pop(serial, None) is not None:
+            self.evictions += 1
+
+        for plankey, by_serial in list(self.filled.items()):
+            if by_serial.pop(serial, None) is not None:
+                self.evictions += 1
+            if not by_serial:
+                del self.filled[plankey]
+
+
+class Dispatcher:
+    """
+    Sends the messages that planners need for their devices. Devices that want
+    exactly the same messages at the same time are given to the sender together
+    in one call and each device is only given the replies from that device.
+
+    Devices join a dispatch until the loop has had a chance to let all the
+    other devices that are ready catch up, so a device that is still waiting
+    on its dependencies doesn't hold up the rest.
+    """
+
+    class Done:
+        pass
+
+    def __init__(self, sender, streamer, kwargs):
+        self.sender = sender
+        self.kwargs = kwargs
+        self.streamer = streamer
+        self.waiting = {}
+
+    async def send(self, serial, msgs):
+        """Yield the replies from this serial to these messages"""
+        key = tuple(msg.Key for msg in msgs)
+        queue = hp.Queue(self.sender.stop_fut, name=f"Dispatcher::send[{serial}]")
+
+        if key not in self.waiting:
+            self.waiting[key] = (msgs, {})
+            await self.streamer.add_coroutine(self._dispatch(key), context=Dispatcher)
+        self.waiting[key][1][serial] = queue
+
+        async for pkt in queue:
+            if pkt is self.Done:
+                break
+            yield pkt
+
+    async def _dispatch(self, key):
+        """Send the messages for this key to every device that asked for them"""
+        await asyncio.sleep(0)
+        msgs, queues = self.waiting.pop(key)
+
+        try:
+            async for pkt in self.sender(msgs, list(queues), **self.kwargs):
+                queue = queues.get(pkt.serial)
+                if queue is not None:
+                    queue.append(pkt)
+        finally:
+            for queue in queues.values():
+                queue.append(self.Done)
+
 
 class Gatherer:
     """
@@ -379,35 +611,63 @@ class Gatherer:
     may define a custom refresh when you instantiate the plan and you may also
     give the plan a different label.
 
+    All the gather methods also take in ``plan_timeout``. This is either a
+    number of seconds for every plan or a dictionary of ``{label: seconds}``.
+    Any plan that hasn't resolved for a device after its timeout is given as
+    ``unresolved`` instead of a result, which defaults to the ``NotResolved``
+    class. This means a device with one slow plan only holds up the other
+    plans for that long.
+
     Note that results from gathering will be cached and you may remove this cache
-    by calling gatherer.clear_cache()
+    by calling gatherer.clear_cache(). Any keyword arguments given to the
+    Gatherer are passed into the ``Session`` that holds this cache, so you may
+    say how long and how much it remembers with ``max_age``,
+    ``max_keys_per_serial`` and ``max_serials``.
     """
 
     Skip = Skip
+    NotResolved = NotResolved
 
-    def __init__(self, sender):
+    def __init__(self, sender, **session_options):
         if isinstance(sender, Target):
             raise ProgrammerError(
                 "The Gatherer no longer takes in target instances. Please pass in a target.session result instead"
             )
         self.sender = sender
+        self.session_options = session_options
 
     @hp.memoized_property
     def session(self):
-        return Session()
+        return Session(**self.session_options)
 
     def clear_cache(self):
         """Remove all cached results"""
         if hasattr(self, "_session"):
             del self.session
 
-    async def gather(self, plans, reference, error_catcher=None, **kwargs):
+    async def gather(
+        self,
+        plans,
+        reference,
+        error_catcher=None,
+        plan_timeout=None,
+        unresolved=NotResolved,
+        **kwargs,
+    ):
         """
         This is an async generator that yields tuples of
         ``(serial, label, info)`` where ``serial`` is the serial of the device,
         ``label`` is the label of the plan, and ``info`` is the result of
         executing that plan.
 
+        If ``plan_timeout`` is given then each plan has a deadline of that many
+        seconds, or the seconds for its label if ``plan_timeout`` is a
+        dictionary. When a deadline passes we yield ``(serial, label, unresolved)``
+        for every device that plan hasn't resolved for yet and ignore any
+        result that plan gets for that device afterwards. We stop gathering
+        once every plan has resolved, errored, timed out or can't be resolved
+        anymore. Plans that error are not yielded.
+
         The error handling of this function is the same as the async generator
         behaviour in :ref:`sender <sender_interface>` API.
         """
@@ -424,18 +684,81 @@ class Gatherer:
             for serial in missing:
                 hp.add_error(error_catcher, FailedToFindDevice(serial=serial))
 
+            timeouts = self._plan_timeouts(plans, plan_timeout)
+
+            pending = set()
+            finished = set()
+            timed_out = set()
+            deadlines = []
+            following = len(serials)
+
+            def follow_done(serial):
+                def done(result):
+                    nonlocal following
+                    following -= 1
+
+                    # Results from this serial may still be waiting in the
+                    # streamer, so pending is only changed as they come out
+                    finished.add(serial)
+
+                    if following == 0:
+                        for deadline in deadlines:
+                            deadline.cancel()
+
+                return done
+
             async with hp.ResultStreamer(
                 self.sender.stop_fut,
                 error_catcher=error_catcher,
                 exceptions_only_to_error_catcher=True,
             ) as streamer:
+                if serials and timeouts:
+                    pending = {(serial, label) for serial in serials for label in plans}
+
+                    by_timeout = defaultdict(set)
+                    for label, timeout in timeouts.items():
+                        by_timeout[timeout].add(label)
+
+                    for timeout, labels in sorted(by_timeout.items()):
+                        deadlines.append(
+                            await streamer.add_coroutine(
+                                self._deadline(timeout, labels), context=self.NotResolved
+                            )
+                        )
+
+                dispatcher = Dispatcher(self.sender, streamer, kwargs)
+
                 for serial in serials:
-                    await streamer.add_generator(self._follow(plans, serial, **kwargs))
+                    await streamer.add_generator(
+                        self._follow(plans, serial, dispatcher, **kwargs),
+                        on_done=follow_done(serial),
+                    )
                 streamer.no_more_work()
 
                 async for result in streamer:
-                    if result.successful:
-                        yield result.value
+                    if result.context is Dispatcher:
+                        continue
+                    elif result.context is self.NotResolved:
+                        if result.successful:
+                            for serial, label in sorted(pending):
+                                if label in result.value:
+                                    pending.discard((serial, label))
+                                    timed_out.add((serial, label))
+
+                                    # Plans on a finished serial can't be resolved
+                                    if serial not in finished:
+                                        yield serial, label, unresolved
+                    elif result.successful:
+                        serial, label, info = result.value
+                        if (serial, label) in timed_out:
+                            continue
+
+                        pending.discard((serial, label))
+                        if info is not Failed:
+                            yield result.value
+
+                    if deadlines and not pending:
+                        break
 
     async def gather_all(self, plans, reference, **kwargs):
         """
@@ -471,11 +794,16 @@ class Gatherer:
 
         ``info`` will look like ``{<label>: <result of plan>}``
 
+        If a ``plan_timeout`` is given then a device is yielded once every plan
+        has either resolved or timed out, and ``complete`` will be False if any
+        of those plans timed out.
+
         The error handling of this function is the same as the async generator
         behaviour in :ref:`sender <sender_interface>` API.
         """
         done = set()
         wanted = set(plans)
+        unresolved = kwargs.get("unresolved", NotResolved)
 
         result = defaultdict(dict)
 
@@ -485,14 +813,31 @@ class Gatherer:
 
                 if set(result[serial]) == wanted:
                     done.add(serial)
-                    yield serial, True, result[serial]
-                    del result[serial]
+                    info = result.pop(serial)
+                    yield serial, all(v is not unresolved for v in info.values()), info
         finally:
             for serial, info in sorted(result.items()):
                 if serial not in done:
                     yield serial, False, info
 
-    async def _follow(self, plans, serial, **kwargs):
+    def _plan_timeouts(self, plans, plan_timeout):
+        """
+        Return ``{label: seconds}`` for the plans that have a timeout
+        """
+        if plan_timeout is None:
+            return {}
+
+        if isinstance(plan_timeout, dict):
+            return {label: t for label, t in plan_timeout.items() if label in plans}
+
+        return {label: plan_timeout for label in plans}
+
+    async def _deadline(self, timeout, labels):
+        """Return these labels after this many seconds"""
+        await asyncio.sleep(timeout)
+        return labels
+
+    async def _follow(self, plans, serial, dispatcher, **kwargs):
         """
         * get dependency information
         * Determine messages to be sent to devices
@@ -500,6 +845,9 @@ class Gatherer:
         * Send messages to devices, process results and yield any completed results
         * Complete any plans that are finished after no more messages and yield
           completed results.
+
+        Messages are sent with the dispatcher so that devices needing the same
+        messages share one call to the sender.
         """
         depinfo = await self._deps(plans, serial, **kwargs)
         planner = self.session.planner(plans, depinfo, serial, kwargs["error_catcher"])
@@ -514,7 +862,7 @@ class Gatherer:
             yield complete
 
         if msgs_to_send:
-            async for pkt in self.sender(msgs_to_send, **kwargs):
+            async for pkt in dispatcher.send(serial, msgs_to_send):
                 async for complete in planner.add(pkt):
                     yield complete
 
@@ -31,6 +31,13 @@ class NoMessages:
     """
 
 
+class NotResolved:
+    """
+    The gatherer gives this instead of a result for a plan that did not
+    resolve before the ``plan_timeout`` given to the gather
+    """
+
+
 class FirmwareInfo(dictobj):
     fields = ["build", "version_major", "version_minor"]
 
@@ -0,0 +1,417 @@
+"""
+A compiled codec for packets with a static layout.
+
+``PacketPacking`` knows how to pack and unpack any packet, but it does so one
+field at a time, creating a ``bitarray`` for every field. For packet classes
+where the size of every field is known without looking at a packet instance,
+we can instead work out a single ``struct.Struct`` that describes the whole
+packet and use that to pack and unpack all the fields in one go.
+
+Fields that are not byte aligned (for example the ``protocol``, ``addressable``,
+``tagged`` and ``reserved1`` fields in the frame header) are collected into
+a group that is represented as bytes in the struct, and the bits for each
+field in that group are shifted in and out of a single integer.
+
+Usage looks like:
+
+.. code-block:: python
+
+    codec = PacketCodec.for_kls(pkt_kls)
+    if codec is not None:
+        packed = codec.pack(pkt, parent, serial)
+        final = codec.unpack(pkt_kls, data)
+
+Both ``pack`` and ``unpack`` return ``None`` if they can't handle the values
+they were given, in which case the caller should use ``PacketPacking``. This
+happens when a value wouldn't pack cleanly or when unpacking data that is
+shorter than the packet.
+
+A multiple field, like the ``colors`` on a ``Set64``, may hold a little endian
+``bitarray`` of the bytes for all its items rather than a list. ``unpack``
+leaves multiple fields like this until they are accessed, and ``set_raw`` gives
+a field all its bytes this way. The packet expands the bitarray into items when
+the field is accessed and ``pack`` uses the bytes as they are until then.
+"""
+from photons_protocol.types import Optional
+
+from delfick_project.norms import sb
+from bitarray import bitarray
+import binascii
+import struct
+
+NotCompiled = type("NotCompiled", (), {})()
+
+
+class Fallback(Exception):
+    """Raised when a value can't be handled by the codec"""
+
+
+def is_reserved(typ):
+    return typ.__class__.__name__ == "Reserved"
+
+
+def bits_from_value(typ, size_bits, val):
+    """
+    Return ``(number, size)`` for a value that is bytes, bitarray or bool
+
+    This mirrors ``FieldInfo.to_sized_bitarray`` for these values.
+    """
+    if val is sb.NotSpecified:
+        if is_reserved(typ):
+            return 0, size_bits
+        raise Fallback()
+
+    if type(val) is bool and typ.struct_format is bool:
+        return int(val), 1
+
+    if type(val) is bitarray:
+        if val.endian() != "little":
+            raise Fallback()
+        size = len(val)
+        val = val.tobytes()
+    elif type(val) is bytes and typ.struct_format is None:
+        size = len(val) * 8
+    else:
+        raise Fallback()
+
+    number = int.from_bytes(val, "little")
+    if size > size_bits:
+        if getattr(typ, "left_cut", False):
+            number >>= size - size_bits
+        size = size_bits
+
+    return number & ((1 << size) - 1), size
+
+
+def bytes_from_value(typ, size_bits, val):
+    """Return the bytes for a field that isn't a struct"""
+    if val is sb.NotSpecified and is_reserved(typ):
+        return bytes(size_bits // 8)
+
+    number, size = bits_from_value(typ, size_bits, val)
+    if size != size_bits:
+        raise Fallback()
+
+    return number.to_bytes(size_bits // 8, "little")
+
+
+def struct_value(val):
+    """Return the value for a struct field"""
+    if val is Optional:
+        return 0
+    if val is sb.NotSpecified or type(val) is bitarray:
+        raise Fallback()
+    return val
+
+
+def make_bitarray(bts):
+    b = bitarray(endian="little")
+    b.frombytes(bts)
+    return b
+
+
+class Field:
+    """A byte aligned field that is represented directly in the struct"""
+
+    def __init__(self, name, typ, size_bits, number):
+        self.typ = typ
+        self.name = name
+        self.number = number
+        self.size_bits = size_bits
+
+        fmt = typ.struct_format
+        self.is_struct = type(fmt) is str
+
+        if self.is_struct:
+            self.code = f"{number}{fmt[1:]}" if number else fmt[1:]
+            self.count = number or 1
+        else:
+            self.code = f"{(size_bits // 8) * (number or 1)}s"
+            self.count = 1
+
+        # A multiple field that hasn't been expanded yet can be used as is
+        self.raw_size = size_bits * number if number and not self.is_struct else None
+
+    def raw_value(self, pkt):
+        """
+        Return the bytes for a multiple field that is still the bitarray from
+        unpacking or from being given all its bytes, or None
+        """
+        raw = dict.get(pkt, self.name)
+        if type(raw) is bitarray and len(raw) == self.raw_size and raw.endian() == "little":
+            return raw.tobytes()
+
+    def values(self, val):
+        typ = self.typ
+        size_bits = self.size_bits
+
+        if not self.number:
+            if self.is_struct:
+                return (struct_value(val),)
+            return (bytes_from_value(typ, size_bits, val),)
+
+        if not isinstance(val, list) or len(val) != self.number:
+            raise Fallback()
+
+        if self.is_struct:
+            return [struct_value(v) for v in val]
+        return (b"".join(bytes_from_value(typ, size_bits, v) for v in val),)
+
+    def decode(self, raw, vals, i):
+        if self.is_struct:
+            if self.number:
+                raw[self.name] = list(vals[i : i + self.count])
+            else:
+                raw[self.name] = vals[i]
+        else:
+            raw[self.name] = make_bitarray(vals[i])
+        return i + self.count
+
+
+class BitGroup:
+    """
+    A group of fields that together take up a whole number of bytes but
+    individually aren't byte aligned or aren't the size of their struct format.
+    """
+
+    count = 1
+
+    def __init__(self, members, size_bits):
+        self.members = members
+        self.size_bits = size_bits
+        self.num_bytes = size_bits // 8
+        self.code = f"{self.num_bytes}s"
+
+    def pack_member(self, typ, size_bits, val):
+        fmt = typ.struct_format
+        if type(fmt) is not str:
+            return bits_from_value(typ, size_bits, val)[0]
+
+        try:
+            number = int.from_bytes(struct.pack(fmt, struct_value(val)), "little")
+        except struct.error:
+            raise Fallback()
+
+        original_size = typ.original_size
+        if size_bits < original_size and getattr(typ, "left_cut", False):
+            number >>= original_size - size_bits
+        return number & ((1 << size_bits) - 1)
+
+    def unpack_member(self, typ, size_bits, number):
+        fmt = typ.struct_format
+        if fmt is bool:
+            return number != 0
+
+        if fmt is None:
+            b = make_bitarray(number.to_bytes((size_bits + 7) // 8, "little"))
+            return b[:size_bits]
+
+        original_size = typ.original_size
+        if getattr(typ, "left_cut", False):
+            number <<= original_size - size_bits
+        return struct.unpack(fmt, number.to_bytes(original_size // 8, "little"))[0]
+
+    def add_values(self, pkt, parent, serial, out):
+        number = 0
+        for name, typ, size_bits, offset in self.members:
+            val = pkt.__getitem__(
+                name,
+                parent=parent,
+                serial=serial,
+                allow_bitarray=True,
+                unpacking=False,
+                do_transform=False,
+            )
+            number |= self.pack_member(typ, size_bits, val) << offset
+        out.append(number.to_bytes(self.num_bytes, "little"))
+
+    def decode(self, raw, vals, i):
+        number = int.from_bytes(vals[i], "little")
+        for name, typ, size_bits, offset in self.members:
+            val = self.unpack_member(typ, size_bits, (number >> offset) & ((1 << size_bits) - 1))
+            raw[name] = val
+        return i + 1
+
+
+class PacketCodec:
+    """
+    A ``struct.Struct`` for all the fields in a packet class and the knowledge
+    of how to get values in and out of it.
+
+    Use ``PacketCodec.for_kls(pkt_kls)`` to get the codec for a class. This is
+    compiled on first use and stored on the ``Meta`` of the class. It will be
+    ``None`` if the class can't be represented by a static layout.
+    """
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.struct = struct.Struct("<" + "".join(part.code for part in parts))
+        self.size = self.struct.size
+
+    @classmethod
+    def for_kls(kls, pkt_kls):
+        M = getattr(pkt_kls, "Meta", None)
+        if M is None or not hasattr(M, "all_field_types"):
+            return None
+
+        codec = getattr(M, "codec", NotCompiled)
+        if codec is NotCompiled:
+            codec = M.codec = kls.compile(M.all_field_types)
+        return codec
+
+    @classmethod
+    def compile(kls, all_field_types):
+        """
+        Return a PacketCodec for these ``(name, typ)`` fields
+
+        Or None if there are no fields or any field doesn't have a static layout
+        """
+        if not all_field_types:
+            return None
+
+        parts = []
+        group = None
+        group_size = 0
+
+        for name, typ in all_field_types:
+            size_bits = typ.size_bits
+            number = typ._multiple
+            fmt = typ.struct_format
+
+            if callable(size_bits) or callable(number) or type(size_bits) is not int:
+                return None
+
+            if fmt is bool:
+                if size_bits != 1 or number:
+                    return None
+            elif type(fmt) is str:
+                if not fmt.startswith("<") or size_bits > typ.original_size:
+                    return None
+            elif fmt is not None:
+                return None
+
+            aligned = group is None and size_bits % 8 == 0
+            if type(fmt) is str:
+                aligned = aligned and size_bits == typ.original_size
+            elif fmt is bool:
+                aligned = False
+
+            if aligned:
+                parts.append(Field(name, typ, size_bits, number))
+                continue
+
+            if number:
+                return None
+
+            if group is None:
+                group = []
+                group_size = 0
+
+            group.append((name, typ, size_bits, group_size))
+            group_size += size_bits
+
+            if group_size % 8 == 0:
+                parts.append(BitGroup(group, group_size))
+                group = None
+
+        if group is not None:
+            return None
+
+        return kls(parts)
+
+    def pack(self, pkt, parent, serial):
+        """
+        Return a bitarray of the fields in pkt, or None if this packet can't
+        be packed by the codec.
+        """
+        out = []
+        try:
+            for part in self.parts:
+                if part.__class__ is BitGroup:
+                    part.add_values(pkt, parent, serial, out)
+                    continue
+
+                if part.raw_size is not None:
+                    raw = part.raw_value(pkt)
+                    if raw is not None:
+                        out.append(raw)
+                        continue
+
+                val = pkt.__getitem__(
+                    part.name,
+                    parent=parent,
+                    serial=serial,
+                    allow_bitarray=True,
+                    unpacking=False,
+                    do_transform=False,
+                )
+                out.extend(part.values(val))
+
+            packed = self.struct.pack(*out)
+        except (Fallback, struct.error):
+            return None
+
+        return make_bitarray(packed)
+
+    def set_raw(self, pkt, name, bts):
+        """
+        Give the multiple field called name on pkt the bytes for all its items
+
+        This is the same as that field after unpacking, so the items aren't
+        made unless something accesses the field.
+        """
+        for part in self.parts:
+            if part.__class__ is Field and part.name == name and part.raw_size is not None:
+                if len(bts) * 8 != part.raw_size:
+                    raise ValueError(
+                        f"Expected {part.raw_size // 8} bytes for {name}, got {len(bts)}"
+                    )
+                dict.__setitem__(pkt, name, make_bitarray(bts))
+                return
+
+        raise ValueError(f"{name} isn't a multiple field that can be given raw bytes")
+
+    def unpack(self, pkt_kls, value):
+        """
+        Return an instance of pkt_kls from this value, or None if this value
+        can't be unpacked by the codec.
+
+        Fields are given their raw values, which are decoded by the packet
+        when they are accessed.
+
+        If pkt_kls is a parent_packet with an empty payload group, then any
+        remaining data is put on that group.
+        """
+        if type(value) is str:
+            try:
+                value = binascii.unhexlify(value)
+            except binascii.Error:
+                return None
+        elif type(value) is bitarray:
+            if len(value) % 8 != 0 or value.endian() != "little":
+                return None
+            value = value.tobytes()
+        elif type(value) is not bytes:
+            return None
+
+        if len(value) < self.size:
+            return None
+
+        vals = self.struct.unpack_from(value)
+
+        i = 0
+        raw = {}
+        for part in self.parts:
+            i = part.decode(raw, vals, i)
+
+        # Every field is getting a value, so we don't need dictobj to set defaults
+        # Multiple fields are left raw until they are accessed
+        final = pkt_kls.__new__(pkt_kls)
+        dict.update(final, raw)
+
+        if getattr(pkt_kls, "parent_packet", False) and len(value) > self.size:
+            for name, typ in pkt_kls.Meta.field_types:
+                if getattr(typ, "message_type", None) == 0:
+                    final[name] = make_bitarray(value[self.size :])
+
+        return final
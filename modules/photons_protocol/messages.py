@@ -81,10 +81,8 @@ class PacketTypeExtractor:
         if len(data) < 4:
             raise BadConversion("Data is too small to be a LIFX packet", got=len(data))
 
-        b = bitarray(endian="little")
-        b.frombytes(data[2:4])
-        protbts = b[:12].tobytes()
-        protocol = protbts[0] + (protbts[1] << 8)
+        # The protocol is the first 12 bits of the little endian Uint16 at bytes 2 and 3
+        protocol = (data[2] + (data[3] << 8)) & 0xFFF
 
         pkt_type = None
 
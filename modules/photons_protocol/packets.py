@@ -23,7 +23,7 @@ where the ``*_type`` objects have information related to the type for that
 field. See ``photons_protocol.types`` for builtin types.
 """
 from photons_protocol.packing import PacketPacking, val_to_bitarray
-from photons_protocol.types import Optional, Type as T
+from photons_protocol.types import Optional, MultipleWrapper, UnknownEnum, Type as T
 
 from photons_app.errors import PhotonsAppError, ProgrammerError
 
@@ -33,6 +33,7 @@ from functools import partial
 import binascii
 import logging
 import json
+import enum
 
 log = logging.getLogger("photons_protocol.packets")
 
@@ -51,6 +52,36 @@ class Initial:
     """Used for the default values on Packet groups"""
 
 
+# Decoded values of these types are safe to hand out more than once
+immutable_types = (int, float, str, bytes, enum.Enum, UnknownEnum)
+
+
+def is_decodable(typ):
+    """
+    Return whether the decoded value for a field of this type only depends on
+    the raw value for that field.
+
+    Transforms on payload fields are expected to only look at the value they
+    are given.
+    """
+    if not isinstance(typ, T):
+        return False
+
+    if callable(typ.size_bits) or typ._multiple or typ._allow_callable:
+        return False
+
+    if typ._dynamic is not sb.NotSpecified or typ._override is not sb.NotSpecified:
+        return False
+
+    if typ._bitmask is not sb.NotSpecified:
+        return False
+
+    if typ._enum is not sb.NotSpecified and not isinstance(typ._enum, enum.EnumMeta):
+        return False
+
+    return True
+
+
 class packet_spec(sb.Spec):
     """
     When you call Packet.spec, you are creating an instance of this.
@@ -232,6 +263,27 @@ class PacketSpecMixin:
 
         if do_spec and key in M.all_names:
             typ = M.all_field_types_dict[key]
+
+            # Unpacking leaves multiple fields as the raw bytes or list it found
+            # We only turn that into items the first time the field is accessed
+            if typ._multiple and actual is not sb.NotSpecified:
+                actual = object.__getattribute__(self, "_expand_multiple")(key, typ, actual)
+
+            # Values that only depend on the raw value are remembered until the raw value changes
+            cacheable = (
+                unpacking
+                and do_transform
+                and parent is None
+                and serial is None
+                and not allow_bitarray
+                and key in object.__getattribute__(self, "decoded_names")()
+            )
+
+            if cacheable:
+                decoded = self.__dict__.get("_decoded")
+                if decoded is not None and key in decoded and decoded[key][0] is actual:
+                    return decoded[key][1]
+
             res = object.__getattribute__(self, "getitem_spec")(
                 typ, key, actual, parent, serial, do_transform, allow_bitarray, unpacking
             )
@@ -241,10 +293,92 @@ class PacketSpecMixin:
             if typ and hasattr(typ, "_multiple") and typ._multiple and actual is sb.NotSpecified:
                 dictobj.__setitem__(self, key, res)
 
+            if cacheable and actual is not sb.NotSpecified and isinstance(res, immutable_types):
+                if "_decoded" not in self.__dict__:
+                    self.__dict__["_decoded"] = {}
+                self.__dict__["_decoded"][key] = (actual, res)
+
             return res
 
         return actual
 
+    def _expand_multiple(self, key, typ, actual):
+        """
+        Replace a raw value for a multiple field with the items it represents
+
+        So that modifying those items modifies the packet.
+        """
+        if isinstance(actual, MultipleWrapper):
+            return actual
+
+        actual = typ.spec(self, unpacking=True).normalise(Meta.empty().at(key), actual)
+        dictobj.__setitem__(self, key, actual)
+        return actual
+
+    def __eq__(self, other):
+        """
+        Compare as a dictionary, making sure multiple fields left as raw values
+        from unpacking are compared as items
+
+        Those items are only made for the comparison, so neither packet is
+        changed by comparing them.
+        """
+        if isinstance(other, PacketSpecMixin):
+            other = other._comparable()
+        return dict.__eq__(self._comparable(), other)
+
+    def _comparable(self):
+        """
+        Return this packet, or a dictionary copy of it with raw multiple fields
+        made into their items
+        """
+        comparable = self
+        for key, typ in self.Meta.all_field_types:
+            if getattr(typ, "_multiple", False) and dict.__contains__(self, key):
+                actual = dict.__getitem__(self, key)
+                if actual is sb.NotSpecified or isinstance(actual, MultipleWrapper):
+                    continue
+
+                if comparable is self:
+                    comparable = dict(dict.items(self))
+                spec = typ.spec(self, unpacking=True)
+                comparable[key] = spec.normalise(Meta.empty().at(key), actual)
+        return comparable
+
+    def __ne__(self, other):
+        res = self.__eq__(other)
+        if res is NotImplemented:
+            return res
+        return not res
+
+    __hash__ = None
+
+    @classmethod
+    def decoded_names(kls):
+        """
+        Return the names of the fields whose value we may remember after
+        decoding it from the raw value on the packet.
+
+        This is the payload fields whose value only depends on the raw value
+        and not on other fields in the packet.
+        """
+        M = kls.Meta
+        names = getattr(M, "decoded_names", None)
+        if names is not None:
+            return names
+
+        if hasattr(M, "parent"):
+            candidates = [n for n in M.all_names if n not in M.parent.Meta.all_names]
+        elif getattr(kls, "parent_packet", False):
+            candidates = []
+        else:
+            candidates = M.all_names
+
+        names = M.decoded_names = frozenset(
+            name for name in candidates if is_decodable(M.all_field_types_dict[name])
+        )
+        return names
+
     def getitem_spec(
         self, typ, key, actual, parent, serial, do_transform, allow_bitarray, unpacking
     ):
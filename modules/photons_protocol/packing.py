@@ -1,4 +1,5 @@
 from photons_protocol.errors import BadConversion
+from photons_protocol.codec import PacketCodec
 from photons_protocol.types import Optional
 
 from delfick_project.norms import sb, dictobj
@@ -208,7 +209,8 @@ class PacketPacking:
                         info = BitarraySlice(name, typ, v, single_size_bits, pkt_kls.__name__)
                         res.append(info.unpackd)
                     val = res
-                final[name] = val
+                # The packet turns this into items when the field is accessed
+                dictobj.__setitem__(final, name, val)
             else:
                 info = BitarraySlice(name, typ, val, size_bits, pkt_kls.__name__)
                 dictobj.__setitem__(final, info.name, info.unpackd)
@@ -229,16 +231,30 @@ class PacketPacking:
         If ``payload`` is provided and this packet is a ``parent_packet`` and
         it's last field has a ``message_type`` property of 0, then that payload
         is converted into a bitarray and added to the end of the result.
+
+        If the class of the packet has a static layout then we use a compiled
+        ``photons_protocol.codec.PacketCodec`` to pack all the fields at once
+        and only fall back to packing field by field if the codec can't handle
+        the values on this packet.
         """
-        final = bitarray(endian="little")
+        final = None
+
+        codec = PacketCodec.for_kls(type(pkt))
+        if codec is not None:
+            final = codec.pack(pkt, parent, serial)
 
-        for info in kls.fields_in(pkt, parent, serial):
-            result = info.to_sized_bitarray()
+        if final is None:
+            final = bitarray(endian="little")
 
-            if result is None:
-                raise BadConversion("Failed to convert field into a bitarray", field=info.as_dict())
+            for info in kls.fields_in(pkt, parent, serial):
+                result = info.to_sized_bitarray()
 
-            final += result
+                if result is None:
+                    raise BadConversion(
+                        "Failed to convert field into a bitarray", field=info.as_dict()
+                    )
+
+                final += result
 
         # If this is a parent packet with a Payload of message_type 0
         # Then this means we have no payload fields and so must append
@@ -266,7 +282,16 @@ class PacketPacking:
         If this is a ``parent_packet`` and the last field has a ``message_type``
         property of 0, then the remainder of the ``value`` is assigned as
         bytes to that field on the final instance.
+
+        If ``pkt_kls`` has a static layout then we use a compiled
+        ``photons_protocol.codec.PacketCodec`` to unpack all the fields at once.
         """
+        codec = PacketCodec.for_kls(pkt_kls)
+        if codec is not None:
+            final = codec.unpack(pkt_kls, value)
+            if final is not None:
+                return final
+
         value = val_to_bitarray(value, doing="Making bitarray to unpack")
         final, index = kls.pkt_from_bitarray(pkt_kls, value)
 
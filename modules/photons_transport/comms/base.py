@@ -1,5 +1,9 @@
 from photons_transport.errors import FailedToFindDevice, StopPacketStream
+from photons_transport.comms.single_flight import SingleFlight
+from photons_transport.comms.reply_cache import ReplyCache
+from photons_transport.comms.priority import Lanes
 from photons_transport.comms.receiver import Receiver
+from photons_transport.comms.pacing import DeviceWindows
 from photons_transport.comms.writer import Writer
 
 from photons_app.errors import TimedOut, FoundNoDevices, RunErrors, BadRunWithResults
@@ -18,6 +22,29 @@ import json
 
 log = logging.getLogger("photons_transport.comms")
 
+# size, protocol, source, target, reserved2, sequence, reserved4, pkt_type and reserved5
+# See photons_messages.frame for what these fields are
+header_struct = struct.Struct("<2xHI8s7xB8xH2x")
+
+
+def peek_header(data):
+    """
+    Return ``(protocol, pkt_type, source, target, sequence)`` from the header
+    of a LIFX protocol 1024 packet without unpacking the rest of the packet.
+
+    Return None if data is not long enough or isn't protocol 1024.
+    """
+    if len(data) < header_struct.size:
+        return None
+
+    protocol, source, target, sequence, pkt_type = header_struct.unpack_from(data)
+    protocol &= 0xFFF
+
+    if protocol != 1024:
+        return None
+
+    return protocol, pkt_type, source, target, sequence
+
 
 class FakeAck:
     represents_ack = True
@@ -202,6 +229,12 @@ class Communication:
             self.transport_target.final_future, name=f"{type(self).__name__}.__init__|stop_fut|"
         )
         self.receiver = Receiver()
+        self.single_flight = SingleFlight()
+        self.lanes = Lanes()
+
+        self.reply_cache = None
+        if getattr(self.transport_target, "reply_cache", False):
+            self.reply_cache = ReplyCache()
         self.received_data_tasks = hp.TaskHolder(
             self.stop_fut, name=f"{type(self).__name__}.__init__|received_data_tasks|"
         )
@@ -220,6 +253,10 @@ class Communication:
     def gatherer(self):
         return __import__("photons_control.planner").planner.Gatherer(self)
 
+    @hp.memoized_property
+    def device_windows(self):
+        return DeviceWindows.from_target(self.transport_target)
+
     async def finish(self):
         self.stop_fut.cancel()
         for serial in self.found.serials:
@@ -344,6 +381,104 @@ class Communication:
         return await self.send_single(packet, **kwargs)
 
     async def send_single(
+        self,
+        original,
+        packet,
+        *,
+        timeout,
+        no_retry=False,
+        broadcast=False,
+        connect_timeout=10,
+        use_reply_cache=True,
+    ):
+        """
+        Send this packet and return the replies
+
+        Identical ``Get`` messages to the same device that are sent whilst
+        this one is in flight share this send. See
+        ``photons_transport.comms.single_flight``.
+
+        If we have a ``reply_cache`` and ``use_reply_cache`` is True then
+        replies may come from that cache. ``Set`` messages always make the
+        cache forget the replies they change, before and after they are sent.
+        See ``photons_transport.comms.reply_cache``.
+
+        Packets that don't ask for an ack or a reply are given to
+        ``send_no_reply``.
+        """
+        reply_cache = self.reply_cache
+        serial = None if packet.tagged else packet.serial
+
+        cache = None
+        if reply_cache is not None:
+            reply_cache.forget_changes(original, serial)
+            if use_reply_cache and not broadcast and serial is not None:
+                cache = reply_cache
+
+        if cache is not None:
+            replies = cache.get(original, serial)
+            if replies is not None:
+                return replies
+
+        def send():
+            return self._send_single(
+                original,
+                packet,
+                timeout=timeout,
+                no_retry=no_retry,
+                broadcast=broadcast,
+                connect_timeout=connect_timeout,
+            )
+
+        key = self.single_flight.key(original, packet, broadcast)
+        try:
+            if not packet.ack_required and not packet.res_required:
+                replies = await self.send_no_reply(
+                    original, packet, broadcast=broadcast, connect_timeout=connect_timeout
+                )
+            elif key is None:
+                replies = await send()
+            else:
+                replies = await self.single_flight.send(key, send)
+        finally:
+            if reply_cache is not None:
+                # A Get may have been answered with the old value whilst this was sent
+                reply_cache.forget_changes(original, serial)
+
+        if cache is not None:
+            cache.add(original, serial, replies)
+
+        return replies
+
+    async def send_no_reply(self, original, packet, *, broadcast=False, connect_timeout=10):
+        """
+        Write this packet and return an empty list of replies
+
+        Unlike ``send_single`` this doesn't register a result or retry. It's
+        used for packets that don't ask for an ack or a reply, so nothing
+        needs to wait for anything to come back.
+        """
+        transport, is_broadcast = await self._find_transport(None, packet, original, broadcast)
+        t = await transport.spawn(original, timeout=connect_timeout)
+
+        bts = packet.tobytes(packet.serial)
+        if not is_broadcast:
+            await self.device_windows.pace(packet.serial)
+        await transport.write(t, bts, original)
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                hp.lc(
+                    "Sent message without waiting for a reply",
+                    serial=packet.serial,
+                    pkt=packet.pkt_type,
+                    bts=binascii.hexlify(bts).decode(),
+                )
+            )
+
+        return []
+
+    async def _send_single(
         self, original, packet, *, timeout, no_retry=False, broadcast=False, connect_timeout=10,
     ):
 
@@ -420,6 +555,11 @@ class Communication:
         )
 
     async def _transport_for_send(self, transport, packet, original, broadcast, connect_timeout):
+        transport, is_broadcast = await self._find_transport(transport, packet, original, broadcast)
+        await transport.spawn(original, timeout=connect_timeout)
+        return transport, is_broadcast
+
+    async def _find_transport(self, transport, packet, original, broadcast):
         is_broadcast = bool(broadcast)
 
         if transport is None and (is_broadcast or packet.target is None):
@@ -432,16 +572,53 @@ class Communication:
 
             transport = await self.choose_transport(original, self.found[packet.serial])
 
-        await transport.spawn(original, timeout=connect_timeout)
         return transport, is_broadcast
 
     def sync_received_data(self, *args, **kwargs):
         return self.received_data_tasks.add(self.received_data(*args, **kwargs))
 
     async def received_data(self, data, addr, allow_zero=False):
-        """What to do when we get some data"""
+        """
+        What to do when we get some data
+
+        If we have bytes then we first look at the header of the packet and
+        only unpack the packet if the receiver is expecting it.
+        """
+        pkt = self.packet_from_received(data, addr, allow_zero=allow_zero)
+        if pkt is not None:
+            await self.receiver.recv(pkt, addr, allow_zero=allow_zero)
+
+    def received_data_now(self, data, addr, allow_zero=False):
+        """
+        Like ``received_data`` but the packet is given to the result waiting
+        for it straight away instead of in a task.
+
+        A task is only made if the packet needs to go to the ``message_catcher``
+        on the receiver.
+        """
+        pkt = self.packet_from_received(data, addr, allow_zero=allow_zero)
+        if pkt is not None and not self.receiver.resolve(pkt, addr):
+            self.received_data_tasks.add(self.receiver.recv(pkt, addr, allow_zero=allow_zero))
+
+    def packet_from_received(self, data, addr, allow_zero=False):
+        """
+        Return the packet represented by this data, or None if the receiver
+        isn't expecting it or it can't be unpacked
+        """
         if type(data) is bytes:
-            log.debug(hp.lc("Received bytes", bts=binascii.hexlify(data).decode()))
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(hp.lc("Received bytes", bts=binascii.hexlify(data).decode()))
+
+            header = peek_header(data)
+            if header is not None:
+                _, pkt_type, source, target, sequence = header
+
+                if not self.receiver.expects(source, sequence, target, allow_zero=allow_zero):
+                    return None
+
+                if pkt_type == 45:
+                    serial = binascii.hexlify(target[:6]).decode()
+                    return FakeAck(source, sequence, target, serial, addr)
 
         try:
             protocol_register = self.transport_target.protocol_register
@@ -455,12 +632,10 @@ class Communication:
                 sequence = data[23]
 
                 serial = binascii.hexlify(target[:6]).decode()
-                pkt = FakeAck(source, sequence, target, serial, addr)
-            else:
-                if PacketKls is None:
-                    PacketKls = Packet
-                pkt = PacketKls.create(data)
+                return FakeAck(source, sequence, target, serial, addr)
+
+            if PacketKls is None:
+                PacketKls = Packet
+            return PacketKls.create(data)
         except Exception as error:
             log.exception(error)
-        else:
-            await self.receiver.recv(pkt, addr, allow_zero=allow_zero)
@@ -0,0 +1,113 @@
+"""
+Per device limits on how quickly we send messages.
+
+LIFX devices will drop messages if they receive too many at once, so a session
+can limit how many messages are waiting for replies from each device and how
+close together messages to the same device are sent.
+"""
+from photons_transport.comms.priority import PrioritySemaphore
+
+import asyncio
+import time
+
+
+class DeviceWindow:
+    """
+    An async context manager that is entered before sending a message to one
+    device.
+
+    It allows at most ``inflight`` messages at a time. Every write to the
+    device, including retries, calls ``pace`` first to wait until at least
+    ``gap`` seconds after the previous write.
+    """
+
+    def __init__(self, inflight, gap):
+        self.gap = gap
+        self.inflight = inflight
+        self.next_send = 0
+        self.semaphore = PrioritySemaphore(inflight) if inflight else None
+
+    def using(self, priority):
+        """Return an async context manager that waits for a slot with this priority"""
+        return PrioritisedWindow(self, priority)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def acquire(self, priority=None):
+        if self.semaphore is not None:
+            await self.semaphore.acquire(priority)
+
+    async def pace(self):
+        """Wait until at least ``gap`` seconds after the previous write"""
+        if self.gap:
+            now = time.time()
+            at = max(now, self.next_send)
+            self.next_send = at + self.gap
+            if at > now:
+                await asyncio.sleep(at - now)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def release(self):
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+
+class PrioritisedWindow:
+    """Used to enter a ``DeviceWindow`` with a priority"""
+
+    def __init__(self, window, priority):
+        self.window = window
+        self.priority = priority
+
+    async def __aenter__(self):
+        await self.window.acquire(self.priority)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.window.release()
+
+
+class DeviceWindows:
+    """
+    Holds a ``DeviceWindow`` per serial
+
+    inflight
+        The most messages we may be waiting on replies for from one device or
+        0 for no limit
+
+    gap
+        The minimum number of seconds between sending messages to one device
+    """
+
+    def __init__(self, inflight=None, gap=0):
+        self.gap = gap
+        self.inflight = inflight
+        self.windows = {}
+
+    @classmethod
+    def from_target(kls, target):
+        return kls(
+            inflight=getattr(target, "max_inflight_per_device", None),
+            gap=getattr(target, "min_gap_per_device", 0),
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.inflight or self.gap)
+
+    def window(self, serial):
+        """Return the DeviceWindow for this serial or None if we have no limits"""
+        if not self.enabled:
+            return None
+
+        window = self.windows.get(serial)
+        if window is None:
+            window = self.windows[serial] = DeviceWindow(self.inflight, self.gap)
+        return window
+
+    async def pace(self, serial):
+        """Called just before writing to this device"""
+        if self.gap and serial is not None:
+            await self.window(serial).pace()
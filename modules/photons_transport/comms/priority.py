@@ -0,0 +1,161 @@
+"""
+Letting some messages go before others.
+
+Messages can be sent with a ``priority`` of ``"interactive"``, ``"normal"`` or
+``"background"``:
+
+.. code-block:: python
+
+    await sender(DeviceMessages.SetPower(level=0), serial, priority="interactive")
+
+    async for pkt in sender(DeviceMessages.GetLabel(), serials, priority="background"):
+        ...
+
+The default is ``"normal"``.
+
+Messages sent with ``"background"`` priority wait to be sent whilst there are
+messages with ``"interactive"`` priority being sent by the same session. This
+means something like the ``DeviceFinderDaemon`` polling devices doesn't get in
+the way of a user turning off a light.
+
+If the target limits how many messages can be in flight to each device, then
+messages with a higher priority that are waiting for a slot are given the next
+free slot before messages with a lower priority. The same is true for the
+``limit`` on how many messages a ``run`` has in flight, which is a
+``PrioritySemaphore`` unless another kind of limit is given.
+"""
+from photons_transport.errors import InvalidPriority
+
+from photons_app import helpers as hp
+
+import asyncio
+import heapq
+
+INTERACTIVE = 0
+NORMAL = 1
+BACKGROUND = 2
+
+PRIORITIES = {"interactive": INTERACTIVE, "normal": NORMAL, "background": BACKGROUND}
+
+
+def rank(priority):
+    """Return the rank for this priority, where a smaller rank goes first"""
+    if priority is None:
+        return NORMAL
+    if priority not in PRIORITIES:
+        raise InvalidPriority(got=priority, available=list(PRIORITIES))
+    return PRIORITIES[priority]
+
+
+class Lane:
+    """An async context manager used around sending a message with a priority"""
+
+    def __init__(self, lanes, rank):
+        self.rank = rank
+        self.lanes = lanes
+
+    async def __aenter__(self):
+        await self.lanes.enter(self.rank)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.lanes.exit(self.rank)
+
+
+class Lanes:
+    """
+    Knows how many messages of each priority are being sent
+
+    Background messages wait until there are no interactive messages being
+    sent.
+    """
+
+    def __init__(self):
+        self.active = [0] * len(PRIORITIES)
+        self.waiting = []
+
+    def lane(self, priority):
+        return Lane(self, rank(priority))
+
+    async def enter(self, rank):
+        if rank == BACKGROUND:
+            while self.active[INTERACTIVE]:
+                fut = hp.create_future(name="Lanes::enter[wait_for_interactive]")
+                self.waiting.append(fut)
+                await fut
+        self.active[rank] += 1
+
+    def exit(self, rank):
+        self.active[rank] -= 1
+        if rank == INTERACTIVE and not self.active[INTERACTIVE]:
+            waiting, self.waiting = self.waiting, []
+            for fut in waiting:
+                if not fut.done():
+                    fut.set_result(True)
+
+
+class PrioritySemaphore:
+    """
+    A semaphore that gives free slots to the waiter with the best priority
+
+    Waiters with the same priority get slots in the order they asked for them.
+    """
+
+    def __init__(self, value):
+        self.value = value
+        self.count = 0
+        self.waiters = []
+
+    def locked(self):
+        return self.value == 0
+
+    def using(self, priority):
+        """Return an async context manager that waits for a slot with this priority"""
+        return PrioritisedSlot(self, priority)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    async def acquire(self, priority=None):
+        # Free slots are given straight to waiters, so there are none waiting
+        if self.value > 0:
+            self.value -= 1
+            return True
+
+        self.count += 1
+        fut = hp.create_future(name="PrioritySemaphore::acquire[fut]")
+        heapq.heappush(self.waiters, (rank(priority), self.count, fut))
+
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # We were given a slot but don't want it anymore
+                self.release()
+            raise
+
+        return True
+
+    def release(self):
+        self.value += 1
+        while self.waiters and self.value > 0:
+            _, _, fut = heapq.heappop(self.waiters)
+            if not fut.done():
+                self.value -= 1
+                fut.set_result(True)
+
+
+class PrioritisedSlot:
+    """Used to enter a ``PrioritySemaphore`` with a priority"""
+
+    def __init__(self, semaphore, priority):
+        self.semaphore = semaphore
+        self.priority = priority
+
+    async def __aenter__(self):
+        await self.semaphore.acquire(self.priority)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
@@ -1,35 +1,215 @@
 from photons_app import helpers as hp
 
 from bitarray import bitarray
+import binascii
 import logging
 import asyncio
 
 log = logging.getLogger("photons_transport.comms.receiver")
 
 
+class SequenceRing:
+    """
+    The results for one source and target with a slot for each of the 256
+    sequence numbers
+
+    Each slot is either None or ``(source, original, result)``
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.slots = [None] * 256
+
+
 class Receiver:
-    """Hold onto and routes replies from the bridge"""
+    """
+    Hold onto and routes replies from the bridge
+
+    Results are stored per source and target in a ``SequenceRing`` so finding
+    the result for a reply doesn't depend on how many results we are waiting
+    for.
+
+    Entries are forgotten as soon as a reply makes their result done, or when
+    we find their result is done. A timing wheel that turns every
+    ``wheel_tick`` seconds looks at entries every ``expire_after`` seconds and
+    forgets those with a result that is done, like those that timed out.
+    Entries with a result that isn't done yet are kept until it is.
+
+    Registering a result for a source, sequence and target that still has a
+    result that isn't done is a collision and is counted in ``collisions``.
+
+    Functions given to ``add_watcher`` are called with every reply that is
+    given to a result, so that things like the ``DeviceFinder`` can learn from
+    replies to messages they didn't send.
+    """
 
     message_catcher = NotImplemented
 
+    wheel_tick = 1
+    expire_after = 60
+
     def __init__(self):
-        self.results = {}
+        self.rings = {}
+        self.watchers = []
+        self.collisions = 0
         self.blank_target = bitarray("0" * 8 * 8).tobytes()
 
+        self.wheel = [[] for _ in range(int(self.expire_after / self.wheel_tick) + 1)]
+        self.wheel_handle = None
+        self.wheel_position = 0
+
     @property
     def loop(self):
         return asyncio.get_event_loop()
 
+    @property
+    def results(self):
+        """
+        Return ``{(source, sequence, target): (original, result)}`` for all the
+        results we are still waiting on
+
+        This looks at every slot of every ring, so it's slow and only here so
+        the results can be inspected. Use ``find`` to route replies.
+        """
+        results = {}
+        for (source, target), ring in self.rings.items():
+            for sequence, entry in enumerate(ring.slots):
+                if entry is not None and not entry[2].done():
+                    _, original, result = entry
+                    results[(source, sequence, target)] = (original, result)
+        return results
+
+    def add_watcher(self, watcher):
+        """Call this function with every reply we give to a result"""
+        self.watchers.append(watcher)
+
+    def remove_watcher(self, watcher):
+        """Stop calling this function with replies"""
+        if watcher in self.watchers:
+            self.watchers.remove(watcher)
+
     def register(self, packet, result, original):
         """Register a future waiting for a result"""
-        key = (packet.source, packet.sequence, packet.target)
-        self.results[key] = (original, result)
+        source, sequence, target = packet.source, packet.sequence, packet.target
+
+        ring = self.rings.get((source, target))
+        if ring is None:
+            ring = self.rings[(source, target)] = SequenceRing()
+
+        existing = ring.slots[sequence]
+        if existing is None:
+            ring.count += 1
+        elif existing[2] is not result and not existing[2].done():
+            self.collisions += 1
+            log.warning(
+                hp.lc(
+                    "Registered a result over one that isn't done yet",
+                    source=source,
+                    sequence=sequence,
+                    serial=binascii.hexlify(target[:6]).decode(),
+                    collisions=self.collisions,
+                )
+            )
+
+        entry = ring.slots[sequence] = (source, original, result)
+        self.schedule_expiry(entry, target, sequence)
+
+    def find(self, source, sequence, target):
+        """
+        Return ``(source, original, result)`` for the result waiting for this
+        reply, or None if there isn't one.
+
+        If we can't find a result for this target, then we look for one for a
+        broadcast with this source and sequence.
+        """
+        entry = self._find(source, sequence, target)
+        if entry is None:
+            entry = self._find(source, sequence, self.blank_target)
+        return entry
+
+    def _find(self, source, sequence, target):
+        ring = self.rings.get((source, target))
+        if ring is None:
+            return None
+
+        entry = ring.slots[sequence]
+        if entry is None:
+            return None
 
-        def cleanup(res):
-            if key in self.results:
-                del self.results[key]
+        if entry[2].done():
+            self.forget(entry, target, sequence)
+            return None
 
-        result.add_done_callback(cleanup)
+        return entry
+
+    def forget(self, entry, target, sequence):
+        """Remove this entry if it's still in the slot for its source, target and sequence"""
+        key = (entry[0], target)
+        ring = self.rings.get(key)
+        if ring is None or ring.slots[sequence] is not entry:
+            return
+
+        ring.slots[sequence] = None
+        ring.count -= 1
+        if ring.count == 0:
+            del self.rings[key]
+
+    def schedule_expiry(self, entry, target, sequence):
+        """Put this entry on the wheel so it's looked at after expire_after seconds"""
+        bucket = (self.wheel_position - 1) % len(self.wheel)
+        self.wheel[bucket].append((entry, target, sequence))
+
+        if self.wheel_handle is None:
+            self.wheel_handle = self.loop.call_later(self.wheel_tick, self.turn_wheel)
+
+    def turn_wheel(self):
+        """
+        Forget everything in the next bucket of the wheel that is done and put
+        the rest back on the wheel
+        """
+        self.wheel_handle = None
+        self.wheel_position = (self.wheel_position + 1) % len(self.wheel)
+
+        expired = self.wheel[self.wheel_position]
+        self.wheel[self.wheel_position] = []
+
+        for entry, target, sequence in expired:
+            if entry[2].done():
+                self.forget(entry, target, sequence)
+            else:
+                ring = self.rings.get((entry[0], target))
+                if ring is not None and ring.slots[sequence] is entry:
+                    self.schedule_expiry(entry, target, sequence)
+
+        if any(self.wheel):
+            self.wheel_handle = self.loop.call_later(self.wheel_tick, self.turn_wheel)
+
+    def expects(self, source, sequence, target, allow_zero=False):
+        """
+        Return whether a packet with this source, sequence and target would
+        be given to something by ``recv``.
+
+        This lets us avoid unpacking packets that nothing is waiting for.
+        """
+        if source == 0 and sequence == 0 and not allow_zero:
+            log.warning("Received message with 0 source and sequence")
+            return False
+
+        if self.message_catcher is not NotImplemented and callable(self.message_catcher):
+            return True
+
+        if self.find(source, sequence, target) is not None:
+            return True
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                hp.lc(
+                    "Received a message that wasn't expected",
+                    key=(source, sequence, target),
+                    serial=binascii.hexlify(target[:6]).decode(),
+                )
+            )
+        return False
 
     async def recv(self, pkt, addr, allow_zero=False):
         """Find the result for this packet and add the packet"""
@@ -46,15 +226,12 @@ class Receiver:
                 )
             )
 
-        key = (pkt.source, pkt.sequence, pkt.target)
-        broadcast_key = (pkt.source, pkt.sequence, self.blank_target)
-
         if pkt.source == 0 and pkt.sequence == 0:
             if not allow_zero:
                 log.warning("Received message with 0 source and sequence")
                 return
 
-        if key not in self.results and broadcast_key not in self.results:
+        if self.find(pkt.source, pkt.sequence, pkt.target) is None:
             if self.message_catcher is not NotImplemented and callable(self.message_catcher):
                 await self.message_catcher(pkt)
             else:
@@ -63,13 +240,48 @@ class Receiver:
                 # The first one back will unregister the future
                 # And so there's nothing to resolve with this newly received data
                 log.debug(
-                    hp.lc("Received a message that wasn't expected", key=key, serial=pkt.serial)
+                    hp.lc(
+                        "Received a message that wasn't expected",
+                        key=(pkt.source, pkt.sequence, pkt.target),
+                        serial=pkt.serial,
+                    )
                 )
             return
 
-        if key not in self.results:
-            key = broadcast_key
+        self.resolve(pkt, addr)
 
-        original = self.results[key][0]
+    def resolve(self, pkt, addr):
+        """
+        Give this packet to the result that is waiting for it and return True
+
+        Or return False if no result is waiting for this packet. Unlike ``recv``
+        this does not give the packet to the ``message_catcher``.
+        """
+        entry = self.find(pkt.source, pkt.sequence, pkt.target)
+        if entry is None:
+            return False
+
+        _, original, result = entry
         pkt.Information.update(remote_addr=addr, sender_message=original)
-        self.results[key][1].add_packet(pkt)
+        result.add_packet(pkt)
+
+        if result.done():
+            # Free the slot now rather than when the wheel gets to it
+            self.forget_done(pkt.source, pkt.sequence, pkt.target)
+
+        self.tell_watchers(pkt)
+        return True
+
+    def forget_done(self, source, sequence, target):
+        """Forget the entry for this reply and the broadcast entry if their result is done"""
+        for t in (target, self.blank_target):
+            self._find(source, sequence, t)
+
+    def tell_watchers(self, pkt):
+        """Give this reply to the functions given to ``add_watcher``"""
+        if self.watchers and not getattr(pkt, "represents_ack", False):
+            for watcher in list(self.watchers):
+                try:
+                    watcher(pkt)
+                except Exception:
+                    log.exception(hp.lc("Failed to give reply to a watcher", serial=pkt.serial))
@@ -0,0 +1,125 @@
+"""
+Remembering replies to messages that rarely change.
+
+Things like the version, firmware and label of a device don't change often
+but are asked for a lot. If a session has a ``ReplyCache`` as
+``sender.reply_cache`` then ``send_single`` gives back the replies it already
+has for these messages instead of asking the device again.
+
+The cache is off by default. It is turned on with the ``reply_cache`` option
+on the ``lan`` target, or by setting ``sender.reply_cache`` yourself:
+
+.. code-block:: python
+
+    from photons_transport.comms.reply_cache import ReplyCache
+
+
+    sender.reply_cache = ReplyCache({"GetLabel": 60, "GetVersion": None})
+
+Only the ``Get`` messages named in ``ttls`` are remembered. Their value is how
+many seconds to remember the replies for, or None to remember them for the
+rest of the session.
+
+Replies are forgotten when the matching ``Set`` message, i.e. ``SetLabel``
+for ``GetLabel``, is sent to that device. This happens before and after the
+``Set`` is sent, even if the cache isn't used for that send, and a ``Set``
+without a target forgets those replies for every device.
+
+The cache is skipped for a particular send by saying
+``sender(msg, serial, use_reply_cache=False)``.
+"""
+from photons_messages.frame import LIFXPacket
+
+import time
+
+DEFAULT_TTLS = {
+    "GetVersion": None,
+    "GetHostFirmware": None,
+    "GetWifiFirmware": None,
+    "GetLabel": 300,
+    "GetGroup": 300,
+    "GetLocation": 300,
+}
+
+
+class ReplyCache:
+    """
+    Replies for ``(serial, message.Key)``
+
+    hits
+        How many sends were answered from the cache
+
+    misses
+        How many sends for messages we remember were sent to the device
+    """
+
+    def __init__(self, ttls=None):
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+
+        self.hits = 0
+        self.misses = 0
+        self.entries = {}
+
+    def get(self, original, serial):
+        """Return the replies we have for this message to this device, or None"""
+        name = type(original).__name__
+        if name not in self.ttls or not isinstance(original, LIFXPacket):
+            return None
+
+        entry = self.entries.get(serial, {}).get(original.Key)
+        if entry is not None:
+            _, expires, replies = entry
+            if expires is None or time.time() < expires:
+                self.hits += 1
+                return list(replies)
+            del self.entries[serial][original.Key]
+
+        self.misses += 1
+        return None
+
+    def add(self, original, serial, replies):
+        """Remember these replies if we cache this message"""
+        name = type(original).__name__
+        if name not in self.ttls or not isinstance(original, LIFXPacket) or not replies:
+            return
+
+        ttl = self.ttls[name]
+        expires = None if ttl is None else time.time() + ttl
+        self.entries.setdefault(serial, {})[original.Key] = (name, expires, list(replies))
+
+    def forget_changes(self, original, serial):
+        """
+        Forget the replies that this message changes if it's a ``Set`` message
+
+        If serial is None then they are forgotten for every device.
+        """
+        name = type(original).__name__
+        if isinstance(original, LIFXPacket) and name.startswith("Set"):
+            self.invalidate(serial, f"Get{name[3:]}")
+
+    def invalidate(self, serial, name=None):
+        """
+        Forget the replies for this device, or only those for the message with
+        this name
+
+        If serial is None then replies are forgotten for every device.
+        """
+        if serial is None:
+            for serial in list(self.entries):
+                self.invalidate(serial, name)
+            return
+
+        if name is None:
+            self.entries.pop(serial, None)
+            return
+
+        entries = self.entries.get(serial)
+        if not entries:
+            return
+
+        for key, entry in list(entries.items()):
+            if entry[0] == name:
+                del entries[key]
+
+        if not entries:
+            del self.entries[serial]
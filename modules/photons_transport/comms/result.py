@@ -14,6 +14,8 @@ class Result(asyncio.Future):
         self.did_broadcast = did_broadcast
         self.retry_options = retry_options
 
+        self.sent_at = None
+
         self.results = []
         self.last_ack_received = None
         self.last_res_received = None
@@ -23,8 +25,19 @@ class Result(asyncio.Future):
         if not self.request.ack_required and not self.request.res_required:
             self.set_result([])
 
+    def mark_sent(self):
+        """
+        Record when the request was written so that the round trip time
+        doesn't include waiting to be written
+        """
+        self.sent_at = time.time()
+
     def add_packet(self, pkt):
         """Determine if we should call add_ack or add_result"""
+        if not self.did_broadcast and self.sent_at is not None:
+            if self.last_ack_received is None and self.last_res_received is None:
+                self.retry_options.record_rtt(time.time() - self.sent_at)
+
         if getattr(pkt, "represents_ack", False):
             self.add_ack()
         else:
@@ -0,0 +1,102 @@
+"""
+Sharing one send between identical requests.
+
+If two callers ask the same device the same question at the same time, for
+example ``LightMessages.GetColor``, then there is no need to send it twice.
+The ``Communication`` has a ``SingleFlight`` as ``single_flight`` that is used
+by ``send_single`` so that identical ``Get`` messages sent to one device while
+another is still waiting for a reply share that send and get the same replies.
+
+Requests are identical if they have the same serial, packet type and payload.
+Broadcasts, messages that don't ask for a reply and messages that aren't a
+``Get`` are always sent.
+
+Note that the waiters share the timeout and retries of the first send.
+"""
+from photons_app import helpers as hp
+
+import asyncio
+
+
+class Flight:
+    """The replies for a send that is in flight and how many others are waiting for them"""
+
+    __slots__ = ["fut", "waiters"]
+
+    def __init__(self, fut):
+        self.fut = fut
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Knows what requests are in flight
+
+    coalesced
+        How many requests used a send that was already in flight
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self.in_flight = {}
+
+    def key(self, original, packet, broadcast):
+        """
+        Return ``(serial, pkt_type, payload)`` for this packet, or None if it
+        shouldn't share a send with other packets
+        """
+        if broadcast or packet.target is None or not packet.res_required:
+            return None
+
+        if not type(original).__name__.startswith("Get"):
+            return None
+
+        payload = packet.payload
+        if not isinstance(payload, bytes):
+            return None
+
+        return (packet.serial, packet.pkt_type, payload)
+
+    async def send(self, key, send):
+        """
+        Return the replies from ``send()``, or from the send already in flight
+        for this key.
+
+        If the send in flight is cancelled then those waiting for it try again.
+        """
+        flight = self.in_flight.get(key)
+        if flight is not None:
+            return await self.wait(key, send, flight)
+
+        flight = self.in_flight[key] = Flight(hp.create_future(name="SingleFlight::send[fut]"))
+
+        try:
+            result = await send()
+        except asyncio.CancelledError:
+            flight.fut.cancel()
+            raise
+        except Exception as error:
+            if flight.waiters:
+                flight.fut.set_exception(error)
+            else:
+                flight.fut.cancel()
+            raise
+        else:
+            flight.fut.set_result(result)
+            return result
+        finally:
+            if self.in_flight.get(key) is flight:
+                del self.in_flight[key]
+
+    async def wait(self, key, send, flight):
+        self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return list(await asyncio.shield(flight.fut))
+        except asyncio.CancelledError:
+            if not flight.fut.cancelled():
+                raise
+        finally:
+            flight.waiters -= 1
+
+        return await self.send(key, send)
@@ -0,0 +1,194 @@
+"""
+Packets that are sent to many devices with only the header changed.
+
+``Item.make_packets`` makes a packet for every serial for every message. Rather
+than cloning, updating and packing a whole packet for each one, a
+``PacketTemplate`` packs a message once and makes ``TemplatedPacket`` objects
+that share those bytes and only change the source, target and sequence.
+
+Usage looks like:
+
+.. code-block:: python
+
+    template = PacketTemplate.from_packet(packet.simplify())
+    if template is not None:
+        pkt = template.make(serial, source, sequence)
+        bts = pkt.tobytes()
+"""
+from photons_messages.frame import LIFXPacket
+
+import binascii
+import struct
+
+source_struct = struct.Struct("<I")
+
+# Where the fields we change live in a LIFX protocol 1024 header
+# See photons_messages.frame for what these fields are
+SOURCE = slice(4, 8)
+TARGET = slice(8, 16)
+PROTOCOL_FLAGS = 3
+FLAGS = 22
+SEQUENCE = 23
+
+
+class PacketTemplate:
+    """
+    The bytes for a packet and the values it was made with.
+
+    Use ``PacketTemplate.from_packet(packet)`` to make one. This will be
+    ``None`` if the packet can't be represented by a template.
+    """
+
+    def __init__(self, packet, bts):
+        self.bts = bts
+        self.packet = packet
+        self.protocol = packet.protocol
+        self.pkt_type = packet.pkt_type
+
+    @classmethod
+    def from_packet(kls, packet):
+        """
+        Return a PacketTemplate for this simplified packet
+
+        Or None if the packet isn't a ``LIFXPacket``, has values that are made
+        per serial, or can't be packed.
+        """
+        if not isinstance(packet, LIFXPacket) or packet.is_dynamic:
+            return None
+
+        seed = packet.clone()
+        try:
+            # Any target works here because targets only change the tagged field
+            # when the target is empty, and templates are only for serials
+            seed.update(dict(target="d073d5000000", source=0, sequence=0))
+            bts = seed.tobytes(None)
+        except Exception:
+            # The packet will complain about this when it's sent the normal way
+            return None
+
+        if len(bts) < SEQUENCE + 1:
+            return None
+
+        return kls(packet, bts)
+
+    def make(self, serial, source, sequence):
+        """Return a TemplatedPacket for this serial, source and sequence"""
+        bts = bytearray(self.bts)
+        bts[SOURCE] = source_struct.pack(source)
+        bts[TARGET] = binascii.unhexlify(serial)[:8].ljust(8, b"\x00")
+        bts[SEQUENCE] = sequence
+        return TemplatedPacket(self, bts, serial)
+
+
+class TemplatedPacket:
+    """
+    A packet made from a ``PacketTemplate``
+
+    It has the same properties as a simplified packet that are used to send it
+    and find replies to it, and the rest of the packet is unpacked on demand.
+    """
+
+    __slots__ = ["template", "_bts", "serial", "_unpacked"]
+
+    def __init__(self, template, bts, serial):
+        self._bts = bts
+        self.serial = serial
+        self.template = template
+        self._unpacked = None
+
+    @property
+    def protocol(self):
+        return self.template.protocol
+
+    @property
+    def pkt_type(self):
+        return self.template.pkt_type
+
+    @property
+    def Meta(self):
+        return self.template.packet.Meta
+
+    @property
+    def is_dynamic(self):
+        return False
+
+    @property
+    def source(self):
+        return source_struct.unpack(self._bts[SOURCE])[0]
+
+    @property
+    def target(self):
+        return bytes(self._bts[TARGET])
+
+    @property
+    def sequence(self):
+        return self._bts[SEQUENCE]
+
+    @sequence.setter
+    def sequence(self, value):
+        self._bts[SEQUENCE] = value
+        self._unpacked = None
+
+    @property
+    def payload(self):
+        return self.template.packet.payload
+
+    @property
+    def tagged(self):
+        return bool(self._bts[PROTOCOL_FLAGS] & 0b100000)
+
+    @property
+    def res_required(self):
+        return bool(self._bts[FLAGS] & 0b1)
+
+    @property
+    def ack_required(self):
+        return bool(self._bts[FLAGS] & 0b10)
+
+    def actual(self, key):
+        if key in ("source", "target", "sequence"):
+            return getattr(self, key)
+        return self.unpacked.actual(key)
+
+    def clone(self):
+        return TemplatedPacket(self.template, bytearray(self._bts), self.serial)
+
+    def simplify(self, serial=None):
+        return self
+
+    def tobytes(self, serial=None):
+        return bytes(self._bts)
+
+    def pack(self):
+        return self.unpacked.pack()
+
+    @property
+    def unpacked(self):
+        """The packet these bytes represent"""
+        if self._unpacked is None:
+            self._unpacked = type(self.template.packet).create(bytes(self._bts))
+        return self._unpacked
+
+    def __getattr__(self, key):
+        if key.startswith("_"):
+            raise AttributeError(key)
+        return getattr(self.unpacked, key)
+
+    def __or__(self, kls):
+        return self.template.packet | kls
+
+    def __eq__(self, other):
+        if isinstance(other, TemplatedPacket):
+            return self._bts == other._bts
+        return NotImplemented
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        if eq is NotImplemented:
+            return eq
+        return not eq
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<TemplatedPacket {self.unpacked!r}>"
@@ -34,6 +34,7 @@ class Writer:
         self.modify_sequence()
         result = self.register()
         bts = await self.write()
+        result.mark_sent()
 
         lc = hp.lc.using(
             serial=self.clone.serial,
@@ -65,5 +66,7 @@ class Writer:
     async def write(self):
         bts = self.clone.tobytes(self.clone.serial)
         t = await self.transport.spawn(self.original, timeout=self.connect_timeout)
+        if not self.did_broadcast:
+            await self.session.device_windows.pace(self.clone.serial)
         await self.transport.write(t, bts, self.original)
         return bts
@@ -13,6 +13,14 @@ class CouldntMakeConnection(PhotonsAppError):
     pass
 
 
+class ShardStopped(PhotonsAppError):
+    desc = "Worker process for a sharded session stopped"
+
+
+class InvalidPriority(PhotonsAppError):
+    desc = "Unknown priority"
+
+
 class InvalidBroadcast(PhotonsAppError):
     desc = "Provided broadcast is invalid"
 
@@ -57,6 +57,12 @@ class RetryOptions:
         if timeouts is not None:
             self.timeouts = timeouts
 
+    def record_rtt(self, rtt):
+        """
+        Called by a Result with how long it took to get the first reply for
+        a message that wasn't broadcast
+        """
+
     async def tick(self, final_future, timeout, min_wait=0.1):
         timeouts = list(self.timeouts)
         step, end = timeouts.pop(0)
@@ -83,3 +89,98 @@ class RetryOptions:
                         end = None
 
                 yield round(final_time - now, 3), nxt
+
+
+class RTTEstimator:
+    """
+    Keeps a smoothed round trip time and round trip time variation per serial
+    and uses them to determine a retransmission timeout like TCP does in
+    RFC 6298.
+
+    alpha and beta
+        How much each new round trip time changes the smoothed round trip time
+        and the round trip time variation.
+
+    k
+        How many round trip time variations to add to the smoothed round trip
+        time.
+
+    granularity
+        The smallest amount of variation we add to the smoothed round trip time
+
+    min_rto and max_rto
+        The bounds of the retransmission timeout
+    """
+
+    k = 4
+    alpha = 1 / 8
+    beta = 1 / 4
+    granularity = 0.01
+
+    min_rto = 0.1
+    max_rto = 5
+
+    def __init__(self):
+        self.estimates = {}
+
+    def add(self, serial, rtt):
+        """Record a round trip time for this serial"""
+        estimate = self.estimates.get(serial)
+        if estimate is None:
+            self.estimates[serial] = (rtt, rtt / 2)
+            return
+
+        srtt, rttvar = estimate
+        rttvar = (1 - self.beta) * rttvar + self.beta * abs(srtt - rtt)
+        srtt = (1 - self.alpha) * srtt + self.alpha * rtt
+        self.estimates[serial] = (srtt, rttvar)
+
+    def rto(self, serial):
+        """Return the retransmission timeout for this serial or None if we have no estimate"""
+        estimate = self.estimates.get(serial)
+        if estimate is None:
+            return None
+
+        srtt, rttvar = estimate
+        rto = srtt + max(self.granularity, self.k * rttvar)
+        return min(self.max_rto, max(self.min_rto, rto))
+
+
+class AdaptiveRetryOptions(RetryOptions):
+    """
+    RetryOptions that uses the round trip times recorded in an RTTEstimator
+    for this serial to determine the retry backoff.
+
+    Until we have a round trip time for this serial we use the timeouts from
+    RetryOptions.
+
+    Once we do, the first retry is after the retransmission timeout, and then
+    retries happen twice and then four times as far apart.
+    """
+
+    def __init__(self, estimator, serial, **kwargs):
+        self.serial = serial
+        self.estimator = estimator
+        super().__init__(**kwargs)
+
+    @property
+    def timeouts(self):
+        if "timeouts" in self.__dict__:
+            return self.__dict__["timeouts"]
+
+        rto = None
+        if self.serial is not None:
+            rto = self.estimator.rto(self.serial)
+
+        if rto is None:
+            return RetryOptions.timeouts
+
+        return [(rto, rto), (rto * 2, rto * 5), (min(rto * 4, self.estimator.max_rto), rto * 13)]
+
+    @timeouts.setter
+    def timeouts(self, timeouts):
+        self.__dict__["timeouts"] = timeouts
+
+    def record_rtt(self, rtt):
+        if self.serial is not None:
+            self.estimator.add(self.serial, rtt)
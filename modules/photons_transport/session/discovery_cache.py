@@ -0,0 +1,141 @@
+"""
+A file that remembers where devices were found so that a new session can talk
+to them straight away instead of waiting for broadcast discovery.
+"""
+from photons_app import helpers as hp
+
+from photons_messages import Services
+
+import logging
+import json
+import time
+import os
+
+log = logging.getLogger("photons_transport.session.discovery_cache")
+
+
+class DiscoveryCache:
+    """
+    Knows how to read and write the discovery cache file.
+
+    The file is json that looks like:
+
+    .. code-block:: json
+
+        {
+          "d073d5000001": {
+            "services": {"UDP": {"host": "192.168.0.3", "port": 56700}},
+            "last_seen": 1598000000.0
+          }
+        }
+
+    Devices that haven't been seen in ``max_age`` seconds are not used. If
+    ``max_age`` is None then devices are used regardless of when they were
+    last seen.
+
+    Seeing a device at the same address only changes ``last_seen`` if it's
+    more than ``last_seen_resolution`` seconds newer, so finding the same
+    devices over and over doesn't rewrite the file every time.
+    """
+
+    last_seen_resolution = 60
+
+    def __init__(self, path, max_age=None):
+        self.path = path
+        self.max_age = max_age
+        self.changed = False
+        self.devices = self.load()
+
+    def load(self):
+        """Return the devices in the file, or an empty dictionary if we can't read it"""
+        try:
+            with open(self.path) as fle:
+                data = json.load(fle)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as error:
+            log.warning(hp.lc("Failed to read discovery cache", path=self.path, error=error))
+            return {}
+
+        if not isinstance(data, dict):
+            log.warning(hp.lc("Discovery cache was not a dictionary", path=self.path))
+            return {}
+
+        devices = {}
+        for serial, info in data.items():
+            try:
+                services = {
+                    name: {"host": str(options["host"]), "port": int(options["port"])}
+                    for name, options in info["services"].items()
+                }
+                devices[serial] = {"services": services, "last_seen": float(info["last_seen"])}
+            except (TypeError, KeyError, ValueError, AttributeError):
+                log.warning(hp.lc("Ignoring invalid entry in discovery cache", serial=serial))
+
+        return devices
+
+    def fresh(self):
+        """
+        Return ``{serial: {service: {"host": host, "port": port}}}`` for the
+        devices that were seen within max_age seconds
+        """
+        now = time.time()
+
+        found = {}
+        for serial, info in self.devices.items():
+            if self.max_age is not None and now - info["last_seen"] > self.max_age:
+                continue
+
+            services = {}
+            for name, options in info["services"].items():
+                service = Services.__members__.get(name)
+                if service is not None:
+                    services[service] = dict(options)
+
+            if services:
+                found[serial] = services
+
+        return found
+
+    def add(self, serial, service, host, port):
+        """Record that we found this service for this device"""
+        if service.name.startswith("RESERVED"):
+            return
+
+        info = self.devices.get(serial)
+        if info is None:
+            info = self.devices[serial] = {"services": {}, "last_seen": 0}
+
+        now = time.time()
+        options = {"host": host, "port": port}
+        if info["services"].get(service.name) == options:
+            if now - info["last_seen"] < self.last_seen_resolution:
+                return
+
+        info["services"][service.name] = options
+        info["last_seen"] = now
+        self.changed = True
+
+    def remove(self, serial):
+        """Forget this device"""
+        if self.devices.pop(serial, None) is not None:
+            self.changed = True
+
+    def save(self):
+        """Write the cache to disk if it has changed"""
+        if not self.changed:
+            return
+
+        tmp = f"{self.path}.tmp"
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp, "w") as fle:
+                json.dump(self.devices, fle, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError as error:
+            log.warning(hp.lc("Failed to write discovery cache", path=self.path, error=error))
+            return
+
+        self.changed = False
@@ -1,3 +1,5 @@
+from photons_transport.session.discovery_cache import DiscoveryCache
+
 from photons_messages import Services
 
 from delfick_project.norms import dictobj, sb, BadSpecValue, Meta
@@ -133,11 +135,20 @@ class DiscoveryOptions(dictobj.Spec):
     Note that regardless of what you specify, if you have an HARDCODED_DISCOVERY
     in your environment, then hardcoded_discovery will be based off that, and
     the same goes for serial_filter and SERIAL_FILTER env variable.
+
+    cache_file may be a path to a file where we remember where we found devices.
+    When a session needs to find devices and all of them are in this file, it
+    will use the information in the file instead of broadcasting and then check
+    in the background that those devices are still there. Devices that haven't
+    been seen in cache_max_age seconds (defaults to a day) are ignored.
     """
 
     serial_filter = dictobj.Field(serial_filter_spec)
     hardcoded_discovery = dictobj.Field(hardcoded_discovery_spec)
 
+    cache_file = dictobj.Field(sb.optional_spec(sb.string_spec()))
+    cache_max_age = dictobj.Field(sb.optional_spec(sb.float_spec()))
+
     async def discover(self, add_service):
         found_now = set()
         for serial, services in self.hardcoded_discovery.items():
@@ -156,6 +167,21 @@ class DiscoveryOptions(dictobj.Spec):
     def has_hardcoded_discovery(self):
         return self.hardcoded_discovery and self.hardcoded_discovery is not sb.NotSpecified
 
+    @property
+    def has_discovery_cache(self):
+        return bool(self.cache_file) and self.cache_file is not sb.NotSpecified
+
+    def make_discovery_cache(self):
+        """Return a DiscoveryCache for our cache_file, or None if we don't have one"""
+        if not self.has_discovery_cache:
+            return None
+
+        max_age = self.cache_max_age
+        if max_age is sb.NotSpecified:
+            max_age = 60 * 60 * 24
+
+        return DiscoveryCache(os.path.expanduser(self.cache_file), max_age=max_age)
+
 
 class NoDiscoveryOptions(DiscoveryOptions):
     """
@@ -165,6 +191,8 @@ class NoDiscoveryOptions(DiscoveryOptions):
 
     serial_filter = dictobj.Field(sb.overridden(None))
     hardcoded_discovery = dictobj.Field(sb.overridden(None))
+    cache_file = dictobj.Field(sb.overridden(None))
+    cache_max_age = dictobj.Field(sb.overridden(None))
 
 
 class NoEnvDiscoveryOptions(DiscoveryOptions):
@@ -205,4 +233,10 @@ class discovery_options_spec(sb.Spec):
         elif isinstance(base.serial_filter, list):
             base.serial_filter = list(base.serial_filter)
 
+        if val.cache_file is not sb.NotSpecified:
+            base.cache_file = val.cache_file
+
+        if val.cache_max_age is not sb.NotSpecified:
+            base.cache_max_age = val.cache_max_age
+
         return base
@@ -1,7 +1,7 @@
 from photons_transport.errors import InvalidBroadcast, UnknownService, NoDesiredService
-from photons_transport.retry_options import RetryOptions
+from photons_transport.retry_options import RetryOptions, RTTEstimator, AdaptiveRetryOptions
 from photons_transport.comms.base import Communication
-from photons_transport.transports.udp import UDP
+from photons_transport.transports.udp import UDP, SharedUDP, UDPEngine
 
 from photons_app import helpers as hp
 
@@ -9,6 +9,7 @@ from photons_messages import DiscoveryMessages, Services
 
 import binascii
 import logging
+import time
 
 log = logging.getLogger("photons_transport.session.network")
 
@@ -17,17 +18,52 @@ class UDPRetryOptions(RetryOptions):
     pass
 
 
+class AdaptiveUDPRetryOptions(AdaptiveRetryOptions, UDPRetryOptions):
+    pass
+
+
 class NetworkSession(Communication):
     """
     Knows how to discover by broadcasting GetService. It then knows per packet
     which service to use for sending messages.
+
+    If the target has ``shared_socket`` set to True then all devices are talked
+    to using one socket in a ``UDPEngine``.
+
+    If the target has ``targeted_discovery`` set to True then finding specific
+    serials we already have an address for asks those addresses directly and
+    only broadcasts for the devices that don't reply.
     """
 
     UDPTransport = UDP
+    SharedUDPTransport = SharedUDP
+
+    discovery_cache_check_timeout = 2
+    targeted_discovery_timeout = 1
 
     def setup(self):
         self.broadcast_transports = {}
 
+        self.discovery_cache = None
+        self.checked_discovery_cache = False
+        self.discovery_cache_tasks = hp.TaskHolder(
+            self.stop_fut, name=f"{type(self).__name__}.setup|discovery_cache_tasks|"
+        )
+
+        discovery_options = getattr(self.transport_target, "discovery_options", None)
+        if discovery_options is not None and discovery_options.has_discovery_cache:
+            self.discovery_cache = discovery_options.make_discovery_cache()
+
+        self.udp_engine = None
+        if getattr(self.transport_target, "shared_socket", False):
+            self.udp_engine = UDPEngine(self)
+
+    @property
+    def udp_transport_kls(self):
+        if self.udp_engine is None:
+            return self.UDPTransport
+        return self.SharedUDPTransport
+
     async def finish(self):
         await super().finish()
 
@@ -42,8 +78,23 @@ class NetworkSession(Communication):
                 if exc:
                     log.error(hp.lc("Failed to close broadcast transport", error=exc))
 
+        if self.udp_engine is not None:
+            self.udp_engine.close()
+
+        await self.discovery_cache_tasks.finish()
+        if self.discovery_cache is not None:
+            self.discovery_cache.save()
+
+    @hp.memoized_property
+    def rtt_estimator(self):
+        return RTTEstimator()
+
     def retry_options_for(self, packet, transport):
-        return UDPRetryOptions(name=f"{type(self).__name__}::retry_options_for")
+        name = f"{type(self).__name__}::retry_options_for"
+        if getattr(self.transport_target, "adaptive_retries", False):
+            serial = getattr(transport, "serial", None)
+            return AdaptiveUDPRetryOptions(self.rtt_estimator, serial, name=name)
+        return UDPRetryOptions(name=name)
 
     async def determine_needed_transport(self, packet, services):
         return [Services.UDP]
@@ -65,13 +116,143 @@ class NetworkSession(Communication):
         raise NoDesiredService("Don't have a desired service", need=need, have=list(services))
 
     async def _do_search(self, serials, timeout, **kwargs):
-        found_now = set()
         discovery_options = self.transport_target.discovery_options
 
         if discovery_options.has_hardcoded_discovery:
             log.debug("Using hard coded discovery information")
             return await discovery_options.discover(self.add_service)
 
+        if self.discovery_cache is not None and not self.checked_discovery_cache:
+            found_now = await self._search_discovery_cache(serials)
+            if found_now is not None:
+                return found_now
+
+        if serials is not None and getattr(self.transport_target, "targeted_discovery", False):
+            return await self._targeted_search(serials, timeout, **kwargs)
+
+        return await self._broadcast_search(serials, timeout, **kwargs)
+
+    async def _targeted_search(self, serials, timeout, **kwargs):
+        """
+        Ask the serials we already have an address for where they are and only
+        broadcast for the rest.
+
+        Devices we weren't looking for are left in found.
+        """
+        start = time.time()
+        discovery_options = self.transport_target.discovery_options
+
+        cached = {}
+        if self.discovery_cache is not None:
+            cached = self.discovery_cache.fresh()
+
+        known = []
+        for serial in serials:
+            if not discovery_options.want(serial):
+                continue
+
+            if serial not in self.found and serial in cached:
+                for service, options in cached[serial].items():
+                    await self.add_service(serial, service, **options)
+
+            if serial in self.found:
+                known.append(serial)
+
+        seen = set()
+        if known:
+            log.debug(hp.lc("Looking for known devices", serials=known))
+            seen = await self._unicast_search(known, min(timeout, self.targeted_discovery_timeout))
+
+        looking_for = [self.found.cleanse_serial(serial) for serial in serials]
+        found_now = set(target for target in self.found if target not in looking_for)
+        found_now.update(binascii.unhexlify(serial)[:6] for serial in seen)
+
+        missing = [serial for serial in serials if serial not in seen]
+        if missing:
+            remaining = max(timeout - (time.time() - start), 0.1)
+            found_now.update(await self._broadcast_search(missing, remaining, **kwargs))
+
+        return list(found_now)
+
+    async def _unicast_search(self, serials, timeout):
+        """
+        Send GetService to the addresses we have for these serials and return
+        the serials that replied
+        """
+        get_service = DiscoveryMessages.GetService(ack_required=False, res_required=True)
+
+        seen = set()
+        async for pkt in self(
+            get_service, serials, accept_found=True, message_timeout=timeout, error_catcher=[],
+        ):
+            if pkt | DiscoveryMessages.StateService:
+                seen.add(pkt.serial)
+                addr = pkt.Information.remote_addr
+                await self.add_service(pkt.serial, pkt.service, host=addr[0], port=pkt.port)
+                if self.discovery_cache is not None:
+                    self.discovery_cache.add(pkt.serial, pkt.service, addr[0], pkt.port)
+
+        return seen
+
+    async def _search_discovery_cache(self, serials):
+        """
+        Add services from the discovery cache if it has all the serials we want
+
+        Return None if we can't use the cache, otherwise return what we found and
+        check in the background that those devices are still where we think.
+        """
+        discovery_options = self.transport_target.discovery_options
+
+        cached = {
+            serial: services
+            for serial, services in self.discovery_cache.fresh().items()
+            if discovery_options.want(serial)
+        }
+
+        if not cached:
+            return None
+
+        if serials is not None and not all(serial in cached for serial in serials):
+            return None
+
+        log.debug(hp.lc("Using discovery cache", serials=sorted(cached)))
+
+        found_now = set()
+        for serial, services in cached.items():
+            found_now.add(binascii.unhexlify(serial)[:6])
+            for service, options in services.items():
+                await self.add_service(serial, service, **options)
+
+        self.checked_discovery_cache = True
+        self.discovery_cache_tasks.add(self._check_discovery_cache(list(cached), serials is None))
+        return list(found_now)
+
+    async def _check_discovery_cache(self, serials, find_all):
+        """
+        Ask the devices we got from the discovery cache where they are and
+        forget those that don't reply, so that the next time we look for them
+        we broadcast.
+
+        If we were finding all devices then we also broadcast to find any new
+        devices.
+        """
+        try:
+            seen = await self._unicast_search(serials, self.discovery_cache_check_timeout)
+
+            for serial in serials:
+                if serial not in seen:
+                    self.discovery_cache.remove(serial)
+                    await self.forget(serial)
+
+            if find_all:
+                await self._broadcast_search(None, 5)
+        finally:
+            self.discovery_cache.save()
+
+    async def _broadcast_search(self, serials, timeout, **kwargs):
+        found_now = set()
+        discovery_options = self.transport_target.discovery_options
+
         get_service = DiscoveryMessages.GetService(
             target=None, tagged=True, addressable=True, res_required=True, ack_required=False
         )
@@ -90,6 +271,8 @@ class NetworkSession(Communication):
                         addr = pkt.Information.remote_addr
                         found_now.add(pkt.target[:6])
                         await self.add_service(pkt.serial, pkt.service, host=addr[0], port=pkt.port)
+                        if self.discovery_cache is not None:
+                            self.discovery_cache.add(pkt.serial, pkt.service, addr[0], pkt.port)
 
             if serials is None:
                 if found_now:
@@ -97,6 +280,9 @@ class NetworkSession(Communication):
             elif all(binascii.unhexlify(serial)[:6] in found_now for serial in serials):
                 break
 
+        if self.discovery_cache is not None:
+            self.discovery_cache.save()
+
         return list(found_now)
 
     async def _search_retry_iterator(self, end_after):
@@ -113,7 +299,7 @@ class NetworkSession(Communication):
         if service != Services.UDP:
             raise UnknownService(service=service)
 
-        return self.UDPTransport(self, kwargs["host"], kwargs["port"], serial=serial)
+        return self.udp_transport_kls(self, kwargs["host"], kwargs["port"], serial=serial)
 
     async def make_broadcast_transport(self, broadcast):
         if broadcast is True:
@@ -130,6 +316,6 @@ class NetworkSession(Communication):
         if broadcast in self.broadcast_transports:
             return self.broadcast_transports[broadcast]
 
-        transport = UDP(self, *broadcast)
+        transport = self.udp_transport_kls(self, *broadcast)
         self.broadcast_transports[broadcast] = transport
         return transport
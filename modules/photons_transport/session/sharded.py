@@ -0,0 +1,552 @@
+"""
+A session that spreads devices over worker processes.
+
+Everything a ``NetworkSession`` does happens on one event loop, so one process
+only ever uses one core. If the ``LanTarget`` has ``shards`` set to more than
+one, then ``target.session()`` gives a ``ShardedNetworkSession`` instead.
+
+The ``ShardedNetworkSession`` still finds devices, holds ``found`` and sends
+broadcasts itself. Messages to a particular device are given to one of
+``shards`` worker processes, chosen from the serial of the device. Each worker
+has its own ``NetworkSession`` with it's own sockets that sends the message,
+waits for replies and retries. The replies are given back to the front session
+over a socket.
+
+So that the front session does as little as possible for each device, a
+``PacketTemplate`` is given to a worker once and each message after that is
+only the id of the template with the serial and source to make the packet
+with. The worker makes the packet itself. Replies are given back as bytes and
+the front session only reads their header until something asks for more.
+
+The worker gives every message it sends a sequence from it's own session, the
+same way it does when it retries a message. This way only one counter ever
+gives out sequences for a device and a retry can't reuse the sequence of
+another message to that device that is still in flight.
+
+This means scripts use a sharded session the same way as any other session:
+
+.. code-block:: python
+
+    target = LanTarget.create(configuration, {"shards": 4})
+
+    async with target.session() as sender:
+        async for pkt in sender(DeviceMessages.GetPower(), serials):
+            ...
+
+Workers are started the first time a message is sent to a device they are
+responsible for and are stopped when the session is finished.
+"""
+from photons_transport.comms.template import PacketTemplate, TemplatedPacket
+from photons_transport.errors import FailedToFindDevice, ShardStopped
+from photons_transport.session.network import NetworkSession
+from photons_transport.comms.base import FakeAck, peek_header
+
+from photons_app.errors import PhotonsAppError
+from photons_app import helpers as hp
+
+from photons_messages import Services, protocol_register
+from photons_protocol.packets import Information
+from photons_protocol.messages import Messages
+
+import multiprocessing
+import binascii
+import logging
+import asyncio
+import weakref
+import socket
+import struct
+import pickle
+
+log = logging.getLogger("photons_transport.session.sharded")
+
+frame_struct = struct.Struct("<I")
+
+# The options on the LanTarget that workers use for their own target
+WORKER_OPTIONS = (
+    "default_broadcast",
+    "shared_socket",
+    "adaptive_retries",
+    "max_inflight_per_device",
+    "min_gap_per_device",
+)
+
+
+def write_frame(writer, obj):
+    """Write this object to the stream as a length prefixed pickle"""
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(frame_struct.pack(len(data)) + data)
+
+
+async def read_frame(reader):
+    """Read an object written by ``write_frame``"""
+    header = await reader.readexactly(frame_struct.size)
+    return pickle.loads(await reader.readexactly(frame_struct.unpack(header)[0]))
+
+
+def shard_index(serial, count):
+    """
+    Return which of count shards is responsible for this serial
+
+    Serials are hex, so devices with consecutive serials take turns between
+    the shards.
+    """
+    return int(serial, 16) % count
+
+
+class ShardReply:
+    """
+    A reply that a worker gave back as bytes
+
+    The worker already unpacked this reply to know which message it was for,
+    so we only read the header here. The rest of the packet is unpacked the
+    first time something other than the header is asked for.
+    """
+
+    represents_ack = False
+
+    __slots__ = [
+        "_bts",
+        "_unpacked",
+        "_protocol_register",
+        "protocol",
+        "pkt_type",
+        "source",
+        "target",
+        "sequence",
+        "serial",
+        "Information",
+    ]
+
+    def __init__(self, bts, header, protocol_register):
+        self._bts = bts
+        self._unpacked = None
+        self._protocol_register = protocol_register
+        self.protocol, self.pkt_type, self.source, self.target, self.sequence = header
+        self.serial = binascii.hexlify(self.target[:6]).decode()
+        self.Information = Information()
+
+    def tobytes(self, serial=None):
+        return self._bts
+
+    @property
+    def unpacked(self):
+        """The packet these bytes represent"""
+        if self._unpacked is None:
+            pkt = Messages.create(self._bts, self._protocol_register, unknown_ok=True)
+            # Share our Information so the packet always has the same information
+            pkt.__dict__["Information"] = self.Information
+            self._unpacked = pkt
+        return self._unpacked
+
+    def __getattr__(self, key):
+        if key.startswith("_"):
+            raise AttributeError(key)
+        return getattr(self.unpacked, key)
+
+    def __getitem__(self, key):
+        return self.unpacked[key]
+
+    def __or__(self, kls):
+        return (
+            self.protocol == kls.Payload.Meta.protocol
+            and self.pkt_type == kls.Payload.message_type
+        )
+
+    def __eq__(self, other):
+        if isinstance(other, ShardReply):
+            other = other.unpacked
+        return self.unpacked == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.unpacked)
+
+
+class Shard:
+    """
+    The front session's handle on one worker process
+
+    ``send`` gives a packet to the worker and returns the replies as
+    ``("ack", source, sequence, target, addr)`` or ``("pkt", bytes, addr)``
+    tuples.
+
+    The template of a ``TemplatedPacket`` is only given to the worker the first
+    time we send with it and the worker is told to forget it once we no longer
+    have it. Other packets are given to the worker as bytes.
+    """
+
+    def __init__(self, index, options):
+        self.index = index
+        self.options = options
+
+        self.ident = 0
+        self.known = {}
+        self.pending = {}
+
+        self.template_ids = weakref.WeakKeyDictionary()
+        self.forgotten_templates = []
+
+        self.process = None
+        self.writer = None
+        self.read_task = None
+
+    @hp.memoized_property
+    def started(self):
+        return hp.async_as_background(self.start())
+
+    async def start(self):
+        front, back = socket.socketpair()
+
+        mp = multiprocessing.get_context("spawn")
+        self.process = mp.Process(
+            target=run_worker,
+            args=(back, self.options),
+            name=f"photons-shard-{self.index}",
+            daemon=True,
+        )
+
+        try:
+            self.process.start()
+        finally:
+            back.close()
+
+        reader, self.writer = await asyncio.open_connection(sock=front)
+        self.read_task = hp.async_as_background(self.read_replies(reader))
+
+    async def read_replies(self, reader):
+        try:
+            while True:
+                kind, ident, value = await read_frame(reader)
+                fut = self.pending.get(ident)
+                if fut is None or fut.done():
+                    continue
+
+                if kind == "error":
+                    fut.set_exception(value)
+                else:
+                    fut.set_result(value)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for fut in self.pending.values():
+                if not fut.done():
+                    fut.set_exception(ShardStopped(shard=self.index))
+
+    def tell_services(self, serial, services):
+        """Make sure the worker knows where this device is"""
+        if self.known.get(serial) != services:
+            self.known[serial] = services
+            write_frame(self.writer, ("services", serial, services))
+
+    def forget(self, serial):
+        if self.known.pop(serial, None) is not None and self.writer is not None:
+            write_frame(self.writer, ("forget", serial))
+
+    def template_for(self, packet):
+        """
+        Return the id of the template for this packet that the worker knows
+        about, or the bytes of the packet if it doesn't have a template.
+        """
+        # Templates we no longer have are forgotten here rather than when they
+        # are garbage collected so we don't write to the stream from a finalizer
+        while self.forgotten_templates:
+            write_frame(self.writer, ("forget_template", self.forgotten_templates.pop()))
+
+        if not isinstance(packet, TemplatedPacket):
+            return packet.tobytes(packet.serial)
+
+        template = packet.template
+        tid = self.template_ids.get(template)
+        if tid is None:
+            self.ident += 1
+            tid = self.template_ids[template] = self.ident
+            weakref.finalize(template, self.forgotten_templates.append, tid)
+            write_frame(self.writer, ("template", tid, template.bts))
+
+        return tid
+
+    async def send(self, packet, kwargs):
+        await self.started
+
+        if self.read_task.done():
+            raise ShardStopped(shard=self.index)
+
+        template = self.template_for(packet)
+
+        self.ident += 1
+        ident = self.ident
+
+        fut = self.pending[ident] = hp.create_future(name=f"Shard({self.index})::send[fut]")
+        try:
+            write_frame(
+                self.writer, ("send", ident, template, packet.serial, packet.source, kwargs)
+            )
+            return await fut
+        except asyncio.CancelledError:
+            if not self.read_task.done():
+                write_frame(self.writer, ("cancel", ident))
+            raise
+        finally:
+            del self.pending[ident]
+
+    async def close(self):
+        if self.process is None:
+            return
+
+        try:
+            if not self.read_task.done():
+                write_frame(self.writer, ("stop",))
+                await self.writer.drain()
+            self.writer.close()
+        except ConnectionError:
+            pass
+
+        await hp.wait_for_all_futures(self.read_task, name=f"Shard({self.index})::close[reader]")
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.process.join, 5)
+        if self.process.is_alive():
+            log.warning(hp.lc("Shard didn't stop, terminating it", shard=self.index))
+            self.process.terminate()
+
+
+class ShardedNetworkSession(NetworkSession):
+    """
+    A ``NetworkSession`` that gives messages for each device to one of
+    ``transport_target.shards`` worker processes.
+    """
+
+    def setup(self):
+        super().setup()
+        self.shards = {}
+        self.shard_services = {}
+
+    @property
+    def shard_count(self):
+        return self.transport_target.shards
+
+    def shard_for(self, serial):
+        index = shard_index(serial, self.shard_count)
+        if index not in self.shards:
+            options = {name: getattr(self.transport_target, name) for name in WORKER_OPTIONS}
+            self.shards[index] = Shard(index, options)
+        return self.shards[index]
+
+    async def finish(self):
+        try:
+            await super().finish()
+        finally:
+            for shard in self.shards.values():
+                try:
+                    await shard.close()
+                except Exception as error:
+                    log.error(hp.lc("Failed to close shard", shard=shard.index, error=error))
+
+    async def add_service(self, serial, service, **kwargs):
+        await super().add_service(serial, service, **kwargs)
+        if service == Services.UDP:
+            services = dict(self.shard_services.get(serial, {}))
+            services[service.name] = {"host": kwargs["host"], "port": kwargs["port"]}
+            self.shard_services[serial] = services
+
+    async def forget(self, serial):
+        await super().forget(serial)
+        if self.shard_services.pop(serial, None) is not None:
+            shard = self.shards.get(shard_index(serial, self.shard_count))
+            if shard is not None:
+                shard.forget(serial)
+
+    async def _send_single(
+        self, original, packet, *, timeout, no_retry=False, broadcast=False, connect_timeout=10,
+    ):
+        if broadcast or packet.target is None:
+            return await super()._send_single(
+                original,
+                packet,
+                timeout=timeout,
+                no_retry=no_retry,
+                broadcast=broadcast,
+                connect_timeout=connect_timeout,
+            )
+
+        serial = packet.serial
+        shard = await self.shard_for_send(serial)
+
+        kwargs = {"timeout": timeout, "no_retry": no_retry, "connect_timeout": connect_timeout}
+        replies = await shard.send(packet, kwargs)
+        return [self.reply_from_shard(original, serial, reply) for reply in replies]
+
+    async def send_no_reply(self, original, packet, *, broadcast=False, connect_timeout=10):
+        if broadcast or packet.target is None:
+            return await super().send_no_reply(
+                original, packet, broadcast=broadcast, connect_timeout=connect_timeout
+            )
+
+        shard = await self.shard_for_send(packet.serial)
+
+        # The worker only writes packets that don't want a reply, so there is
+        # nothing for it to time out
+        await shard.send(packet, {"timeout": None, "connect_timeout": connect_timeout})
+        return []
+
+    async def shard_for_send(self, serial):
+        """Return the started shard for this serial after telling it where the device is"""
+        services = self.shard_services.get(serial)
+        if serial not in self.found or not services:
+            raise FailedToFindDevice(serial=serial)
+
+        shard = self.shard_for(serial)
+        await shard.started
+        shard.tell_services(serial, services)
+        return shard
+
+    def reply_from_shard(self, original, serial, reply):
+        """
+        Turn a reply from a shard back into a packet
+
+        Replies are only unpacked when something asks for more than their header
+        """
+        if reply[0] == "ack":
+            _, source, sequence, target, addr = reply
+            pkt = FakeAck(source, sequence, target, serial, addr)
+        else:
+            _, data, addr = reply
+            protocol_register = self.transport_target.protocol_register
+
+            header = peek_header(data)
+            if header is None:
+                pkt = Messages.create(data, protocol_register, unknown_ok=True)
+            else:
+                pkt = ShardReply(data, header, protocol_register)
+
+        pkt.Information.update(remote_addr=addr, sender_message=original)
+        self.receiver.tell_watchers(pkt)
+        return pkt
+
+
+class Worker:
+    """
+    Runs in a worker process and sends messages from the front session with
+    it's own ``NetworkSession``
+    """
+
+    def __init__(self, sock, options):
+        self.sock = sock
+        self.options = options
+
+    async def run(self):
+        from photons_transport.targets import LanTarget
+
+        final_future = hp.create_future(name="Worker::run[final_future]")
+        target = LanTarget.create(
+            {"final_future": final_future, "protocol_register": protocol_register}, self.options
+        )
+        session = NetworkSession(target)
+
+        reader, writer = await asyncio.open_connection(sock=self.sock)
+
+        sending = {}
+        templates = {}
+        tasks = hp.TaskHolder(final_future, name="Worker::run[tasks]")
+
+        try:
+            while True:
+                try:
+                    request = await read_frame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                kind = request[0]
+                if kind == "stop":
+                    break
+
+                elif kind == "template":
+                    _, tid, bts = request
+                    try:
+                        templates[tid] = self.template(session, bts)
+                    except Exception as error:
+                        log.error(hp.lc("Failed to make template", error=error))
+
+                elif kind == "forget_template":
+                    templates.pop(request[1], None)
+
+                elif kind == "send":
+                    _, ident, template, serial, source, kwargs = request
+                    if not isinstance(template, bytes):
+                        template = templates.get(template)
+
+                    sending[ident] = tasks.add(
+                        self.send(
+                            session, writer, sending, ident, template, serial, source, kwargs
+                        )
+                    )
+
+                elif kind == "cancel":
+                    task = sending.pop(request[1], None)
+                    if task is not None:
+                        task.cancel()
+
+                elif kind == "services":
+                    _, serial, services = request
+                    for name, options in services.items():
+                        await session.add_service(serial, Services[name], **options)
+
+                elif kind == "forget":
+                    await session.forget(request[1])
+        finally:
+            final_future.cancel()
+            await tasks.finish()
+            await session.finish()
+            writer.close()
+
+    def template(self, session, bts):
+        """Make a PacketTemplate from the bytes of a packet"""
+        packet = Messages.create(bts, session.transport_target.protocol_register)
+        return PacketTemplate(packet, bts)
+
+    async def send(self, session, writer, sending, ident, template, serial, source, kwargs):
+        try:
+            if template is None:
+                raise PhotonsAppError("Shard was given a template it doesn't know about")
+
+            if isinstance(template, bytes):
+                template = self.template(session, template)
+
+            packet = template.make(serial, source, session.seq(serial))
+            replies = await session.send_single(packet, packet, **kwargs)
+            response = ("result", ident, [self.reply(pkt) for pkt in replies])
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            response = ("error", ident, error)
+        finally:
+            sending.pop(ident, None)
+
+        self.respond(writer, response)
+
+    def reply(self, pkt):
+        addr = pkt.Information.remote_addr
+        if getattr(pkt, "represents_ack", False):
+            return ("ack", pkt.source, pkt.sequence, pkt.target, addr)
+        return ("pkt", pkt.tobytes(None), addr)
+
+    def respond(self, writer, response):
+        try:
+            write_frame(writer, response)
+        except (pickle.PicklingError, TypeError, AttributeError) as error:
+            failure = PhotonsAppError("Failed to give reply from shard", error=repr(error))
+            write_frame(writer, ("error", response[1], failure))
+
+
+def run_worker(sock, options):
+    """Entry point for the worker process"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(Worker(sock, options).run())
+    finally:
+        loop.close()
@@ -4,6 +4,7 @@ then talking to them over that medium.
 """
 from photons_transport.session.discovery_options import discovery_options_spec
 from photons_transport.session.memory import makeMemorySession
+from photons_transport.session.sharded import ShardedNetworkSession
 from photons_transport.session.network import NetworkSession
 from photons_transport.targets.base import Target
 
@@ -12,15 +13,59 @@ from delfick_project.norms import dictobj, sb
 
 class LanTarget(Target):
     """
-    Knows how to talk to a device over the local network. It's one configuration
-    option is default_broadcast which says what address to broadcast discovery
-    if broadcast is given to sender calls as True.
+    Knows how to talk to a device over the local network.
+
+    Options are:
+
+    default_broadcast - string - default "255.255.255.255"
+        The address to broadcast discovery to if broadcast is given to sender
+        calls as True.
+
+    discovery_options - :discovery_options:
+        Options for restricting and hard coding how devices are discovered.
+
+    shared_socket - boolean - default False
+        Use one socket for all devices rather than one socket per device.
+
+    adaptive_retries - boolean - default False
+        Base retries on how quickly each device has replied so far.
+
+    max_inflight_per_device - integer - default 0
+        The most messages that may wait on replies from one device at a time.
+        Zero means there is no limit.
+
+    min_gap_per_device - float - default 0
+        The fewest seconds between sending two messages to the same device.
+
+    targeted_discovery - boolean - default False
+        Look for devices we already know the address of by asking them
+        directly before broadcasting.
+
+    shards - integer - default 0
+        How many worker processes to send messages to devices from. Messages
+        are sent from this process unless this is more than one.
+
+    reply_cache - boolean - default False
+        Remember replies to messages that rarely change.
     """
 
     default_broadcast = dictobj.Field(sb.defaulted(sb.string_spec(), "255.255.255.255"))
     discovery_options = dictobj.Field(discovery_options_spec)
+    shared_socket = dictobj.Field(sb.boolean, default=False)
+    adaptive_retries = dictobj.Field(sb.boolean, default=False)
+    max_inflight_per_device = dictobj.Field(sb.integer_spec, default=0)
+    min_gap_per_device = dictobj.Field(sb.float_spec, default=0)
+    targeted_discovery = dictobj.Field(sb.boolean, default=False)
+    shards = dictobj.Field(sb.integer_spec, default=0)
+    reply_cache = dictobj.Field(sb.boolean, default=False)
 
     session_kls = NetworkSession
+    sharded_session_kls = ShardedNetworkSession
+
+    async def make_sender(self):
+        if self.shards > 1:
+            return self.sharded_session_kls(self)
+        return await super().make_sender()
 
 
 class MemoryTarget(Target):
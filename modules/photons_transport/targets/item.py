@@ -1,3 +1,5 @@
+from photons_transport.comms.template import PacketTemplate
+from photons_transport.comms.priority import rank
 from photons_transport import catch_errors
 
 from photons_app.errors import TimedOut, DevicesNotFound
@@ -49,6 +51,27 @@ class NoLimit:
 no_limit = NoLimit()
 
 
+def round_robin(packets):
+    """
+    Return these ``(original, packet)`` pairs ordered so that we take turns
+    between each device, whilst keeping the order of packets for each device.
+    """
+    by_serial = {}
+    for original, packet in packets:
+        by_serial.setdefault(packet.serial, []).append((original, packet))
+
+    if len(by_serial) < 2:
+        return list(packets)
+
+    ordered = []
+    queues = list(by_serial.values())
+    for i in range(max(len(q) for q in queues)):
+        for q in queues:
+            if i < len(q):
+                ordered.append(q[i])
+    return ordered
+
+
 class Item:
     def __init__(self, parts):
         self.parts = parts
@@ -104,6 +127,17 @@ class Item:
             If True then the messages being sent will have no automatic retry. This defaults
             to False and retry rates are determined by the target you are using.
 
+        priority
+            One of ``"interactive"``, ``"normal"`` or ``"background"``. Defaults
+            to ``"normal"``. Background messages wait whilst interactive messages
+            are being sent by the sender, and messages with a higher priority
+            get free slots in the device windows first. See
+            ``photons_transport.comms.priority``.
+
+        use_reply_cache
+            Defaults to True. If False then replies are always from the devices
+            rather than from the ``reply_cache`` on the sender.
+
         require_all_devices
             Defaults to False. If True then we will not send any messages if we haven't
             found all the devices we want to send messages to.
@@ -116,11 +150,19 @@ class Item:
                 async with limit:
                     send_and_wait_for_reply(message)
 
-            For example, an ``asyncio.Semaphore(30)``
+            For example, an ``asyncio.Semaphore(30)``. If the limit has a ``using`` method, like
+            ``photons_transport.comms.priority.PrioritySemaphore``, then ``limit.using(priority)``
+            is used instead so that messages with a better priority get free slots first.
 
             Note that if you saying ``target.script(msgs).run(....)`` then limit will be set
-            to a semaphore with max 30 by default. You may specify just a number and it will turn it
-            into a semaphore.
+            to a ``PrioritySemaphore`` with max 30 by default. You may specify just a number and it
+            will turn it into a ``PrioritySemaphore``.
+
+            When there is a limit, messages are started by taking turns between
+            each device. If the target has ``max_inflight_per_device`` then each
+            message also waits for a slot on the device it is going to before
+            using the limit. If the target has ``min_gap_per_device`` then every
+            write to a device, including retries, waits for that gap.
         """
         if "timeout" in kwargs:
             log.warning(hp.lc("Please use message_timeout instead of timeout when calling run"))
@@ -204,6 +246,9 @@ class Item:
         This means that for each reference and each part we create a clone of
         the part with the target set to the reference, complete with a source and
         sequence
+
+        Packets that aren't dynamic are packed once and the packet for each
+        serial only has it's source, target and sequence changed.
         """
         # Simplify our parts
         simplified_parts = self.simplify_parts()
@@ -211,7 +256,18 @@ class Item:
         packets = []
         for original, p in simplified_parts:
             if p.target is sb.NotSpecified:
+                template = None
+                if any(isinstance(serial, str) for serial in serials):
+                    template = PacketTemplate.from_packet(p)
+
                 for serial in serials:
+                    if template is not None and isinstance(serial, str):
+                        source = choose_source(p, sender.source)
+                        packets.append(
+                            (original, template.make(serial, source, sender.seq(serial)))
+                        )
+                        continue
+
                     clone = p.clone()
                     clone.update(
                         dict(
@@ -252,14 +308,26 @@ class Item:
 
         error_catcher = kwargs["error_catcher"]
 
+        # Complain about an unknown priority before sending anything
+        rank(kwargs.get("priority"))
+
+        windows = getattr(sender, "device_windows", None)
+        if windows is not None and not windows.enabled:
+            windows = None
+
+        # Order only matters if something stops us sending everything at once
+        if windows is not None or kwargs.get("limit"):
+            packets = round_robin(packets)
+
         async with hp.ResultStreamer(
             sender.stop_fut, error_catcher=silence_errors, name="Item::write_messages[streamer]"
         ) as streamer:
             count = 0
             for original, packet in packets:
                 count += 1
+                window = None if windows is None else windows.window(packet.serial)
                 await streamer.add_coroutine(
-                    self.do_send(sender, original, packet, kwargs), context=packet
+                    self.do_send(sender, original, packet, kwargs, window=window), context=packet
                 )
 
             streamer.no_more_work()
@@ -287,13 +355,25 @@ class Item:
                     else:
                         hp.add_error(error_catcher, exc)
 
-    async def do_send(self, sender, original, packet, kwargs):
-        async with (kwargs.get("limit") or no_limit):
-            return await sender.send_single(
-                original,
-                packet,
-                timeout=kwargs.get("message_timeout", 10),
-                no_retry=kwargs.get("no_retry", False),
-                broadcast=kwargs.get("broadcast"),
-                connect_timeout=kwargs.get("connect_timeout", 10),
-            )
+    async def do_send(self, sender, original, packet, kwargs, window=None):
+        priority = kwargs.get("priority")
+
+        lanes = getattr(sender, "lanes", None)
+        lane = no_limit if lanes is None else lanes.lane(priority)
+        window = no_limit if window is None else window.using(priority)
+
+        limit = kwargs.get("limit") or no_limit
+        if hasattr(limit, "using"):
+            limit = limit.using(priority)
+
+        async with lane, window:
+            async with limit:
+                return await sender.send_single(
+                    original,
+                    packet,
+                    timeout=kwargs.get("message_timeout", 10),
+                    no_retry=kwargs.get("no_retry", False),
+                    broadcast=kwargs.get("broadcast"),
+                    connect_timeout=kwargs.get("connect_timeout", 10),
+                    use_reply_cache=kwargs.get("use_reply_cache", True),
+                )
@@ -1,3 +1,5 @@
+from photons_transport.comms.priority import PrioritySemaphore
+
 from photons_app.errors import RunErrors, BadRunWithResults
 
 from photons_app import helpers as hp
@@ -24,7 +26,7 @@ class SenderWrapper:
                 self.kwargs["limit"] = 30
 
             if self.kwargs["limit"] is not None and not hasattr(self.kwargs["limit"], "acquire"):
-                self.kwargs["limit"] = asyncio.Semaphore(self.kwargs["limit"])
+                self.kwargs["limit"] = PrioritySemaphore(self.kwargs["limit"])
 
         return self.sender
 
@@ -1,5 +1,8 @@
 from photons_transport.transports.socket import Socket
 
+from photons_app import helpers as hp
+
+from collections import deque
 import platform
 import logging
 import asyncio
@@ -51,3 +54,146 @@ class UDP(Socket):
         if platform.system() == "Windows":
             sock.bind(("", 0))
         return sock
+
+
+class SharedUDP(UDP):
+    """
+    Knows how to send over udp using the one socket in the session's
+    ``UDPEngine``. Replies are read by that engine.
+    """
+
+    async def spawn_transport(self, timeout):
+        return self.session.udp_engine.start()
+
+    async def write(self, transport, bts, original_message):
+        self.session.udp_engine.sendto(bts, self.address)
+
+    async def close_transport(self, transport):
+        # The socket belongs to the engine and is closed with the session
+        pass
+
+    async def is_transport_active(self, packet, transport):
+        return self.session.udp_engine.sock is transport
+
+
+class UDPEngine:
+    """
+    A single non blocking udp socket that is shared by all the devices in a
+    session.
+
+    Datagrams that are written in the same tick of the event loop are sent
+    together on the next tick, and when the socket is readable we read up to
+    ``max_batch`` datagrams at once and give each of them to
+    ``session.received_data_now`` without creating a task for each one.
+    """
+
+    bufsize = 65536
+    max_batch = 256
+
+    def __init__(self, session):
+        self.session = session
+
+        self.sock = None
+        self.waiting = False
+        self.outgoing = deque()
+        self.flush_handle = None
+
+    @property
+    def loop(self):
+        return asyncio.get_event_loop()
+
+    def make_socket(self):
+        """Create the raw socket itself"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.setblocking(False)
+        sock.bind(("", 0))
+        return sock
+
+    def start(self):
+        """Make the socket if we don't already have one and return it"""
+        if self.sock is None:
+            self.sock = self.make_socket()
+            log.info(hp.lc("Created shared udp socket", address=self.sock.getsockname()))
+            self.loop.add_reader(self.sock.fileno(), self.drain)
+        return self.sock
+
+    def sendto(self, bts, address):
+        """Queue these bytes to be sent with everything else written this tick"""
+        self.outgoing.append((bts, address))
+        if self.flush_handle is None and not self.waiting:
+            self.flush_handle = self.loop.call_soon(self.flush)
+
+    def flush(self):
+        """Send everything we have queued until the socket would block"""
+        self.flush_handle = None
+
+        sock = self.sock
+        if sock is None:
+            self.outgoing.clear()
+            return
+
+        outgoing = self.outgoing
+        while outgoing:
+            bts, address = outgoing[0]
+            try:
+                sock.sendto(bts, address)
+            except (BlockingIOError, InterruptedError):
+                if not self.waiting:
+                    self.waiting = True
+                    self.loop.add_writer(sock.fileno(), self.writable)
+                return
+            except OSError as error:
+                log.error(hp.lc("Failed to send datagram", address=address, error=error))
+            outgoing.popleft()
+
+    def writable(self):
+        self.waiting = False
+        if self.sock is not None:
+            self.loop.remove_writer(self.sock.fileno())
+        self.flush()
+
+    def drain(self):
+        """Read everything available on the socket and give it to the session"""
+        sock = self.sock
+        if sock is None:
+            return
+
+        received = []
+        for _ in range(self.max_batch):
+            try:
+                received.append(sock.recvfrom(self.bufsize))
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as error:
+                # errno 51 is network unreachable
+                # Once the network is back, the socket will start working again
+                if error.errno != 51:
+                    log.error(hp.lc("Shared socket got an error", error=error))
+                break
+
+        for data, addr in received:
+            try:
+                self.session.received_data_now(data, addr)
+            except Exception as error:
+                log.exception(hp.lc("Failed to process received data", error=error))
+
+    def close(self):
+        """Stop reading and writing and close the socket"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        self.outgoing.clear()
+
+        sock = self.sock
+        self.sock = None
+        self.waiting = False
+
+        if sock is not None:
+            self.loop.remove_reader(sock.fileno())
+            self.loop.remove_writer(sock.fileno())
+            try:
+                sock.close()
+            except OSError:
+                pass
@@ -59,6 +59,11 @@ setup(
         , "alt-pytest-asyncio==0.5.3"
         , "pytest-helpers-namespace==2019.1.8"
         ]
+
+      # photons-canvas uses numpy for vectorised layers and encoding colours
+      , "numpy":
+        [ "numpy==1.19.5"
+        ]
       }
 
     , entry_points =
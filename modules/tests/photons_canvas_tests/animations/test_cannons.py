@@ -0,0 +1,49 @@
+# coding: spec
+
+from photons_canvas.animations.infrastructure.cannons import (
+    FastNetworkCannon,
+    NoisyNetworkCannon,
+    Writer,
+    Sem,
+)
+
+from photons_messages import DeviceMessages, Services
+
+from unittest import mock
+import pytest
+
+
+@pytest.fixture()
+def afr():
+    afr = mock.Mock(name="afr", source=2, found={}, spec=["source", "found", "seq"])
+    afr.seq.return_value = 1
+    return afr
+
+
+describe "FastNetworkCannon":
+    async it "doesn't make writers", afr:
+        sent = []
+
+        async def send_no_reply(original, packet):
+            sent.append(packet)
+
+        afr.send_no_reply = send_no_reply
+
+        cannon = FastNetworkCannon(afr, Sem())
+        msg = DeviceMessages.SetPower(level=0, target="d073d5000001")
+        assert await cannon.fire(None, "d073d5000001", [msg])
+
+        assert sent == [msg]
+        assert cannon.writers == {}
+
+describe "NoisyNetworkCannon":
+    async it "makes a writer for each device the first time it's used", afr:
+        afr.found = {"d073d5000001": {Services.UDP: mock.sentinel.transport}}
+        cannon = NoisyNetworkCannon(afr, Sem())
+        assert cannon.writers == {}
+
+        writer = cannon.writer_for("d073d5000001")
+        assert isinstance(writer, Writer)
+        assert writer.transport is mock.sentinel.transport
+        assert cannon.writer_for("d073d5000001") is writer
+        assert cannon.writers == {"d073d5000001": writer}
@@ -0,0 +1,144 @@
+# coding: spec
+
+from photons_canvas.animations.infrastructure.frames import FrameScheduler, Histogram, DeviceRate
+from photons_canvas.animations.infrastructure.events import AnimationEvent
+from photons_canvas.animations import Animation
+
+from photons_app import helpers as hp
+
+import asyncio
+import pytest
+
+
+describe "Histogram":
+    it "counts durations in buckets":
+        histogram = Histogram(buckets=(0.1, 0.01, 1))
+        assert histogram.buckets == (0.01, 0.1, 1)
+        assert histogram.mean == 0
+
+        for duration in (0.005, 0.01, 0.05, 0.5, 0.6, 3):
+            histogram.add(duration)
+
+        assert histogram.count == 6
+        assert histogram.max == 3
+        assert histogram.mean == pytest.approx(4.165 / 6)
+        assert histogram.as_dict() == {
+            "count": 6,
+            "mean": histogram.mean,
+            "max": 3,
+            "buckets": {"<=0.01": 2, "<=0.1": 1, "<=1": 2, ">1": 1},
+        }
+
+describe "DeviceRate":
+    it "slows down when frames keep being dropped and speeds up again":
+        rate = DeviceRate(slow_after=2, recover_after=3, max_slowdown=4)
+        assert rate.slowdown == 1
+        assert rate.ready(1, 0)
+
+        assert not rate.record(dropped=True)
+        assert not rate.record(dropped=False)
+        assert not rate.record(dropped=True)
+        assert rate.slowdown == 1
+
+        assert rate.record(dropped=True)
+        assert rate.slowdown == 2
+
+        assert not rate.record(dropped=True)
+        assert rate.record(dropped=True)
+        assert rate.slowdown == 4
+
+        assert not rate.record(dropped=True)
+        assert not rate.record(dropped=True)
+        assert rate.slowdown == 4
+
+        for _ in range(2):
+            assert not rate.record(dropped=False)
+        assert rate.record(dropped=False)
+        assert rate.slowdown == 2
+
+    it "is ready after enough frames for how slow it is":
+        rate = DeviceRate(slow_after=2, recover_after=3, max_slowdown=4)
+        rate.last_sent = 10
+        assert not rate.ready(0.1, 10.04)
+        assert rate.ready(0.1, 10.09)
+
+        rate.slowdown = 4
+        assert not rate.ready(0.1, 10.3)
+        assert rate.ready(0.1, 10.36)
+
+        rate.sending = True
+        assert not rate.ready(0.1, 20)
+
+describe "FrameScheduler":
+    it "only starts a frame for a key if the last one is finished":
+        frames = FrameScheduler()
+        assert frames.start_frame("one")
+        assert frames.start_frame("two")
+        assert not frames.start_frame("one")
+        assert frames.skipped_frames == 1
+
+        frames.finish_frame("one", 0.02)
+        assert frames.start_frame("one")
+        assert frames.compute.count == 1
+
+        frames.finish_frame("two")
+        assert frames.compute.count == 1
+
+    it "doesn't send to a device that is still sending or has been slowed down", FakeTime:
+        frames = FrameScheduler(slow_after=1)
+
+        with FakeTime() as t:
+            t.set(1)
+            assert frames.should_send("d073d5000001", 0.1)
+            assert frames.should_send("d073d5000002", 0.1)
+
+            t.set(1.1)
+            assert not frames.should_send("d073d5000001", 0.1)
+            assert frames.skipped_sends == 1
+
+            with frames.sending("d073d5000001") as record:
+                t.add(0.05)
+                record(dropped=True)
+
+            assert frames.send.count == 1
+            assert frames.send.max == pytest.approx(0.05)
+            assert frames.devices["d073d5000001"].slowdown == 2
+
+            assert not frames.devices["d073d5000001"].sending
+            assert frames.as_dict()["slowdown"] == {"d073d5000001": 2, "d073d5000002": 1}
+
+            t.set(1.12)
+            assert not frames.should_send("d073d5000001", 0.1)
+            assert frames.skipped_sends == 2
+
+            t.set(1.2)
+            assert frames.should_send("d073d5000001", 0.1)
+
+    async it "makes an animation skip ticks while a frame isn't finished", FakeTime, MockedCallLater:
+        final_future = hp.create_future()
+
+        class A(Animation):
+            every = 1
+            num_seconds = 6.5
+
+        frames = FrameScheduler()
+        animation = A(final_future, None)
+        animation.frames = frames
+
+        got = []
+
+        with FakeTime() as t:
+            async with MockedCallLater(t):
+                async for result in animation.stream(None):
+                    assert result.context is AnimationEvent.Types.TICK
+                    got.append(round(t.time))
+
+                    # Take longer than every for the first frame
+                    if len(got) == 1:
+                        await asyncio.sleep(2.5)
+                    frames.finish_frame(animation, 0.1)
+
+        final_future.cancel()
+        assert got == [0, 3, 4, 5, 6]
+        assert frames.skipped_frames == 2
+        assert frames.compute.count == 5
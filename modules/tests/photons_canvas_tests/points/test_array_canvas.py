@@ -0,0 +1,289 @@
+# coding: spec
+
+from photons_canvas.points.array_canvas import ArrayCanvas, PointLayer, vectorised
+from photons_canvas.points.canvas import Canvas
+
+from photons_app.errors import PhotonsAppError
+
+from photons_messages.fields import Color
+from photons_messages import TileMessages
+
+from delfick_project.errors_pytest import assertRaises
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture()
+def parts(V):
+    part1 = V.make_part(V.device, 1, user_x=0, user_y=0, width=2, height=2)
+    assert part1.bounds == ((0, 2), (0, -2), (2, 2))
+
+    part2 = V.make_part(V.device, 2, user_x=1, user_y=1, width=2, height=2)
+    assert part2.bounds == ((8, 10), (8, 6), (2, 2))
+
+    return part1, part2
+
+
+@pytest.fixture()
+def canvas(parts):
+    canvas = Canvas()
+    canvas.add_parts(*parts)
+    return canvas
+
+
+def point_layer(point, canvas):
+    if point[0] % 2 == 0:
+        return None
+    return (abs(point[0] * point[1]), 1, 1, 3500)
+
+
+def colors(*hues):
+    return [Color(0, 0, 0, 0) if h is None else Color(h, 1, 1, 3500) for h in hues]
+
+
+describe "ArrayCanvas":
+    it "has an array of colours over the bounds of the canvas", canvas, parts:
+        part1, part2 = parts
+        canvas[1, 0] = (100, 1, 1, 3500)
+        canvas[9, 7] = (200, 0.5, 0.2, 9000)
+
+        arr = canvas.as_array()
+        assert isinstance(arr, ArrayCanvas)
+        assert arr.canvas is canvas
+
+        assert canvas.bounds == ((0, 10), (8, -2), (10, 10))
+        assert arr.shape == (10, 10, 4)
+        assert arr.colors.shape == (10, 10, 4)
+
+        assert arr.index((1, 0)) == (8, 1)
+        assert arr.index((9, 7)) == (1, 9)
+        assert arr.index((10, 7)) is None
+        assert arr.index((1, 9)) is None
+
+        assert list(arr.colors[8, 1]) == [100, 1, 1, 3500]
+        assert list(arr.colors[1, 9]) == [200, 0.5, 0.2, 9000]
+        assert np.isnan(arr.colors).sum() == (100 - 2) * 4
+
+        assert arr.slices == {
+            part1: (slice(8, 10), slice(0, 2)),
+            part2: (slice(0, 2), slice(8, 10)),
+        }
+
+        nan = [np.nan] * 4
+        np.testing.assert_array_equal(arr.part_colors(part1), [nan, (100, 1, 1, 3500), nan, nan])
+        np.testing.assert_array_equal(
+            arr.part_colors(part2), [nan, nan, nan, (200, 0.5, 0.2, 9000)]
+        )
+
+    it "can be made from an empty canvas":
+        arr = Canvas().as_array()
+        assert arr.shape == (0, 0, 4)
+        assert arr.slices == {}
+        assert arr.msgs(point_layer) == []
+
+    it "is kept by the canvas and its clones until the parts change", V, canvas, parts:
+        arr = canvas.as_array()
+        assert canvas.as_array() is arr
+
+        clone = canvas.clone()
+        assert clone.as_array() is arr
+        assert arr.canvas is clone
+        assert canvas.as_array() is not arr
+
+        clone[1, 0] = (100, 1, 1, 3500)
+        arr2 = clone.as_array()
+        assert arr2 is not arr
+        assert list(arr2.colors[8, 1]) == [100, 1, 1, 3500]
+        assert clone.as_array() is arr2
+
+        parts[1].update(2, 1, 2, 2)
+        arr3 = clone.as_array()
+        assert arr3 is not arr2
+        assert clone.as_array() is arr3
+
+        clone.add_parts(V.make_part(V.other_device, 1, user_x=0, user_y=0, width=2, height=2))
+        assert clone.as_array() is not arr3
+
+    it "knows the row and column of each point", canvas:
+        arr = canvas.as_array()
+
+        assert arr.cols().shape == (10, 10)
+        assert list(arr.cols()[0]) == list(range(0, 10))
+        assert list(arr.cols()[:, 3]) == [3] * 10
+
+        assert arr.rows().shape == (10, 10)
+        assert list(arr.rows()[:, 0]) == list(range(8, -2, -1))
+        assert list(arr.rows()[4]) == [4] * 10
+
+    describe "msgs":
+        it "uses point layers with PointLayer", canvas, parts:
+            called = []
+
+            def layer(point, c):
+                assert c is canvas
+                called.append(point)
+                return point_layer(point, c)
+
+            onto = {}
+            arr = canvas.as_array()
+            msgs = arr.msgs(layer, onto=onto)
+
+            assert sorted(called) == sorted(parts[0].points + parts[1].points)
+
+            assert len(msgs) == 2
+            assert all(m | TileMessages.Set64 for m in msgs)
+            assert msgs[0].colors[:4] == colors(None, 0, None, 1)
+            assert msgs[1].colors[:4] == colors(None, 72, None, 63)
+
+            assert onto == {
+                **{(0, 0): None, (1, 0): (0, 1, 1, 3500), (0, -1): None, (1, -1): (1, 1, 1, 3500)},
+                **{(8, 8): None, (9, 8): (72, 1, 1, 3500), (8, 7): None, (9, 7): (63, 1, 1, 3500)},
+            }
+
+        it "makes the same messages as the canvas does for point layers", V, parts:
+            c1 = Canvas()
+            c1.add_parts(*parts)
+            expected = [m.colors for m in c1.msgs(point_layer)]
+
+            for part in parts:
+                part.colors = None
+
+            c2 = Canvas()
+            c2.add_parts(*parts)
+            got = [m.colors for m in c2.as_array().msgs(point_layer)]
+
+            assert got == expected
+
+        it "uses vectorised layers", canvas:
+            called = []
+
+            @vectorised
+            def layer(arr):
+                called.append(arr)
+                colors = arr.empty()
+                colors[:] = (0, 1, 1, 3500)
+                colors[..., 0] = arr.cols() + (arr.rows() + 2) * 10
+                colors[arr.cols() == 1] = np.nan
+                return colors
+
+            arr = canvas.as_array()
+            onto = ArrayCanvas(canvas)
+            msgs = arr.msgs(layer, onto=onto)
+
+            assert called == [arr]
+            assert msgs[0].colors[:4] == colors(20, None, 10, None)
+            assert msgs[1].colors[:4] == colors(108, 109, 98, 99)
+
+            assert np.isnan(onto.colors[:, 1]).all()
+            assert list(onto.colors[0, 8]) == [108, 1, 1, 3500]
+
+        it "is used by the canvas for vectorised layers", canvas:
+            info = {}
+
+            @vectorised
+            def layer(arr):
+                assert isinstance(arr, ArrayCanvas)
+                assert arr.canvas is canvas
+                info["called"] = True
+                colors = arr.empty()
+                colors[:] = (20, 1, 1, 3500)
+                return colors
+
+            onto = {}
+            msgs = canvas.msgs(layer, onto=onto)
+            assert info["called"]
+
+            assert len(msgs) == 2
+            assert msgs[0].colors[:4] == colors(20, 20, 20, 20)
+            assert msgs[1].colors[:4] == colors(20, 20, 20, 20)
+            assert onto[8, 8] == (20, 1, 1, 3500)
+            assert onto[0, -1] == (20, 1, 1, 3500)
+
+        it "updates the same array every frame", FakeTime, canvas, parts:
+            hue = {"value": 20}
+
+            @vectorised
+            def layer(arr):
+                colors = arr.empty()
+                colors[:] = (hue["value"], 1, 1, 3500)
+                return colors
+
+            with FakeTime() as t:
+                t.set(1)
+                canvas = canvas.clone()
+                arr = canvas.as_array()
+                array = arr.colors
+                assert len(canvas.msgs(layer, onto=canvas.points)) == 2
+                assert canvas[9, 7] == (20, 1, 1, 3500)
+
+                t.set(1.1)
+                canvas = canvas.clone()
+                hue["value"] = 30
+                msgs = canvas.msgs(layer, onto=canvas.points)
+                assert [m.colors[:4] for m in msgs] == [colors(30, 30, 30, 30)] * 2
+
+                assert canvas.as_array() is arr
+                assert arr.colors is array
+                assert (arr.colors[arr.covered] == (30, 1, 1, 3500)).all()
+                assert canvas[9, 7] == (30, 1, 1, 3500)
+
+                t.set(1.2)
+                canvas = canvas.clone()
+                assert canvas.msgs(layer, onto=canvas.points) == []
+
+        it "only gives the points of its canvas the colours that changed", canvas, parts:
+            arr = canvas.as_array()
+
+            @vectorised
+            def layer(arr):
+                colors = arr.empty()
+                colors[0, 8] = (1, 1, 1, 3500)
+                return colors
+
+            class Points(dict):
+                def __setitem__(s, point, color):
+                    set_points.append(point)
+                    super().__setitem__(point, color)
+
+            set_points = []
+            canvas.points = Points(canvas.points)
+            arr.msgs(layer, onto=canvas.points)
+            assert set_points == [(8, 8)]
+            assert canvas[8, 8] == (1, 1, 1, 3500)
+
+            set_points.clear()
+            onto = Points()
+            arr.msgs(layer, onto=onto)
+            assert sorted(set_points) == sorted(parts[0].points + parts[1].points)
+
+        it "complains if a vectorised layer returns the wrong shape", canvas:
+
+            @vectorised
+            def layer(arr):
+                return np.zeros((2, 2, 4))
+
+            with assertRaises(
+                PhotonsAppError,
+                "Expected layer to return an array the shape of the canvas",
+                want=(10, 10, 4),
+                got=(2, 2, 4),
+            ):
+                canvas.as_array().msgs(layer)
+
+describe "PointLayer":
+    it "calls the layer once for each point in the parts", V, canvas, parts:
+        overlapping = V.make_part(V.other_device, 1, user_x=0, user_y=0, width=2, height=2)
+        assert overlapping.bounds == parts[0].bounds
+        canvas.add_parts(overlapping)
+        assert len(canvas.parts) == 3
+
+        called = []
+
+        def layer(point, c):
+            called.append(point)
+            return (1, 1, 1, 3500)
+
+        colors = PointLayer(layer)(canvas.as_array())
+        assert sorted(called) == sorted(parts[0].points + parts[1].points)
+        assert (~np.isnan(colors[..., 0])).sum() == 8
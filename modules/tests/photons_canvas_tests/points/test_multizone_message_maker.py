@@ -3,6 +3,8 @@
 from photons_canvas.points.simple_messages import MultizoneMessagesMaker
 
 from photons_control import test_helpers as chp
+from photons_messages import MultiZoneMessages
+from photons_messages.fields import Color
 from photons_transport.fake import FakeDevice
 from photons_products import Products
 
@@ -90,3 +92,57 @@ describe "SetZones":
             assert (
                 strip.attrs.zones == [chp.Color(0, 0, 0, 0), chp.Color(0, 0, 0, 0)] + colors[:-2]
             ), strip
+
+    async it "set zones from a numpy array", runner:
+        np = pytest.importorskip("numpy")
+        colors = [chp.Color(i, 1, 1, 3500) for i in range(16)]
+
+        for strip in strips:
+            strip.attrs.zones = [chp.Color(0, 0, 0, 0)] * 16
+            cap = chp.ProductResponder.capability(strip)
+            maker = MultizoneMessagesMaker(
+                strip.serial,
+                cap,
+                np.array([(c.hue, c.saturation, c.brightness, c.kelvin) for c in colors]),
+            )
+            await runner.sender(list(maker.msgs))
+
+        for strip in strips:
+            assert strip.attrs.zones == colors
+
+describe "Extended multizone messages":
+
+    @pytest.fixture()
+    def cap(self):
+        return chp.ProductResponder.capability(striplcm2extended)
+
+    def expected(self, colors, **kwargs):
+        return MultiZoneMessages.SetExtendedColorZones(
+            duration=1,
+            colors_count=len(colors),
+            colors=[c if isinstance(c, Color) else Color(*c) for c in colors],
+            target="d073d5000005",
+            zone_index=kwargs.get("zone_index", 0),
+            ack_required=True,
+            res_required=False,
+            source=1,
+            sequence=1,
+        )
+
+    it "makes the same message as giving the colours to the message", cap:
+        colors = [(i * 4.3, 1, 0.5, 3500) for i in range(82)]
+        for cs, kwargs in ((colors, {}), (colors[:20], {"zone_index": 4})):
+            msgs = list(MultizoneMessagesMaker("d073d5000005", cap, cs, **kwargs).msgs)
+            assert len(msgs) == 1
+
+            msg = msgs[0]
+            msg.update(dict(source=1, sequence=1))
+            assert msg.colors_count == len(cs)
+            assert msg.pack() == self.expected(cs, **kwargs).pack()
+
+    it "can be given Color objects", cap:
+        colors = [Color(i, 1, 0.5, 3500) for i in range(10)]
+        msg = list(MultizoneMessagesMaker("d073d5000005", cap, colors).msgs)[0]
+        msg.update(dict(source=1, sequence=1))
+        assert msg.colors[:10] == colors
+        assert msg.pack() == self.expected(colors).pack()
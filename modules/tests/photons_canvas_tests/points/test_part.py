@@ -4,11 +4,12 @@ from photons_canvas.points.simple_messages import Set64
 from photons_canvas.points import containers as cont
 from photons_canvas.orientation import Orientation
 
-from photons_messages import TileMessages, LightMessages
+from photons_messages import TileMessages, LightMessages, MultiZoneMessages
 from photons_messages.fields import Color
 from photons_products import Products
 
 from unittest import mock
+import pytest
 
 describe "Part":
     it "takes in some properties", V:
@@ -305,6 +306,32 @@ describe "Part":
                 ).payload
             )
 
+        it "can be given a numpy array", V:
+            np = pytest.importorskip("numpy")
+            device = cont.Device("d073d5001337", Products.LCM2_A19.cap)
+            part = V.make_part(device, 0, user_x=2, user_y=2, width=1, height=1)
+
+            msgs = list(part.msgs(np.array([(100, 1, 0.4, 2400)], dtype=float), duration=100))
+            assert len(msgs) == 1
+            assert (
+                msgs[0].payload
+                == LightMessages.SetColor(
+                    hue=100, saturation=1, brightness=0.4, kelvin=2400, duration=100
+                ).payload
+            )
+            assert part.colors == [(100, 1, 0.4, 2400)]
+
+            colors = [(i, 1, 1, 3500) for i in range(64)]
+            colors[3] = None
+            array = np.array([(np.nan,) * 4 if c is None else c for c in colors])
+
+            device = cont.Device("d073d5001337", Products.LCM3_TILE.cap)
+            for orientation in Orientation.__members__.values():
+                part = V.make_part(device, 3, orientation=orientation)
+                expected = part.msgs(colors)[0].colors
+                assert part.msgs(array)[0].colors == expected
+                assert part.colors == colors
+
         it "returns multizone messages for strips", V:
             colors = mock.Mock(name="colors", spec=[])
             duration = mock.Mock(name="duration", spec=[])
@@ -447,3 +474,232 @@ describe "Part":
                     assert part.last_msgs is msgs3
                     assert part.next_force_send == 3.5
                     assert part.colors == colors
+
+            it "uses full_refresh for when to send all the colours again", FakeTime, V:
+                colors = [(i, 1, 1, 3500) for i in range(64)]
+                device = cont.Device("d073d5001337", Products.LCM3_TILE.cap)
+
+                with FakeTime() as t:
+                    t.set(2)
+                    part = V.make_part(device, 3, original_colors=colors)
+
+                    msgs = part.msgs(colors, force=False, full_refresh=5)
+                    assert len(msgs) == 1
+                    assert part.next_force_send == 7
+
+                    t.set(6)
+                    assert part.msgs(colors, force=False, full_refresh=5) is cont.NO_MESSAGES
+
+                    t.set(7.1)
+                    assert part.msgs(colors, force=False, full_refresh=5) is msgs
+                    assert part.next_force_send == 12.1
+
+        describe "Changed rectangles":
+
+            @pytest.fixture()
+            def device(self):
+                return cont.Device("d073d5001337", Products.LCM3_TILE.cap)
+
+            def changed(self, colors, *points):
+                changed = list(colors)
+                for x, y in points:
+                    changed[y * 8 + x] = (300, 0, 1, 9000)
+                return changed
+
+            it "sends only the rectangle that changed", FakeTime, V, device:
+                colors = [(i, 1, 1, 3500) for i in range(64)]
+
+                with FakeTime() as t:
+                    t.set(2)
+                    part = V.make_part(device, 3, original_colors=colors)
+                    full = part.msgs(colors, force=False)
+                    assert full[0].width == 8
+                    assert part.next_force_send == 2.5
+
+                    t.set(2.1)
+                    colors2 = self.changed(colors, (2, 1), (4, 3))
+                    msgs = part.msgs(colors2, force=False, duration=2)
+                    assert len(msgs) == 1
+                    assert isinstance(msgs[0], Set64)
+
+                    msg = msgs[0]
+                    assert (msg.x, msg.y, msg.width, msg.tile_index) == (2, 1, 3, 3)
+                    assert msg.duration == 2
+                    assert msg.colors[:9] == [
+                        Color(*colors2[y * 8 + x]) for y in (1, 2, 3) for x in (2, 3, 4)
+                    ]
+
+                    # The tile applies all 64 colours in rows of width from x/y
+                    # so the pixels below the rectangle must keep their values
+                    applied = [Color(*c) for c in colors]
+                    for i, color in enumerate(msg.colors):
+                        row, col = msg.y + i // msg.width, msg.x + i % msg.width
+                        if row < 8:
+                            applied[row * 8 + col] = color
+                    assert applied == [Color(*c) for c in colors2]
+
+                    # Only sending a rectangle doesn't change when we next send everything
+                    assert part.next_force_send == 2.5
+                    assert part.colors == colors2
+                    assert part.last_msgs == []
+
+                    t.set(2.2)
+                    assert part.msgs(colors2, force=False) is cont.NO_MESSAGES
+
+                    t.set(2.6)
+                    msgs = part.msgs(colors2, force=False)
+                    assert (msgs[0].x, msgs[0].y, msgs[0].width) == (0, 0, 8)
+                    assert msgs[0].colors == [Color(*c) for c in colors2]
+                    assert part.next_force_send == 3.1
+
+            it "finds the rectangle after the colours are oriented", FakeTime, V, device:
+                colors = [(i, 1, 1, 3500) for i in range(64)]
+
+                with FakeTime() as t:
+                    t.set(2)
+                    part = V.make_part(
+                        device, 3, orientation=Orientation.RotatedLeft, original_colors=colors
+                    )
+                    part.msgs(colors, force=False)
+
+                    t.set(2.1)
+                    colors2 = self.changed(colors, (0, 0), (1, 0))
+                    msgs = part.msgs(colors2, force=False)
+
+                    rotated = part.reorient(colors2)
+                    msg = msgs[0]
+                    assert (msg.x, msg.y, msg.width) == (7, 0, 1)
+                    assert msg.colors[:2] == [Color(*rotated[7]), Color(*rotated[15])]
+                    assert rotated[7] == rotated[15] == (300, 0, 1, 9000)
+
+            it "sends everything if everything changed or it's forced", FakeTime, V, device:
+                colors = [(i, 1, 1, 3500) for i in range(64)]
+
+                with FakeTime() as t:
+                    t.set(2)
+                    part = V.make_part(device, 3, original_colors=colors)
+                    part.msgs(colors, force=False)
+
+                    t.set(2.1)
+                    colors2 = self.changed(colors, (0, 0), (7, 7))
+                    msgs = part.msgs(colors2, force=False)
+                    assert (msgs[0].x, msgs[0].y, msgs[0].width) == (0, 0, 8)
+                    assert part.last_msgs is msgs
+                    assert part.next_force_send == 2.6
+
+                    t.set(2.2)
+                    colors3 = self.changed(colors2, (3, 3))
+                    msgs = part.msgs(colors3, force=True)
+                    assert (msgs[0].x, msgs[0].y, msgs[0].width) == (0, 0, 8)
+                    assert msgs[0].colors == [Color(*c) for c in colors3]
+
+            it "sends everything after messages that weren't sent", FakeTime, V, device:
+                colors = [(i, 1, 1, 3500) for i in range(64)]
+
+                with FakeTime() as t:
+                    t.set(2)
+                    part = V.make_part(device, 3, original_colors=colors)
+                    part.msgs(colors, force=False)
+
+                    t.set(2.1)
+                    colors2 = self.changed(colors, (2, 1))
+                    msgs = part.msgs(colors2, force=False)
+                    assert (msgs[0].x, msgs[0].y, msgs[0].width) == (2, 1, 1)
+
+                    # Those messages were dropped so the tile still has colors
+                    part.forget_sent()
+                    assert part.next_force_send == 0
+                    assert part.last_msgs == []
+
+                    t.set(2.2)
+                    colors3 = self.changed(colors2, (4, 3))
+                    msgs = part.msgs(colors3, force=False)
+                    assert (msgs[0].x, msgs[0].y, msgs[0].width) == (0, 0, 8)
+                    assert msgs[0].colors == [Color(*c) for c in colors3]
+                    assert part.next_force_send == 2.7
+
+                    t.set(2.3)
+                    colors4 = self.changed(colors3, (5, 5))
+                    msgs = part.msgs(colors4, force=False)
+                    assert (msgs[0].x, msgs[0].y, msgs[0].width) == (5, 5, 1)
+
+            it "does the same with numpy arrays", FakeTime, V, device:
+                np = pytest.importorskip("numpy")
+                colors = [(i, 1, 1, 3500) for i in range(64)]
+                colors2 = self.changed(colors, (0, 0), (1, 0), (1, 2))
+
+                got = []
+                for cs, cs2 in ((colors, colors2), (np.array(colors), np.array(colors2))):
+                    with FakeTime() as t:
+                        t.set(2)
+                        part = V.make_part(
+                            device, 3, orientation=Orientation.RotatedLeft, original_colors=colors
+                        )
+                        part.msgs(cs, force=False)
+
+                        t.set(2.1)
+                        msgs = part.msgs(cs2, force=False)
+                        assert len(msgs) == 1
+                        got.append((msgs[0].x, msgs[0].y, msgs[0].width, msgs[0].colors))
+
+                        assert part.colors == colors2
+
+                        t.set(2.2)
+                        assert part.msgs(cs2, force=False) is cont.NO_MESSAGES
+
+                assert got[0][:3] == (5, 0, 3)
+                assert got[1] == got[0]
+
+            it "doesn't send rectangles to strips", FakeTime, V:
+                device = cont.Device("d073d5001337", Products.LCM2_Z.cap(2, 80))
+                colors = [(i, 1, 1, 3500) for i in range(16)]
+
+                with FakeTime() as t:
+                    t.set(2)
+                    part = V.make_part(device, 0, width=16, height=1, original_colors=colors)
+                    part.msgs(colors, force=False)
+
+                    t.set(2.1)
+                    colors2 = list(colors)
+                    colors2[3] = (300, 0, 1, 9000)
+                    msgs = list(part.msgs(colors2, force=False))
+                    assert len(msgs) == 1
+                    assert msgs[0] | MultiZoneMessages.SetExtendedColorZones
+                    assert msgs[0].colors_count == 16
+                    assert part.next_force_send == 2.6
+
+describe "changed_rectangle":
+    it "returns None if nothing changed":
+        colors = [(i, 1, 1, 3500) for i in range(64)]
+        assert cont.changed_rectangle(colors, list(colors), 8) is None
+
+    it "returns the rectangle covering the changes":
+        colors = [(i, 1, 1, 3500) for i in range(64)]
+
+        def changed(*indexes):
+            cs = list(colors)
+            for i in indexes:
+                cs[i] = None
+            return cs
+
+        assert cont.changed_rectangle(changed(9), colors, 8) == (1, 1, 1, 1)
+        assert cont.changed_rectangle(changed(12, 17), colors, 8) == (1, 1, 4, 2)
+        assert cont.changed_rectangle(changed(0, 63), colors, 8) == (0, 0, 8, 8)
+        assert cont.changed_rectangle(changed(3, 5), colors, 5) == (0, 0, 4, 2)
+
+    it "works with numpy arrays":
+        np = pytest.importorskip("numpy")
+        colors = np.array([(i, 1, 1, 3500) for i in range(64)], dtype=float)
+        colors[10] = np.nan
+
+        def changed(*indexes):
+            cs = colors.copy()
+            cs[list(indexes)] = (300, 0, 1, 9000)
+            return cs
+
+        assert cont.changed_rectangle(colors.copy(), colors, 8) is None
+        assert cont.changed_rectangle(changed(9), colors, 8) == (1, 1, 1, 1)
+        assert cont.changed_rectangle(changed(12, 17), colors, 8) == (1, 1, 4, 2)
+        assert cont.changed_rectangle(changed(0, 63), colors, 8) == (0, 0, 8, 8)
+        assert cont.changed_rectangle(changed(3, 5), colors, 5) == (0, 0, 4, 2)
+        assert cont.changed_rectangle(changed(10), colors, 8) == (2, 1, 1, 1)
@@ -1,12 +1,15 @@
 # coding: spec
 
-from photons_canvas.points.simple_messages import Set64
+from photons_canvas.points.simple_messages import Set64, encode_colors, fill
+from photons_canvas.points import simple_messages
 
 from photons_messages import TileMessages
 from photons_messages.fields import Color
 
 from delfick_project.norms import sb
+from unittest import mock
 import binascii
+import random
 import pytest
 
 
@@ -216,3 +219,43 @@ describe "set64":
         assert simple.source == 200
         assert simple.sequence == 3
         assert simple.serial == "d073d5001188"
+
+describe "encode_colors":
+
+    @pytest.fixture()
+    def colors(self):
+        colors = [
+            (random.random() * 360, random.random(), random.random(), random.randrange(1500, 9000))
+            for _ in range(60)
+        ]
+        return colors + [None, (-1, -1, -1, -1), (400, 2, 0xFFFFF, 0xFFFFF), (120, 1, 1, 3500)]
+
+    def assertFillSame(self, got, colors):
+        expected = b"".join(fill(c) for c in colors)
+        assert len(got) == len(expected)
+        assert got == expected
+
+    it "encodes the same as fill", colors:
+        self.assertFillSame(encode_colors(colors), colors)
+
+    it "encodes the same as fill without numpy", colors:
+        with mock.patch.object(simple_messages, "np", None):
+            self.assertFillSame(encode_colors(colors), colors)
+
+    it "clamps values":
+        assert encode_colors([(-1, -1, -1, -1), (400, 2, 0xFFFFF, 0xFFFFF)]) == (
+            b"\x00" * 8 + b"\xff" * 8
+        )
+
+    it "can pad to a number of colours":
+        got = encode_colors([(0, 1, 1, 3500)], count=3)
+        assert got == encode_colors([(0, 1, 1, 3500), None, None])
+        assert len(got) == 24
+
+        with mock.patch.object(simple_messages, "np", None):
+            assert encode_colors([(0, 1, 1, 3500)], count=3) == got
+
+    it "can encode a numpy array", colors:
+        np = pytest.importorskip("numpy")
+        arr = np.array([(np.nan,) * 4 if c is None else c for c in colors])
+        self.assertFillSame(encode_colors(arr), colors)
@@ -190,61 +190,31 @@ describe "DeviceFinderDaemon":
                     ("find", si * 3),
                 ]
 
-            async it "does refresh information loops", V, FakeTime, MockedCallLater:
+            async it "only finds devices", V, FakeTime, MockedCallLater:
                 called = []
                 m = lambda s: Device.FieldSpec().empty_normalise(serial=s)
                 d1 = m("d073d5000001")
                 d2 = m("d073d5000002")
 
-                d1ril = pytest.helpers.AsyncMock(name="d1_refresh_information_loop")
-                d2ril = pytest.helpers.AsyncMock(name="d2_refresh_information_loop")
-
-                p1 = mock.patch.object(d1, "refresh_information_loop", d1ril)
-                p2 = mock.patch.object(d2, "refresh_information_loop", d2ril)
+                wait = hp.create_future()
 
                 async def find(fltr):
                     assert fltr.matches_all
                     assert fltr.refresh_discovery
 
                     called.append(1)
+                    if len(called) == 3:
+                        wait.set_result(True)
 
                     yield d1
                     yield d2
 
-                    assert len(d1ril.mock_calls) == len(called)
-                    assert len(d2ril.mock_calls) == len(called)
-
                 find = pytest.helpers.MagicAsyncMock(name="find", side_effect=find)
-
-                wait = hp.create_future()
-
-                class Tick:
-                    def __init__(self, *args, **kwargs):
-                        self.args = args
-                        self.kwargs = kwargs
-
-                    async def __aenter__(self):
-                        return self
-
-                    async def __aexit__(self, exc_typ, exc, tb):
-                        pass
-
-                    def __aiter__(self):
-                        return self.tick()
-
-                    async def tick(self):
-                        async with hp.tick(*self.args, **self.kwargs) as ticks:
-                            async for i, nxt_time in ticks:
-                                if i == 4:
-                                    wait.set_result(True)
-                                yield i, nxt_time
-
-                p3 = mock.patch.object(V.daemon.finder, "find", find)
-                p4 = mock.patch.object(V.daemon, "hp_tick", Tick)
+                p1 = mock.patch.object(V.daemon.finder, "find", find)
 
                 with FakeTime() as t:
                     async with MockedCallLater(t):
-                        with p1, p2, p3, p4:
+                        with p1:
 
                             async def run():
                                 async with V.daemon:
@@ -255,12 +225,7 @@ describe "DeviceFinderDaemon":
                                 await wait
                                 t.cancel()
 
-                for eril in (d1ril, d2ril):
-                    assert len(eril.mock_calls) >= 3
-
-                    assert eril.mock_calls[0] == mock.call(
-                        V.daemon.sender, V.daemon.time_between_queries, V.daemon.finder.collections,
-                    )
+                assert len(called) == 3
 
             async it "keeps going if find fails", V:
                 called = []
@@ -269,22 +234,19 @@ describe "DeviceFinderDaemon":
                     m = lambda s: Device.FieldSpec().empty_normalise(serial=s)
                     d1 = m("d073d5000001")
                     d2 = m("d073d5000002")
-
-                    d1ril = pytest.helpers.AsyncMock(name="d1_refresh_information_loop")
-                    d2ril = pytest.helpers.AsyncMock(name="d2_refresh_information_loop")
-
-                    p1 = mock.patch.object(d1, "refresh_information_loop", d1ril)
-                    p2 = mock.patch.object(d2, "refresh_information_loop", d2ril)
+                    found = []
 
                     async def find(fltr):
                         called.append(1)
 
                         yield d1
+                        found.append(d1)
 
                         if len(called) == 2:
                             raise ValueError("NOPE")
 
                         yield d2
+                        found.append(d2)
 
                         if len(called) == 3:
                             await futs[4]
@@ -312,7 +274,7 @@ describe "DeviceFinderDaemon":
                     p3 = mock.patch.object(V.daemon.finder, "find", find)
                     p4 = mock.patch.object(V.daemon, "hp_tick", Tick)
 
-                    with p1, p2, p3, p4:
+                    with p3, p4:
 
                         async def run():
                             async with V.daemon:
@@ -324,15 +286,85 @@ describe "DeviceFinderDaemon":
                             t.cancel()
 
                     assert len(called) == 3
-                    assert len(d1ril.mock_calls) == 3
-                    assert len(d2ril.mock_calls) == 2
-
-                    for eril in (d1ril, d2ril):
-                        assert eril.mock_calls[0] == mock.call(
-                            V.daemon.sender,
-                            V.daemon.time_between_queries,
-                            V.daemon.finder.collections,
-                        )
+                    assert found == [d1, d2, d1, d1, d2]
+
+        describe "refresh_loop":
+            async it "asks the finder to refresh stale information every second", V, FakeTime, MockedCallLater:
+                called = []
+                wait = hp.create_future()
+
+                async def refresh_stale(time_between_queries, *, jitter):
+                    called.append((time.time(), time_between_queries, jitter))
+                    if len(called) == 2:
+                        raise ValueError("NOPE")
+                    if len(called) == 4:
+                        wait.set_result(True)
+
+                refresh_stale = pytest.helpers.AsyncMock(
+                    name="refresh_stale", side_effect=refresh_stale
+                )
+
+                with FakeTime() as t:
+                    async with MockedCallLater(t):
+                        with mock.patch.object(V.daemon.finder, "refresh_stale", refresh_stale):
+                            async with hp.TaskHolder(V.final_future) as ts:
+                                task = ts.add(V.daemon.refresh_loop())
+                                await wait
+                                task.cancel()
+
+                assert called == [(i, 3, 0.5) for i in range(4)]
+
+        describe "snapshot_loop":
+            async it "saves a snapshot every snapshot_interval", V, FakeTime, MockedCallLater:
+                called = []
+                wait = hp.create_future()
+
+                def save_snapshot():
+                    called.append(time.time())
+                    if len(called) == 3:
+                        wait.set_result(True)
+
+                save_snapshot = mock.Mock(name="save_snapshot", side_effect=save_snapshot)
+                daemon = DeviceFinderDaemon(
+                    V.sender, final_future=V.final_future, snapshot_interval=30
+                )
+
+                with FakeTime() as t:
+                    async with MockedCallLater(t):
+                        with mock.patch.object(daemon.finder, "save_snapshot", save_snapshot):
+                            async with hp.TaskHolder(V.final_future) as ts:
+                                task = ts.add(daemon.snapshot_loop())
+                                await wait
+                                task.cancel()
+
+                assert called == [0, 30, 60]
+
+            async it "is only started if the finder has a snapshot_file", V:
+                started = []
+
+                async def loop(name):
+                    started.append(name)
+
+                def patched(daemon):
+                    return mock.patch.multiple(
+                        daemon,
+                        search_loop=lambda: loop("search"),
+                        refresh_loop=lambda: loop("refresh"),
+                        snapshot_loop=lambda: loop("snapshot"),
+                    )
+
+                with patched(V.daemon):
+                    async with V.daemon:
+                        await asyncio.sleep(0)
+                assert started == ["search", "refresh"]
+
+                started.clear()
+                finder = Finder(V.sender, V.final_future, snapshot_file="/tmp/nope/finder.json")
+                daemon = DeviceFinderDaemon(V.sender, finder=finder, final_future=V.final_future)
+                with patched(daemon):
+                    async with daemon:
+                        await asyncio.sleep(0)
+                assert started == ["search", "refresh", "snapshot"]
 
         describe "serials":
             async it "yields devices from finder.find", V:
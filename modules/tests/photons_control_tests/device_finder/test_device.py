@@ -168,6 +168,18 @@ describe "Device":
                 )
             )
 
+        it "only checks the fields it is given", device:
+            device.label = "kitchen"
+            device.hue = 20
+            filtr = Filter.from_kwargs(label="den", hue="0-30", saturation="0-0.5")
+
+            assert not device.matches_fltr(filtr)
+            assert device.matches_fltr(filtr, fields=["hue", "saturation"])
+            assert not device.matches_fltr(filtr, fields=["label", "hue"])
+            assert not device.matches_fltr(
+                Filter.from_kwargs(label="den", hue="50-60"), fields=["hue"]
+            )
+
     describe "set_from_pkt":
 
         @pytest.fixture()
@@ -195,6 +207,19 @@ describe "Device":
             assert device.set_from_pkt(pkt, collections) is InfoPoints.LIGHT_STATE
             assert device.power == "on"
 
+        it "takes in label and power without completing a point", device, collections:
+            pkt = DeviceMessages.StateLabel.create(label="den")
+            assert device.set_from_pkt(pkt, collections) is None
+            assert device.label == "den"
+
+            pkt = DeviceMessages.StatePower.create(level=65535)
+            assert device.set_from_pkt(pkt, collections) is None
+            assert device.power == "on"
+
+            pkt = LightMessages.StateLightPower.create(level=0)
+            assert device.set_from_pkt(pkt, collections) is None
+            assert device.power == "off"
+
         it "can take in StateGroup", device, collections:
             group_uuid = str(uuid.uuid1()).replace("-", "")
             pkt = DeviceMessages.StateGroup.create(group=group_uuid, updated_at=1, label="group1")
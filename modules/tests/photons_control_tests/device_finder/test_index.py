@@ -0,0 +1,135 @@
+# coding: spec
+
+from photons_control.device_finder import DeviceIndex, Collections, Device, Filter, InfoPoints
+
+from photons_messages import DeviceMessages, LightMessages
+
+import pytest
+
+describe "DeviceIndex":
+
+    @pytest.fixture()
+    def collections(self):
+        return Collections()
+
+    @pytest.fixture()
+    def index(self, collections):
+        return DeviceIndex(collections)
+
+    @pytest.fixture()
+    def make_device(self, index, collections):
+        def make_device(serial, label, product, group):
+            device = Device.FieldSpec().empty_normalise(serial=serial)
+            device.index = index
+
+            for pkt in (
+                LightMessages.LightState.create(
+                    label=label, power=0, hue=100, saturation=1, brightness=1, kelvin=3500
+                ),
+                DeviceMessages.StateVersion.create(vendor=1, product=product),
+                DeviceMessages.StateGroup.create(group=group, updated_at=1, label=f"g{group}"),
+            ):
+                device.set_from_pkt(pkt, collections)
+
+            return device
+
+        return make_device
+
+    @pytest.fixture()
+    def devices(self, make_device):
+        return [
+            make_device("d073d5000001", "kitchen", 22, "aa"),
+            make_device("d073d5000002", "kitchen light", 55, "aa"),
+            make_device("d073d5000003", "den", 22, "bb"),
+        ]
+
+    def matching(self, index, **kwargs):
+        return sorted(index.matching(Filter.from_kwargs(**kwargs)))
+
+    it "indexes devices as they get packets", index, devices:
+        assert index.index["label"] == {
+            "kitchen": {"d073d5000001"},
+            "kitchen light": {"d073d5000002"},
+            "den": {"d073d5000003"},
+        }
+        assert index.index["product_id"] == {
+            22: {"d073d5000001", "d073d5000003"},
+            55: {"d073d5000002"},
+        }
+        assert index.index["cap"]["chain"] == {"d073d5000002"}
+
+    it "finds serials for a filter", index, devices:
+        assert self.matching(index) == ["d073d5000001", "d073d5000002", "d073d5000003"]
+        assert self.matching(index, label="kitchen") == ["d073d5000001"]
+        assert self.matching(index, label="kitchen*") == ["d073d5000001", "d073d5000002"]
+        assert self.matching(index, label=["den", "kitchen"]) == [
+            "d073d5000001",
+            "d073d5000003",
+        ]
+        assert self.matching(index, label="kitchen*", product_id=22) == ["d073d5000001"]
+        assert self.matching(index, cap="chain") == ["d073d5000002"]
+        assert self.matching(index, cap=["chain", "not_chain"]) == [
+            "d073d5000001",
+            "d073d5000002",
+            "d073d5000003",
+        ]
+        assert self.matching(index, serial="d073d5000003", label="kitchen") == []
+        assert self.matching(index, power="off", label="den") == ["d073d5000003"]
+        assert self.matching(index, product_identifier="lifx_tile") == ["d073d5000002"]
+
+        # Fields that aren't indexed are left for matches_fltr
+        assert self.matching(index, hue="0-10", label="den") == ["d073d5000003"]
+
+    it "says which fields on a filter it doesn't use", index:
+
+        def unindexed(**kwargs):
+            return index.unindexed_fields(Filter.from_kwargs(**kwargs))
+
+        assert unindexed(label="den") == []
+        assert unindexed(label="den", serial="d073d5000001", group_name="one") == []
+        assert unindexed(label="den", hue="0-10") == ["hue"]
+        assert unindexed(hue="0-10", kelvin="3500-4000") is None
+        assert index.unindexed_fields(Filter.empty(refresh_info=True)) is None
+
+    it "finds group and location names from collections", index, collections, devices:
+        group_id = devices[2].group_id
+        assert self.matching(index, group_name="gb*") == ["d073d5000003"]
+        assert self.matching(index, group_id=group_id) == ["d073d5000003"]
+
+        collections.add_group(group_id, 2, "attic")
+        assert self.matching(index, group_name="gb*") == []
+        assert self.matching(index, group_name="attic") == ["d073d5000003"]
+
+    it "updates the index when values change", index, collections, devices:
+        devices[0].set_from_pkt(DeviceMessages.StateLabel.create(label="den"), collections)
+        assert self.matching(index, label="kitchen") == []
+        assert self.matching(index, label="den") == ["d073d5000001", "d073d5000003"]
+        assert index.index["label"] == {
+            "kitchen light": {"d073d5000002"},
+            "den": {"d073d5000001", "d073d5000003"},
+        }
+
+        devices[0].set_from_pkt(DeviceMessages.StatePower.create(level=65535), collections)
+        assert self.matching(index, power="on") == ["d073d5000001"]
+
+    it "can forget devices", index, devices:
+        index.remove("d073d5000002")
+        index.remove("d073d5000004")
+        assert self.matching(index, label="kitchen*") == ["d073d5000001"]
+        assert 55 not in index.index["product_id"]
+        assert "d073d5000002" not in index.values
+
+describe "Device knows":
+    it "says whether it has the information for a filter":
+        device = Device.FieldSpec().empty_normalise(serial="d073d5000001")
+        fltr = Filter.from_kwargs(label="kitchen", product_id=22)
+        assert not device.knows(fltr)
+
+        device.point_futures[InfoPoints.LIGHT_STATE].set_result(1)
+        assert not device.knows(fltr)
+
+        device.point_futures[InfoPoints.VERSION].set_result(1)
+        assert device.knows(fltr)
+        assert device.knows(Filter.empty())
+        assert not device.knows(Filter.from_kwargs(label="kitchen", refresh_info=True))
+        assert not device.knows(Filter.from_kwargs(group_name="one"))
@@ -13,8 +13,8 @@ from photons_products import Products
 
 from delfick_project.errors_pytest import assertRaises
 from unittest import mock
-import asyncio
 import pytest
+import json
 
 describe "Device":
 
@@ -118,349 +118,247 @@ describe "Device":
         V.received()
         V.assertTimes({InfoPoints.LIGHT_STATE: 8, InfoPoints.GROUP: 11, InfoPoints.VERSION: 9})
 
-    async it "can start an information loop", V, fake_time, MockedCallLater:
-        fake_time.set(1)
+describe "Finder information":
 
-        msgs = [e.value.msg for e in list(InfoPoints)]
-        assert msgs == [
+    @pytest.fixture()
+    def fake_device(self):
+        return FakeDevice(
+            "d073d5000001",
+            chp.default_responders(
+                Products.LCM2_A19,
+                label="kitchen",
+                power=0,
+                firmware=chp.Firmware(2, 80, 1337),
+                group_uuid="aa",
+                group_label="g1",
+                group_updated_at=42,
+                location_uuid="bb",
+                location_label="l1",
+                location_updated_at=56,
+            ),
+        )
+
+    @pytest.fixture()
+    async def runner(self, memory_devices_runner, fake_device):
+        async with memory_devices_runner([fake_device]) as runner:
+            yield runner
+
+    @pytest.fixture()
+    def fake_time(self, FakeTime):
+        with FakeTime() as t:
+            yield t
+
+    @pytest.fixture()
+    async def V(self, runner, fake_device, fake_time):
+        async with Finder(runner.sender) as finder:
+            await FoundSerials().find(runner.sender, timeout=1)
+            finder._ensure_devices([fake_device.serial])
+
+            class V:
+                t = fake_time
+
+                def __init__(s):
+                    s.runner = runner
+                    s.finder = finder
+                    s.fake_device = fake_device
+                    s.device = finder.devices[fake_device.serial]
+
+                def received(s, *pkts):
+                    s.fake_device.compare_received(pkts, keep_duplicates=True)
+                    s.fake_device.reset_received()
+
+            yield V()
+
+    async it "learns from replies to messages it didn't send", V:
+        V.t.set(2)
+        await V.runner.sender(DeviceMessages.GetLabel(), V.fake_device.serial)
+        await V.runner.sender(DeviceMessages.GetPower(), V.fake_device.serial)
+        assert V.device.info == {"serial": V.fake_device.serial, "label": "kitchen", "power": "off"}
+        assert not V.device.point_futures[InfoPoints.LIGHT_STATE].done()
+
+        await V.runner.sender(DeviceMessages.GetHostFirmware(), V.fake_device.serial)
+        assert V.device.firmware_version == "2.80"
+        assert V.device.point_futures[InfoPoints.FIRMWARE].result() == 2
+
+    async it "only asks for stale information", V:
+        V.t.set(1)
+        await V.finder.refresh_stale(jitter=0)
+        V.received(
             LightMessages.GetColor(),
             DeviceMessages.GetVersion(),
             DeviceMessages.GetHostFirmware(),
             DeviceMessages.GetGroup(),
             DeviceMessages.GetLocation(),
-        ]
-
-        message_futs = {}
-
-        class Futs:
-            pass
-
-        class Waiter:
-            def __init__(s, name, kls):
-                s.name = name
-                s.kls = kls
-                s.make_fut()
-
-            def make_fut(s, res=None):
-                fut = message_futs[s.name] = V.fake_device.wait_for("memory", s.kls)
-                fut.add_done_callback(s.make_fut)
-
-            def __await__(s):
-                yield from message_futs[s.name]
-
-            def add_done_callback(s, cb):
-                message_futs[s.name].add_done_callback(cb)
-
-            def remove_done_callback(s, cb):
-                message_futs[s.name].remove_done_callback(cb)
-
-            def done(s):
-                return message_futs[s.name].done()
-
-        for name, kls in [
-            ("color", LightMessages.GetColor),
-            ("version", DeviceMessages.GetVersion),
-            ("firmware", DeviceMessages.GetHostFirmware),
-            ("group", DeviceMessages.GetGroup),
-            ("location", DeviceMessages.GetLocation),
-        ]:
-            setattr(Futs, name, Waiter(name, kls))
-
-        async def checker(ff):
-            info = {"serial": V.fake_device.serial}
-
-            assert V.device.info == info
-            await hp.wait_for_all_futures(*[V.device.point_futures[kls] for kls in InfoPoints])
-
-            found = []
-            for kls in list(InfoPoints):
-                found.append(V.device.point_futures[kls].result())
-            assert found == [1, 2, 3, 4, 5]
-
-            assert V.t.time == 5
-
-            V.received(*msgs)
-
-            info.update(
-                {
-                    "label": "kitchen",
-                    "power": "off",
-                    "hue": 0.0,
-                    "saturation": 1.0,
-                    "brightness": 1.0,
-                    "kelvin": 3500,
-                    "firmware_version": "2.80",
-                    "product_id": 27,
-                    "product_identifier": "lifx_a19",
-                    "cap": [
-                        "color",
-                        "not_chain",
-                        "not_ir",
-                        "not_matrix",
-                        "not_multizone",
-                        "variable_color_temp",
-                    ],
-                    "group_id": "aa000000000000000000000000000000",
-                    "group_name": "g1",
-                    "location_id": "bb000000000000000000000000000000",
-                    "location_name": "l1",
-                }
-            )
-            assert V.device.info == info
-
-            await hp.wait_for_all_futures(Futs.color)
-            V.received(
-                LightMessages.GetColor(), keep_duplicates=True,
-            )
-            assert V.t.time == 11
-
-            await hp.wait_for_all_futures(Futs.group, Futs.location)
-            V.received(
-                *([LightMessages.GetColor()] * 5),
-                DeviceMessages.GetGroup(),
-                DeviceMessages.GetLocation(),
-                keep_duplicates=True,
-            )
-            # First location was at t=5
-            # We then wait another 60
-            # 60 is at 12 rounds, and next location after that is after 5
-            assert V.t.time == 65
-
-            assert V.device.point_futures[InfoPoints.LIGHT_STATE].result() == 61
-            await hp.wait_for_all_futures(Futs.color)
-            V.received(
-                LightMessages.GetColor(), keep_duplicates=True,
-            )
-            # 61 + 10 = 71
-            assert V.t.time == 71
-
-            await hp.wait_for_all_futures(Futs.firmware)
-            # First firmware was at t=3
-            # So next refresh after 103 which is 2 after 101 which is where LIGHT_STATE last is
-            assert V.device.point_futures[InfoPoints.LIGHT_STATE].result() == 101
-            assert V.t.time == 103
-
-            V.received(
-                LightMessages.GetColor(),
-                LightMessages.GetColor(),
-                LightMessages.GetColor(),
-                DeviceMessages.GetHostFirmware(),
-                keep_duplicates=True,
-            )
-
-            ff.cancel()
-
-        checker_task = None
-        time_between_queries = {"FIRMWARE": 100}
-
-        await FoundSerials().find(V.runner.sender, timeout=1)
-
-        async with MockedCallLater(fake_time):
-            with hp.ChildOfFuture(V.runner.final_future) as ff:
-                async with hp.TaskHolder(ff, name="TEST") as ts:
-                    checker_task = ts.add(checker(ff))
-                    ts.add(
-                        V.device.refresh_information_loop(
-                            V.runner.sender, time_between_queries, V.finder.collections
-                        )
-                    )
-
-        await checker_task
-
-    async it "stops the information loop when the device disappears", V, fake_device, fake_time, MockedCallLater:
-        fake_time.set(1)
-
-        msgs = [e.value.msg for e in list(InfoPoints)]
-        assert msgs == [
+        )
+        assert V.device.label == "kitchen"
+        assert V.device.firmware_version == "2.80"
+
+        await V.finder.refresh_stale(jitter=0)
+        V.received()
+
+        V.t.add(9.5)
+        await V.finder.refresh_stale(jitter=0)
+        V.received()
+
+        V.t.add(0.5)
+        await V.finder.refresh_stale(jitter=0)
+        V.received(LightMessages.GetColor())
+
+        # Someone else asking for the state counts as a refresh
+        V.t.add(10)
+        await V.runner.sender(LightMessages.GetColor(), V.fake_device.serial)
+        V.received(LightMessages.GetColor())
+        await V.finder.refresh_stale(jitter=0)
+        V.received()
+
+        V.t.add(50)
+        await V.finder.refresh_stale({"GROUP": 100}, jitter=0)
+        V.received(LightMessages.GetColor(), DeviceMessages.GetLocation())
+
+    async it "spreads refreshes over the refresh interval", V:
+        V.t.set(1)
+        await V.finder.refresh_stale(jitter=0.5)
+        V.received(
             LightMessages.GetColor(),
             DeviceMessages.GetVersion(),
             DeviceMessages.GetHostFirmware(),
             DeviceMessages.GetGroup(),
             DeviceMessages.GetLocation(),
-        ]
-
-        message_futs = {}
-
-        class Futs:
-            pass
-
-        class Waiter:
-            def __init__(s, name, kls):
-                s.name = name
-                s.kls = kls
-                s.make_fut()
-
-            def make_fut(s, res=None):
-                fut = message_futs[s.name] = V.fake_device.wait_for("memory", s.kls)
-                fut.add_done_callback(s.make_fut)
-
-            def __await__(s):
-                yield from message_futs[s.name]
-
-            def add_done_callback(s, cb):
-                message_futs[s.name].add_done_callback(cb)
-
-            def remove_done_callback(s, cb):
-                message_futs[s.name].remove_done_callback(cb)
-
-            def done(s):
-                return message_futs[s.name].done()
-
-        for name, kls in [
-            ("color", LightMessages.GetColor),
-            ("version", DeviceMessages.GetVersion),
-            ("firmware", DeviceMessages.GetHostFirmware),
-            ("group", DeviceMessages.GetGroup),
-            ("location", DeviceMessages.GetLocation),
-        ]:
-            setattr(Futs, name, Waiter(name, kls))
-
-        async def checker(ff, l):
-            info = {"serial": V.fake_device.serial}
-
-            assert V.device.info == info
-            await hp.wait_for_all_futures(*[V.device.point_futures[kls] for kls in InfoPoints])
-
-            found = []
-            for kls in list(InfoPoints):
-                found.append(V.device.point_futures[kls].result())
-            assert found == [1, 2, 3, 4, 5]
-
-            assert V.t.time == 5
-
-            V.received(*msgs)
-
-            info.update(
-                {
-                    "label": "kitchen",
-                    "power": "off",
-                    "hue": 0.0,
-                    "saturation": 1.0,
-                    "brightness": 1.0,
-                    "kelvin": 3500,
-                    "firmware_version": "2.80",
-                    "product_id": 27,
-                    "product_identifier": "lifx_a19",
-                    "cap": [
-                        "color",
-                        "not_chain",
-                        "not_ir",
-                        "not_matrix",
-                        "not_multizone",
-                        "variable_color_temp",
-                    ],
-                    "group_id": "aa000000000000000000000000000000",
-                    "group_name": "g1",
-                    "location_id": "bb000000000000000000000000000000",
-                    "location_name": "l1",
-                }
-            )
-            assert V.device.info == info
-
-            await hp.wait_for_all_futures(Futs.color)
-            V.received(
-                LightMessages.GetColor(), keep_duplicates=True,
-            )
-            assert V.t.time == 11
+        )
 
-            await hp.wait_for_all_futures(Futs.group, Futs.location)
-            V.received(
-                *([LightMessages.GetColor()] * 5),
-                DeviceMessages.GetGroup(),
-                DeviceMessages.GetLocation(),
-                keep_duplicates=True,
-            )
-            # First location was at t=5
-            # We then wait another 60
-            # 60 is at 12 rounds, and next location after that is after 5
-            assert V.t.time == 65
+        uniform = mock.Mock(name="uniform", return_value=0.75)
+        with mock.patch("random.uniform", uniform):
+            V.t.add(7)
+            await V.finder.refresh_stale(jitter=0.5)
+            V.received()
 
-            # Now we remove knowledge of the device
-            # And expect the information loop to end
+            V.t.add(0.5)
+            await V.finder.refresh_stale(jitter=0.5)
+            V.received(LightMessages.GetColor())
 
-            assert V.device.serial in V.runner.sender.found
+        assert mock.call(0.5, 1) in uniform.mock_calls
 
-            with fake_device.offline():
-                with assertRaises(FoundNoDevices):
-                    await FoundSerials().find(V.runner.sender, timeout=1)
+    async it "doesn't ask devices that aren't found", V:
+        with V.fake_device.offline():
+            with assertRaises(FoundNoDevices):
+                await FoundSerials().find(V.runner.sender, timeout=1)
 
-            assert V.device.serial not in V.runner.sender.found
+        await V.finder.refresh_stale()
+        V.received()
 
-            assert not l.done()
+    async it "matches devices it knows about without asking them", V:
+        V.t.set(1)
+        await V.finder.refresh_stale()
+        V.fake_device.reset_received()
 
-            # This will timeout if it hasn't ended
-            await l
+        matches = mock.Mock(name="matches", side_effect=NotImplementedError)
+        with mock.patch.object(V.device, "matches", matches):
+            found = [d async for d in V.finder.find(Filter.from_kwargs(label="kitch*"))]
+            assert found == [V.device]
 
-            ff.cancel()
+            found = [d async for d in V.finder.find(Filter.from_kwargs(label="den"))]
+            assert found == []
 
-        checker_task = None
-        time_between_queries = {"FIRMWARE": 100}
+            found = [
+                d async for d in V.finder.find(Filter.from_kwargs(group_name="g1", cap="color"))
+            ]
+            assert found == [V.device]
 
-        await FoundSerials().find(V.runner.sender, timeout=1)
+        V.received()
+        matches.assert_not_called()
 
-        async with MockedCallLater(fake_time):
-            with hp.ChildOfFuture(V.runner.final_future) as ff:
-                async with hp.TaskHolder(ff, name="TEST") as ts:
-                    l = ts.add(
-                        V.device.refresh_information_loop(
-                            V.runner.sender, time_between_queries, V.finder.collections
-                        )
-                    )
-                    checker_task = ts.add(checker(ff, l))
+    async it "only checks the fields the index doesn't look at", V:
+        V.t.set(1)
+        await V.finder.refresh_stale()
+        V.fake_device.reset_received()
 
-        await checker_task
+        matches_fltr = mock.Mock(name="matches_fltr", wraps=V.device.matches_fltr)
+        with mock.patch.object(V.device, "matches_fltr", matches_fltr):
+            fltr = Filter.from_kwargs(label="den")
+            assert [d async for d in V.finder.find(fltr)] == []
+            matches_fltr.assert_not_called()
 
-    async it "doesn't do multiple refresh loops at the same time", V, fake_time, MockedCallLater:
+            fltr = Filter.from_kwargs(label="kitch*", hue="0-360")
+            assert [d async for d in V.finder.find(fltr)] == [V.device]
+            matches_fltr.assert_called_once_with(fltr, fields=["hue"])
 
-        async def impl(*args, **kwargs):
-            await asyncio.sleep(200)
+        V.received()
 
-        private_refresh_information_loop = pytest.helpers.AsyncMock(
-            name="_refresh_information_loop", side_effect=impl
-        )
+    describe "snapshots":
+
+        async it "can save and restore devices", V, tmp_path:
+            path = str(tmp_path / "finder.json")
+
+            V.t.set(1)
+            await V.finder.refresh_stale()
+            V.fake_device.reset_received()
+            info = V.device.info
+
+            V.finder.snapshot_file = path
+            V.finder.save_snapshot()
+
+            V.t.set(20)
+            async with Finder(V.runner.sender, snapshot_file=path) as finder:
+                assert list(finder.devices) == [V.fake_device.serial]
+                device = finder.devices[V.fake_device.serial]
+                assert device.info == info
+                assert device.group == V.device.group
+                assert device.group_name == "g1"
+                assert device.location_name == "l1"
+                assert finder.last_seen == {V.fake_device.serial: 20}
+                assert finder.searched.result() == [V.fake_device.serial]
+                assert {e: f.result() for e, f in device.point_futures.items() if f.done()} == {
+                    e: 1 for e in InfoPoints
+                }
 
-        with mock.patch.object(
-            V.device, "_refresh_information_loop", private_refresh_information_loop
-        ):
-            async with hp.TaskHolder(V.runner.final_future, name="TEST") as ts:
-                assert not V.device.refreshing.done()
-
-                t1 = ts.add(
-                    V.device.refresh_information_loop(V.runner.sender, None, V.finder.collections)
-                )
-
-                await asyncio.sleep(0)
-                assert V.device.refreshing.done()
-                private_refresh_information_loop.assert_called_once_with(
-                    V.runner.sender, None, V.finder.collections
-                )
-                assert not t1.done()
-
-                # Next time we add does nothing
-                t2 = ts.add(
-                    V.device.refresh_information_loop(V.runner.sender, None, V.finder.collections)
-                )
-
-                await asyncio.sleep(0)
-                assert V.device.refreshing.done()
-                private_refresh_information_loop.assert_called_once_with(
-                    V.runner.sender, None, V.finder.collections
-                )
-                assert t2.done()
-                assert not t1.done()
-
-                # Now we stop the current one and restart again to actually be called
-                t1.cancel()
-                await asyncio.sleep(0)
-                assert not V.device.refreshing.done()
-
-                t3 = ts.add(
-                    V.device.refresh_information_loop(V.runner.sender, None, V.finder.collections)
-                )
-
-                await asyncio.sleep(0)
-                assert V.device.refreshing.done()
-                assert len(private_refresh_information_loop.mock_calls) == 2
-                assert not t3.done()
-
-                t3.cancel()
+                matches = mock.Mock(name="matches", side_effect=NotImplementedError)
+                with mock.patch.object(device, "matches", matches):
+                    fltr = Filter.from_kwargs(group_name="g1")
+                    assert [d async for d in finder.find(fltr)] == [device]
+
+                V.received()
+
+                # Only the stale information is asked for again
+                await finder.refresh_stale(jitter=0)
+                V.received(LightMessages.GetColor())
+
+        async it "doesn't replace devices it already has", V:
+            snapshot = V.finder.snapshot()
+            snapshot["devices"][V.fake_device.serial]["info"]["label"] = "attic"
+
+            V.device.label = "den"
+            V.finder.restore(snapshot)
+            assert V.finder.devices[V.fake_device.serial] is V.device
+            assert V.device.label == "den"
+
+        async it "ignores invalid snapshots", V, tmp_path:
+            path = tmp_path / "finder.json"
+
+            path.write_text("{")
+            async with Finder(V.runner.sender, snapshot_file=str(path)) as finder:
+                assert finder.devices == {}
+                assert not finder.searched.done()
+
+            path.write_text(json.dumps({"version": 0, "devices": {"d073d5000002": {}}}))
+            async with Finder(V.runner.sender, snapshot_file=str(path)) as finder:
+                assert finder.devices == {}
+
+            snapshot = {
+                "version": Finder.snapshot_version,
+                "collections": {"group": {"aa": {"name": "g2"}}},
+                "devices": {
+                    "d073d5000002": {"info": {"label": "den"}},
+                    "d073d5000003": {"info": {"label": "attic"}, "points": {"NOPE": 2}},
+                },
+            }
+            path.write_text(json.dumps(snapshot))
+            async with Finder(V.runner.sender, snapshot_file=str(path)) as finder:
+                assert list(finder.devices) == ["d073d5000003"]
+                assert finder.devices["d073d5000003"].label == "attic"
+                assert finder.collections.collections["group"] == {}
+
+        async it "doesn't save when there are no devices", V, tmp_path:
+            path = tmp_path / "finder.json"
+            async with Finder(V.runner.sender, snapshot_file=str(path)):
+                pass
+            assert not path.exists()
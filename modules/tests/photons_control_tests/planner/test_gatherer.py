@@ -1,6 +1,6 @@
 # coding: spec
 
-from photons_control.planner import Gatherer, make_plans, Plan, NoMessages, Skip
+from photons_control.planner import Gatherer, make_plans, Plan, NoMessages, NotResolved, Skip
 from photons_control import test_helpers as chp
 
 from photons_app.errors import TimedOut, BadRunWithResults
@@ -10,10 +10,13 @@ from photons_transport.fake import FakeDevice
 from photons_products import Products
 
 from delfick_project.errors_pytest import assertRaises, assertSameError
+from delfick_project.norms import sb
 from contextlib import contextmanager
 from unittest import mock
 import itertools
+import asyncio
 import pytest
+import time
 
 light1 = FakeDevice(
     "d073d5000001",
@@ -71,6 +74,39 @@ def compare_called(got, want):
     assert want == got
 
 
+def compare_per_serial(got, want, serial_index=1):
+    """
+    Compare the order of things per serial
+
+    Messages for many devices are sent together so the order between devices
+    depends on when each device replies.
+    """
+
+    def by_serial(items):
+        result = {}
+        for item in items:
+            result.setdefault(item[serial_index], []).append(item)
+        return result
+
+    got_by_serial = by_serial(got)
+    want_by_serial = by_serial(want)
+    for serial in sorted(set(got_by_serial) | set(want_by_serial)):
+        compare_called(got_by_serial.get(serial, []), want_by_serial.get(serial, []))
+
+
+class RecordingSender:
+    def __init__(s, sender):
+        s.sender = sender
+        s.calls = []
+
+    def __getattr__(s, name):
+        return getattr(s.sender, name)
+
+    def __call__(s, msgs, reference=None, **kwargs):
+        s.calls.append(([type(msg) for msg in msgs], sorted(reference)))
+        return s.sender(msgs, reference, **kwargs)
+
+
 describe "Gatherer":
 
     def compare_received(self, by_light):
@@ -95,6 +131,94 @@ describe "Gatherer":
         with mock.patch("time.time", t):
             yield t
 
+    describe "sending messages":
+
+        async it "sends the same messages to many devices together", runner:
+            sender = RecordingSender(runner.sender)
+            gatherer = Gatherer(sender)
+
+            plans = make_plans("label", "power")
+            got = dict(await gatherer.gather_all(plans, runner.serials))
+
+            assert sender.calls == [
+                ([DeviceMessages.GetLabel, DeviceMessages.GetPower], sorted(runner.serials))
+            ]
+            assert got[light1.serial] == (
+                True,
+                {"label": "bob", "power": {"level": 0, "on": False}},
+            )
+
+            self.compare_received(
+                {
+                    light1: [DeviceMessages.GetLabel(), DeviceMessages.GetPower()],
+                    light2: [DeviceMessages.GetLabel(), DeviceMessages.GetPower()],
+                    light3: [DeviceMessages.GetLabel(), DeviceMessages.GetPower()],
+                }
+            )
+
+        async it "groups devices that need different messages", runner:
+            gatherer = Gatherer(runner.sender)
+            await gatherer.gather_all(make_plans("label"), light1.serial)
+            self.compare_received({light1: [DeviceMessages.GetLabel()]})
+
+            sender = RecordingSender(runner.sender)
+            gatherer.sender = sender
+
+            plans = make_plans("label", "power")
+            got = dict(await gatherer.gather_all(plans, runner.serials))
+
+            assert sorted(sender.calls, key=lambda call: call[1]) == [
+                ([DeviceMessages.GetPower], [light1.serial]),
+                (
+                    [DeviceMessages.GetLabel, DeviceMessages.GetPower],
+                    [light2.serial, light3.serial],
+                ),
+            ]
+            assert all(completed for completed, _ in got.values())
+
+            self.compare_received(
+                {
+                    light1: [DeviceMessages.GetPower()],
+                    light2: [DeviceMessages.GetLabel(), DeviceMessages.GetPower()],
+                    light3: [DeviceMessages.GetLabel(), DeviceMessages.GetPower()],
+                }
+            )
+
+        async it "doesn't change the plan messages for each device", runner:
+            get_power = DeviceMessages.GetPower()
+            before = repr(get_power)
+            sent = []
+
+            class PowerPlan(Plan):
+                messages = [get_power]
+
+                class Instance(Plan.Instance):
+                    def process(s, pkt):
+                        if pkt | DeviceMessages.StatePower:
+                            s.level = pkt.level
+                            return True
+
+                    async def info(s):
+                        return s.level
+
+            class Sender(RecordingSender):
+                def __call__(s, msgs, reference=None, **kwargs):
+                    sent.extend(msgs)
+                    return super().__call__(msgs, reference, **kwargs)
+
+            gatherer = Gatherer(Sender(runner.sender))
+            got = dict(await gatherer.gather_all(make_plans(p=PowerPlan()), runner.serials))
+
+            assert got == {
+                light1.serial: (True, {"p": 0}),
+                light2.serial: (True, {"p": 65535}),
+                light3.serial: (True, {"p": 0}),
+            }
+
+            assert sent and all(msg is get_power for msg in sent)
+            assert get_power.actual("target") is sb.NotSpecified
+            assert repr(get_power) == before
+
     describe "A plan saying NoMessages":
 
         async it "processes without needing messages", runner:
@@ -374,6 +498,173 @@ describe "Gatherer":
                 ],
             )
 
+    describe "a plan_timeout":
+
+        async it "yields unresolved for plans that take too long", runner:
+            gatherer = Gatherer(runner.sender)
+            plans = make_plans("label", "power")
+
+            found = []
+            start = time.time()
+            with light1.no_replies_for(DeviceMessages.GetLabel):
+                async for serial, label, info in gatherer.gather(
+                    plans, two_lights, plan_timeout=0.2, message_timeout=5
+                ):
+                    found.append((serial, label, info))
+
+            assert time.time() - start < 2
+            assert sorted(found, key=lambda f: f[:2]) == [
+                (light1.serial, "label", NotResolved),
+                (light1.serial, "power", {"level": 0, "on": False}),
+                (light2.serial, "label", "sam"),
+                (light2.serial, "power", {"level": 65535, "on": True}),
+            ]
+            assert found[-1] == (light1.serial, "label", NotResolved)
+
+        async it "doesn't yield plans that error and keeps gathering", runner:
+
+            class Broken(Plan):
+                messages = [DeviceMessages.GetPower()]
+
+                class Instance(Plan.Instance):
+                    def process(s, pkt):
+                        return pkt | DeviceMessages.StatePower
+
+                    async def info(s):
+                        raise ValueError("NOPE")
+
+            gatherer = Gatherer(runner.sender)
+            plans = make_plans("label", broken=Broken())
+
+            found = []
+            error_catcher = []
+            start = time.time()
+            with light1.no_replies_for(DeviceMessages.GetLabel):
+                async for serial, label, info in gatherer.gather(
+                    plans,
+                    two_lights,
+                    plan_timeout=0.2,
+                    message_timeout=5,
+                    error_catcher=error_catcher,
+                ):
+                    found.append((serial, label, info))
+
+            assert time.time() - start < 2
+            assert found == [
+                (light2.serial, "label", "sam"),
+                (light1.serial, "label", NotResolved),
+            ]
+
+            assert len(error_catcher) == 2
+            for error in error_catcher:
+                assert isinstance(error, ValueError)
+                assert str(error) == "NOPE"
+
+        async it "has a deadline per plan", runner:
+            gatherer = Gatherer(runner.sender)
+            plans = make_plans("label", "power")
+
+            found = []
+            start = time.time()
+            with light1.no_replies_for(DeviceMessages.GetLabel):
+                with light1.no_replies_for(DeviceMessages.GetPower):
+                    async for serial, label, info in gatherer.gather(
+                        plans, two_lights, plan_timeout={"label": 0.1, "power": 0.5}
+                    ):
+                        found.append((serial, label, info, time.time() - start))
+
+            assert [f[:3] for f in found] == [
+                (light2.serial, "label", "sam"),
+                (light2.serial, "power", {"level": 65535, "on": True}),
+                (light1.serial, "label", NotResolved),
+                (light1.serial, "power", NotResolved),
+            ]
+            assert 0.1 <= found[2][3] < 0.4
+            assert 0.5 <= found[3][3] < 1
+
+        async it "doesn't yield a result for a plan that already timed out", runner:
+
+            class SlowLabel(Plan):
+                messages = [DeviceMessages.GetLabel()]
+
+                class Instance(Plan.Instance):
+                    def process(s, pkt):
+                        if pkt | DeviceMessages.StateLabel:
+                            s.label = pkt.label
+                            return True
+
+                    async def info(s):
+                        if s.serial == light1.serial:
+                            await asyncio.sleep(0.3)
+                        return s.label
+
+            gatherer = Gatherer(runner.sender)
+            plans = make_plans("power", label=SlowLabel())
+
+            found = []
+            start = time.time()
+            with light1.no_replies_for(DeviceMessages.GetPower):
+                async for serial, label, info in gatherer.gather(
+                    plans,
+                    two_lights,
+                    plan_timeout={"label": 0.1, "power": 0.6},
+                    message_timeout=5,
+                ):
+                    found.append((serial, label, info))
+
+            assert time.time() - start >= 0.6
+            assert sorted(found, key=lambda f: f[:2]) == [
+                (light1.serial, "label", NotResolved),
+                (light1.serial, "power", NotResolved),
+                (light2.serial, "label", "sam"),
+                (light2.serial, "power", {"level": 65535, "on": True}),
+            ]
+
+        async it "doesn't wait for the deadline if everything resolves", runner:
+            gatherer = Gatherer(runner.sender)
+            plans = make_plans("label", "power")
+
+            start = time.time()
+            got = dict(await gatherer.gather_all(plans, two_lights, plan_timeout=10))
+
+            assert time.time() - start < 2
+            assert got == {
+                light1.serial: (True, {"label": "bob", "power": {"level": 0, "on": False}}),
+                light2.serial: (True, {"label": "sam", "power": {"level": 65535, "on": True}}),
+            }
+
+        async it "yields every result to a consumer that is slower than the devices", runner:
+            gatherer = Gatherer(runner.sender)
+            plans = make_plans("label", "power")
+
+            found = []
+            async for serial, label, info in gatherer.gather(
+                plans, runner.serials, plan_timeout=10
+            ):
+                await asyncio.sleep(0.01)
+                found.append((serial, label))
+
+            assert sorted(found) == sorted(
+                (serial, label) for serial in runner.serials for label in ("label", "power")
+            )
+
+        async it "yields devices per serial with a custom unresolved value", runner:
+            gatherer = Gatherer(runner.sender)
+            plans = make_plans("label", "power")
+            waiting = mock.NonCallableMock(name="waiting", spec=[])
+
+            found = []
+            with light1.no_replies_for(DeviceMessages.GetPower):
+                async for serial, completed, info in gatherer.gather_per_serial(
+                    plans, two_lights, plan_timeout=0.2, unresolved=waiting, message_timeout=5
+                ):
+                    found.append((serial, completed, info))
+
+            assert found == [
+                (light2.serial, True, {"label": "sam", "power": {"level": 65535, "on": True}}),
+                (light1.serial, False, {"label": "bob", "power": waiting}),
+            ]
+
     describe "A plan with messages":
 
         async it "messages are processed until we say plan is done", runner:
@@ -515,13 +806,17 @@ describe "Gatherer":
                     ):
                         found.append((serial, label, info))
 
-            assert found == [
-                (light1.serial, "power", 0),
-                (light2.serial, "label", "sam"),
-                (light2.serial, "power", 65535),
-                (light2.serial, "looker", True),
-                (light1.serial, "looker", True),
-            ]
+            compare_per_serial(
+                found,
+                [
+                    (light1.serial, "power", 0),
+                    (light2.serial, "label", "sam"),
+                    (light2.serial, "power", 65535),
+                    (light2.serial, "looker", True),
+                    (light1.serial, "looker", True),
+                ],
+                serial_index=0,
+            )
 
             self.compare_received(
                 {
@@ -534,7 +829,7 @@ describe "Gatherer":
             label_type = DeviceMessages.StateLabel.Payload.message_type
             power_type = DeviceMessages.StatePower.Payload.message_type
 
-            compare_called(
+            compare_per_serial(
                 called,
                 [
                     ("label", light1.serial, power_type),
@@ -663,13 +958,17 @@ describe "Gatherer":
                     found.append((serial, label, info))
 
             assertError(error_catcher)
-            assert found == [
-                (light1.serial, "power", 0),
-                (light2.serial, "label", "sam"),
-                (light2.serial, "power", 65535),
-                (light2.serial, "looker", True),
-                (light1.serial, "looker", True),
-            ]
+            compare_per_serial(
+                found,
+                [
+                    (light1.serial, "power", 0),
+                    (light2.serial, "label", "sam"),
+                    (light2.serial, "power", 65535),
+                    (light2.serial, "looker", True),
+                    (light1.serial, "looker", True),
+                ],
+                serial_index=0,
+            )
 
             self.compare_received(
                 {
@@ -682,7 +981,7 @@ describe "Gatherer":
             label_type = DeviceMessages.StateLabel.Payload.message_type
             power_type = DeviceMessages.StatePower.Payload.message_type
 
-            compare_called(
+            compare_per_serial(
                 called,
                 [
                     ("label", light1.serial, power_type),
@@ -1184,6 +1483,29 @@ describe "Gatherer":
                 }
             )
 
+        @pytest.mark.async_timeout(5)
+        async it "doesn't make devices wait for dependencies from slow devices", runner:
+
+            async def intercept(pkt, source):
+                if pkt | DeviceMessages.GetVersion:
+                    return False
+
+            light3.set_intercept_got_message(intercept)
+
+            gatherer = Gatherer(runner.sender)
+            plans = make_plans("zones")
+
+            start = time.time()
+            found = []
+            async for serial, label, info in gatherer.gather(
+                plans, [light1.serial, light3.serial], error_catcher=[], message_timeout=1
+            ):
+                found.append((serial, label, info, time.time() - start))
+
+            assert [f[:3] for f in found] == [(light1.serial, "zones", Skip)]
+            assert found[0][3] < 0.5
+            assert time.time() - start >= 1
+
         async it "it can get dependencies of dependencies and messages can be shared", runner:
             called = []
 
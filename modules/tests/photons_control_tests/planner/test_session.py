@@ -434,3 +434,110 @@ describe "Session":
             session.refresh_filled(V.plankeyb, V.serial2, 5)
 
             assert session.filled == {V.plankeya: session.filled[V.plankeya]}
+
+    describe "bounds":
+
+        def pkt(self, serial, key):
+            return mock.Mock(
+                name=f"pkt_{serial}_{key}", serial=serial, Information=Information(key)
+            )
+
+        it "counts hits and misses", session:
+            session.receive(self.pkt("d073d5000001", "one"))
+            session.fill("plan", "d073d5000001", 1)
+
+            assert session.has_received("one", "d073d5000001")
+            assert not session.has_received("two", "d073d5000001")
+            assert not session.has_received("one", "d073d5000002")
+            assert session.completed("plan", "d073d5000001") == 1
+            assert session.completed("plan", "d073d5000002") is None
+
+            assert (session.hits, session.misses, session.evictions) == (2, 3, 0)
+
+        it "forgets the least recently used keys for a serial", session:
+            session.max_keys_per_serial = 2
+
+            session.receive(self.pkt("d073d5000001", "one"))
+            session.receive(self.pkt("d073d5000001", "two"))
+            assert session.has_received("one", "d073d5000001")
+
+            session.receive(self.pkt("d073d5000001", "three"))
+            assert list(session.received["d073d5000001"]) == ["one", "three"]
+            assert session.evictions == 1
+
+        it "forgets the least recently used serials", session:
+            session.max_serials = 2
+            session.receive(self.pkt("d073d5000001", "one"))
+            session.fill("plan", "d073d5000001", 1)
+            session.receive(self.pkt("d073d5000002", "one"))
+            session.receive(self.pkt("d073d5000001", "two"))
+            session.receive(self.pkt("d073d5000003", "one"))
+
+            assert list(session.received) == ["d073d5000001", "d073d5000003"]
+
+            session.receive(self.pkt("d073d5000004", "one"))
+            assert list(session.received) == ["d073d5000003", "d073d5000004"]
+            assert session.filled == {}
+            assert session.evictions == 3
+
+        it "only yields known packets for the serial", session:
+            pkt1 = self.pkt("d073d5000001", "one")
+            session.receive(pkt1)
+            session.receive(self.pkt("d073d5000002", "one"))
+            assert list(session.known_packets("d073d5000001")) == [pkt1]
+            assert list(session.known_packets("d073d5000003")) == []
+            assert "d073d5000003" not in session.received
+
+        it "forgets things no plan would use when it sweeps", session, fake_time:
+            fake_time.set(1)
+            old = self.pkt("d073d5000001", "one")
+            session.receive(old)
+            session.receive(self.pkt("d073d5000001", "forever"))
+            session.receive(self.pkt("d073d5000002", "unknown"))
+            session.fill("plan", "d073d5000001", 1)
+            session.fill("plan_forever", "d073d5000001", 2)
+
+            session.refresh_received("one", "d073d5000001", 5)
+            session.refresh_received("one", "d073d5000002", 2)
+            session.refresh_received("forever", "d073d5000001", False)
+            session.refresh_received("forever", "d073d5000002", 1)
+            session.refresh_filled("plan", "d073d5000001", 5)
+            session.refresh_filled("plan_forever", "d073d5000001", False)
+            assert session.ttls == {"one": 5, "forever": None, "plan": 5, "plan_forever": None}
+
+            fake_time.set(4)
+            new = self.pkt("d073d5000001", "one")
+            session.receive(new)
+
+            fake_time.set(7)
+            session.sweep()
+            assert session.received == {
+                "d073d5000001": {"one": [(4, new)], "forever": mock.ANY},
+                "d073d5000002": {"unknown": mock.ANY},
+            }
+            assert session.filled == {"plan_forever": {"d073d5000001": (1, 2)}}
+            assert session.evictions == 1
+            assert "plan" not in session.ttls
+
+            session.max_age = 100
+            fake_time.set(102)
+            session.sweep()
+            assert session.received == {}
+            assert session.filled == {}
+
+        it "only sweeps every so often when making planners", session, fake_time:
+            sweep = mock.Mock(name="sweep")
+
+            with mock.patch.object(session, "sweep", sweep):
+                fake_time.set(1)
+                session.planner({}, {}, "d073d5000001", [])
+                sweep.assert_called_once_with(1)
+                session.last_sweep = 1
+
+                fake_time.set(5)
+                session.planner({}, {}, "d073d5000001", [])
+                sweep.assert_called_once_with(1)
+
+                fake_time.set(6)
+                session.planner({}, {}, "d073d5000001", [])
+                assert sweep.mock_calls == [mock.call(1), mock.call(6)]
@@ -0,0 +1,211 @@
+# coding: spec
+
+from photons_protocol.codec import PacketCodec, BitGroup, Field
+from photons_protocol.packing import PacketPacking
+from photons_protocol.types import Type as T
+from photons_protocol.errors import BadConversion
+from photons_protocol.packets import dictobj
+
+from photons_messages import LightMessages, TileMessages, MultiZoneMessages, DeviceMessages
+
+from delfick_project.errors_pytest import assertRaises
+from bitarray import bitarray
+from unittest import mock
+import pytest
+
+
+def slow_pack(pkt, **kwargs):
+    with mock.patch.object(PacketCodec, "for_kls", lambda *a: None):
+        return PacketPacking.pack(pkt, **kwargs)
+
+
+def slow_unpack(kls, val):
+    with mock.patch.object(PacketCodec, "for_kls", lambda *a: None):
+        return PacketPacking.unpack(kls, val)
+
+
+describe "PacketCodec":
+    describe "compile":
+        it "returns None if there are no fields":
+            assert PacketCodec.compile([]) is None
+
+        it "returns None if any size is dynamic":
+            assert PacketCodec.compile([("one", T.Uint8), ("two", T.Bytes(lambda p: 8))]) is None
+            assert PacketCodec.compile([("one", T.Uint8.multiple(lambda p: 2))]) is None
+
+        it "returns None if the layout doesn't end on a byte boundary":
+            assert PacketCodec.compile([("one", T.Uint8), ("two", T.Bool)]) is None
+
+        it "groups fields that aren't byte aligned":
+            codec = PacketCodec.compile(
+                [
+                    ("one", T.Uint16),
+                    ("two", T.Uint16.S(12)),
+                    ("three", T.Bool),
+                    ("four", T.Bool),
+                    ("five", T.Reserved(2, left=True)),
+                    ("six", T.Bytes(16)),
+                    ("seven", T.Uint8.multiple(3)),
+                ]
+            )
+
+            assert [type(part) for part in codec.parts] == [Field, BitGroup, Field, Field]
+            assert [m[0] for m in codec.parts[1].members] == ["two", "three", "four", "five"]
+            assert codec.struct.format in ("<H2s2s3B", b"<H2s2s3B")
+            assert codec.size == 9
+
+        it "is stored on the Meta of the class":
+
+            class P(dictobj.PacketSpec):
+                fields = [("one", T.Uint8)]
+
+            codec = PacketCodec.for_kls(P)
+            assert P.Meta.codec is codec
+            assert PacketCodec.for_kls(P) is codec
+
+        it "is None for things that aren't packets":
+            assert PacketCodec.for_kls(mock.Mock(name="kls", spec=[])) is None
+
+    describe "packing":
+
+        @pytest.fixture()
+        def messages(self):
+            return [
+                LightMessages.SetColor(
+                    hue=100,
+                    saturation=0.5,
+                    brightness=0.3,
+                    kelvin=3500,
+                    duration=2,
+                    source=2,
+                    sequence=3,
+                    target="d073d5000001",
+                ),
+                DeviceMessages.SetLabel(label="kitchen", source=1, sequence=1, target=None),
+                TileMessages.Set64(
+                    tile_index=1,
+                    length=1,
+                    x=0,
+                    y=0,
+                    width=8,
+                    duration=0,
+                    colors=[{"hue": i, "saturation": 1, "brightness": 1} for i in range(64)],
+                    source=4,
+                    sequence=5,
+                    target="d073d5000002",
+                ),
+                MultiZoneMessages.StateExtendedColorZones(
+                    zones_count=82,
+                    zone_index=0,
+                    colors_count=82,
+                    colors=[{"hue": i, "saturation": 0.1, "brightness": 1} for i in range(82)],
+                    source=6,
+                    sequence=7,
+                    target="d073d5000003",
+                ),
+            ]
+
+        it "packs the same as packing field by field", messages:
+            for msg in messages:
+                simple = msg.simplify()
+                assert PacketCodec.for_kls(type(simple)) is not None
+                assert simple.pack() == slow_pack(simple)
+
+                payload = msg.payload
+                assert PacketCodec.for_kls(type(payload)) is not None
+                assert payload.pack() == slow_pack(payload)
+
+        it "unpacks the same as unpacking field by field", messages:
+            for msg in messages:
+                bts = msg.tobytes(None)
+                expected = slow_unpack(type(msg), bts)
+
+                for val in (bts, msg.pack()):
+                    got = type(msg).create(val)
+                    assert got == expected
+                    assert repr(got) == repr(expected)
+
+        it "keeps left cut fields and bools in the right place":
+
+            class P(dictobj.PacketSpec):
+                fields = [
+                    ("one", T.Uint16.S(12)),
+                    ("two", T.Bool),
+                    ("three", T.Bool),
+                    ("four", T.Uint8.S(2, left=True)),
+                ]
+
+            p = P(one=1024, two=True, three=False, four=0xC0)
+            assert p.pack() == slow_pack(p)
+            assert p.pack() == bitarray("0000000000101011", endian="little")
+
+            got = P.create(p.pack())
+            assert (got.one, got.two, got.three, got.four) == (1024, True, False, 0xC0)
+
+        it "falls back when values can't be packed by the codec":
+
+            class P(dictobj.PacketSpec):
+                fields = [("one", T.Uint8), ("two", T.Bytes(16))]
+
+            p = P(one=300, two=b"\x01\x02")
+            assert PacketCodec.for_kls(P).pack(p, None, None) is None
+
+            with assertRaises(BadConversion, "Failed trying to convert a value", val=300):
+                p.pack()
+
+        it "falls back when unpacking data that is too short":
+
+            class P(dictobj.PacketSpec):
+                fields = [("one", T.Uint8), ("two", T.Uint16)]
+
+            assert PacketCodec.for_kls(P).unpack(P, b"\x01\x02") is None
+
+            got = P.create(b"\x01\x02")
+            assert (got.one, got.two) == (1, 2)
+
+        it "puts remaining data on the payload of a parent packet":
+
+            class P(dictobj.PacketSpec):
+                parent_packet = True
+                fields = [("one", T.Int8), ("payload", "Payload")]
+
+                class Payload(dictobj.PacketSpec):
+                    message_type = 0
+                    fields = []
+
+            got = PacketCodec.for_kls(P).unpack(P, b"\x80\xaa")
+            assert got.one == -128
+            assert got.__getitem__("payload", allow_bitarray=True) == bitarray(
+                "01010101", endian="little"
+            )
+
+        it "packs multiple fields that haven't been expanded without expanding them", messages:
+            msg = messages[2]
+            expected = msg.pack()
+            got = TileMessages.Set64.create(expected)
+            assert type(dict.__getitem__(got, "colors")) is bitarray
+
+            with mock.patch.object(
+                type(got), "_expand_multiple", mock.NonCallableMock(name="_expand_multiple")
+            ):
+                assert got.pack() == expected
+
+            assert type(dict.__getitem__(got, "colors")) is bitarray
+            assert got.colors == msg.colors
+
+        it "can give a multiple field all of its bytes", messages:
+            msg = messages[2]
+            expected = msg.pack()
+            codec = PacketCodec.for_kls(TileMessages.Set64)
+
+            got = msg.clone()
+            codec.set_raw(got, "colors", expected[-64 * 8 * 8 :].tobytes())
+            assert type(dict.__getitem__(got, "colors")) is bitarray
+            assert got.pack() == expected
+            assert got.colors == msg.colors
+
+            with assertRaises(ValueError, "Expected 512 bytes for colors, got 2"):
+                codec.set_raw(got, "colors", b"\x00\x01")
+
+            with assertRaises(ValueError, "width isn't a multiple field"):
+                codec.set_raw(got, "width", b"\x00")
@@ -0,0 +1,94 @@
+# coding: spec
+
+from photons_protocol.packets import dictobj
+from photons_protocol.types import MultipleWrapper, Type as T
+
+from photons_messages import TileMessages, LightMessages
+
+from bitarray import bitarray
+from unittest import mock
+
+describe "Lazy decoding":
+    it "doesn't decode multiple fields until they are accessed":
+        msg = TileMessages.Set64(
+            tile_index=1,
+            length=1,
+            x=0,
+            y=0,
+            width=8,
+            duration=0,
+            colors=[{"hue": i, "saturation": 1, "brightness": 1} for i in range(64)],
+            source=1,
+            sequence=2,
+            target="d073d5000001",
+        )
+
+        got = TileMessages.Set64.create(msg.pack())
+        assert type(dict.__getitem__(got, "colors")) is bitarray
+
+        colors = got.colors
+        assert isinstance(colors, MultipleWrapper)
+        assert dict.__getitem__(got, "colors") is colors
+        assert [c.hue for c in colors] == [c.hue for c in msg.colors]
+        assert got.pack() == msg.pack()
+
+    it "keeps changes to items of an unpacked multiple field":
+
+        class P(dictobj.PacketSpec):
+            fields = [("one", T.Uint8.multiple(3))]
+
+        p = P.create(P(one=[1, 2, 3]).pack())
+        p.one[1] = 20
+        assert p.one == [1, 20, 3]
+        assert P.create(p.pack()).one == [1, 20, 3]
+
+    it "remembers decoded values until the raw value changes":
+
+        class P(dictobj.PacketSpec):
+            fields = [("one", T.String(32)), ("two", T.Uint8)]
+
+        p = P.create(P(one="hi", two=3).pack())
+
+        getitem_spec = mock.Mock(name="getitem_spec", side_effect=P.getitem_spec, autospec=True)
+        with mock.patch.object(P, "getitem_spec", lambda *a: getitem_spec(*a)):
+            assert p.one == "hi"
+            assert p.one == "hi"
+            assert len(getitem_spec.mock_calls) == 1
+
+            p.one = "there"
+            assert p.one == "there"
+            assert p.one == "there"
+            assert len(getitem_spec.mock_calls) == 2
+
+    it "doesn't remember values for fields that depend on other fields":
+        msg = LightMessages.SetColor(
+            hue=100, saturation=1, brightness=1, kelvin=3500, source=1, sequence=2, target=None
+        )
+        got = LightMessages.SetColor.create(msg.pack())
+        assert "target" not in type(got).decoded_names()
+        assert "hue" in type(got).decoded_names()
+
+    it "compares without decoding either packet":
+        msg = TileMessages.Set64(
+            tile_index=1,
+            length=1,
+            x=0,
+            y=0,
+            width=8,
+            duration=0,
+            colors=[{"hue": i, "saturation": 1, "brightness": 1} for i in range(64)],
+            source=1,
+            sequence=2,
+            target="d073d5000001",
+        )
+
+        one = TileMessages.Set64.create(msg.pack())
+        two = TileMessages.Set64.create(msg.pack())
+        assert one == two
+
+        two.tile_index = 2
+        assert one != two
+
+        for got in (one, two):
+            assert type(dict.__getitem__(got, "colors")) is bitarray
+            assert "_decoded" not in got.__dict__
@@ -798,6 +798,7 @@ describe "Communication":
 
             with mock.patch.object(V.communication.receiver, "recv", recv):
                 pkt = DeviceMessages.StatePower(level=100, source=1, sequence=1, target=None)
+                V.communication.receiver.register(pkt, hp.create_future(), pkt)
                 data = pkt.pack().tobytes()
                 await V.communication.received_data(data, addr, allow_zero=allow_zero)
 
@@ -818,11 +819,80 @@ describe "Communication":
                 pkt = LIFXPacket(
                     payload=b"things", pkt_type=9001, source=1, sequence=1, target=None
                 )
+                V.communication.receiver.register(pkt, hp.create_future(), pkt)
                 data = pkt.pack().tobytes()
                 await V.communication.received_data(data, addr, allow_zero=allow_zero)
 
             recv.assert_called_once_with(mock.ANY, addr, allow_zero=allow_zero)
 
+        async it "doesn't unpack packets that the receiver isn't expecting", V:
+            addr = mock.Mock(name="addr")
+            recv = pytest.helpers.AsyncMock(name="recv")
+            create = mock.Mock(name="create")
+
+            pkt = DeviceMessages.StatePower(level=100, source=1, sequence=1, target="d073d5000001")
+            other = pkt.clone(overrides={"sequence": 2})
+            V.communication.receiver.register(other, hp.create_future(), other)
+
+            with mock.patch.object(V.communication.receiver, "recv", recv):
+                with mock.patch.object(DeviceMessages.StatePower, "create", create):
+                    await V.communication.received_data(pkt.pack().tobytes(), addr)
+
+            assert len(recv.mock_calls) == 0
+            assert len(create.mock_calls) == 0
+
+        async it "makes acks from just the header", V:
+            addr = mock.Mock(name="addr")
+
+            def recv(pkt, addr, *, allow_zero):
+                assert isinstance(pkt, FakeAck)
+                assert (pkt.source, pkt.sequence, pkt.serial) == (3, 4, "d073d5000001")
+
+            recv = pytest.helpers.AsyncMock(name="recv", side_effect=recv)
+
+            pkt = CoreMessages.Acknowledgement(source=3, sequence=4, target="d073d5000001")
+            V.communication.receiver.register(pkt, hp.create_future(), pkt)
+
+            with mock.patch.object(V.communication.receiver, "recv", recv):
+                await V.communication.received_data(pkt.pack().tobytes(), addr)
+
+            recv.assert_called_once_with(mock.ANY, addr, allow_zero=False)
+
+        async it "can give packets to results without a task", V:
+            addr = mock.Mock(name="addr")
+            result = hp.create_future()
+            result.add_packet = mock.Mock(name="add_packet")
+
+            pkt = DeviceMessages.StatePower(level=100, source=1, sequence=1, target="d073d5000001")
+            V.communication.receiver.register(pkt, result, pkt)
+
+            add = mock.Mock(name="add")
+            with mock.patch.object(V.communication.received_data_tasks, "add", add):
+                V.communication.received_data_now(pkt.pack().tobytes(), addr)
+
+            assert len(add.mock_calls) == 0
+            result.add_packet.assert_called_once_with(mock.ANY)
+            got = result.add_packet.mock_calls[0][1][0]
+            assert got | DeviceMessages.StatePower
+            assert got.level == 100
+            assert got.Information.remote_addr is addr
+
+        async it "uses a task for the message_catcher when receiving without a task", V:
+            addr = mock.Mock(name="addr")
+            caught = hp.create_future()
+
+            async def message_catcher(pkt):
+                caught.set_result(pkt)
+
+            V.communication.receiver.message_catcher = message_catcher
+
+            pkt = DeviceMessages.StatePower(level=100, source=1, sequence=1, target="d073d5000001")
+            V.communication.received_data_now(pkt.pack().tobytes(), addr)
+
+            got = await caught
+            assert got | DeviceMessages.StatePower
+            assert got.level == 100
+
         async it "ignores invalid data", V:
             allow_zero = mock.Mock(name="allow_zero")
             addr = mock.Mock(name="addr")
@@ -0,0 +1,105 @@
+# coding: spec
+
+from photons_transport.comms.pacing import DeviceWindows, DeviceWindow
+
+from unittest import mock
+import asyncio
+import time
+
+describe "DeviceWindows":
+    it "is made from options on the target":
+        target = mock.Mock(name="target", max_inflight_per_device=3, min_gap_per_device=0.1)
+        windows = DeviceWindows.from_target(target)
+        assert windows.inflight == 3
+        assert windows.gap == 0.1
+        assert windows.enabled
+
+        windows = DeviceWindows.from_target(mock.Mock(name="target", spec=[]))
+        assert windows.inflight is None
+        assert windows.gap == 0
+        assert not windows.enabled
+
+    it "has no windows if there are no limits":
+        assert DeviceWindows().window("d073d5000001") is None
+        assert DeviceWindows(inflight=0, gap=0).window("d073d5000001") is None
+
+    it "has a window per serial":
+        windows = DeviceWindows(inflight=2, gap=0.1)
+        w1 = windows.window("d073d5000001")
+        assert isinstance(w1, DeviceWindow)
+        assert (w1.inflight, w1.gap) == (2, 0.1)
+
+        assert windows.window("d073d5000001") is w1
+        assert windows.window("d073d5000002") is not w1
+
+    async it "paces writes to each device":
+        windows = DeviceWindows(gap=5)
+
+        await windows.pace("d073d5000001")
+        await windows.pace("d073d5000002")
+        await windows.pace(None)
+
+        assert windows.window("d073d5000001").next_send > time.time() + 4
+        assert windows.window("d073d5000002").next_send > time.time() + 4
+
+        # And does nothing without a gap
+        windows = DeviceWindows(inflight=1)
+        await windows.pace("d073d5000001")
+        assert windows.window("d073d5000001").next_send == 0
+
+describe "DeviceWindow":
+    async it "limits how many are inside at once":
+        window = DeviceWindow(2, 0)
+        inside = []
+        most = []
+
+        async def send(i):
+            async with window:
+                inside.append(i)
+                most.append(len(inside))
+                await asyncio.sleep(0.01)
+                inside.remove(i)
+
+        await asyncio.gather(*[send(i) for i in range(5)])
+        assert max(most) == 2
+
+    async it "spaces out writes":
+        window = DeviceWindow(0, 0.02)
+        written = []
+
+        async def write():
+            await window.pace()
+            written.append(time.time())
+
+        await asyncio.gather(*[write() for _ in range(4)])
+
+        gaps = [b - a for a, b in zip(written, written[1:])]
+        assert all(gap >= 0.015 for gap in gaps), gaps
+
+    async it "doesn't wait for the gap when entering":
+        window = DeviceWindow(1, 5)
+        await window.pace()
+
+        async with window:
+            pass
+
+        assert not window.semaphore.locked()
+
+    async it "lets the best priority in first":
+        window = DeviceWindow(1, 0)
+        entered = []
+
+        async def send(name, priority):
+            async with window.using(priority):
+                entered.append(name)
+
+        async with window:
+            ts = [
+                asyncio.get_event_loop().create_task(send("background", "background")),
+                asyncio.get_event_loop().create_task(send("normal", None)),
+                asyncio.get_event_loop().create_task(send("interactive", "interactive")),
+            ]
+            await asyncio.sleep(0)
+
+        await asyncio.gather(*ts)
+        assert entered == ["interactive", "normal", "background"]
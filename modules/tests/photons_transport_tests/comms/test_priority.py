@@ -0,0 +1,131 @@
+# coding: spec
+
+from photons_transport.comms.priority import (
+    PrioritySemaphore,
+    INTERACTIVE,
+    BACKGROUND,
+    NORMAL,
+    Lanes,
+    rank,
+)
+from photons_transport.errors import InvalidPriority
+
+from photons_app import helpers as hp
+
+from delfick_project.errors_pytest import assertRaises
+import asyncio
+
+describe "rank":
+    it "knows the rank of each priority":
+        assert rank("interactive") == INTERACTIVE
+        assert rank("normal") == NORMAL
+        assert rank(None) == NORMAL
+        assert rank("background") == BACKGROUND
+        assert INTERACTIVE < NORMAL < BACKGROUND
+
+    it "complains about unknown priorities":
+        with assertRaises(
+            InvalidPriority, got="urgent", available=["interactive", "normal", "background"]
+        ):
+            rank("urgent")
+
+describe "Lanes":
+    async it "makes background wait for interactive sends":
+        lanes = Lanes()
+        entered = []
+
+        async def send(name, priority):
+            async with lanes.lane(priority):
+                entered.append(name)
+                await asyncio.sleep(0.02)
+
+        interactive = hp.async_as_background(send("interactive", "interactive"))
+        await asyncio.sleep(0)
+        assert lanes.active == [1, 0, 0]
+
+        background = hp.async_as_background(send("background", "background"))
+        normal = hp.async_as_background(send("normal", "normal"))
+        await asyncio.sleep(0)
+        assert entered == ["interactive", "normal"]
+        assert lanes.active == [1, 1, 0]
+
+        await interactive
+        await asyncio.sleep(0)
+        assert entered == ["interactive", "normal", "background"]
+
+        await asyncio.gather(background, normal)
+        assert lanes.active == [0, 0, 0]
+        assert lanes.waiting == []
+
+    async it "doesn't make background wait if there are no interactive sends":
+        lanes = Lanes()
+        async with lanes.lane("background"):
+            async with lanes.lane("background"):
+                assert lanes.active == [0, 0, 2]
+
+describe "PrioritySemaphore":
+    async it "gives free slots to the best priority first":
+        semaphore = PrioritySemaphore(1)
+        got = []
+
+        async def use(name, priority):
+            await semaphore.acquire(priority)
+            got.append(name)
+            semaphore.release()
+
+        await semaphore.acquire()
+        assert semaphore.locked()
+
+        ts = [
+            hp.async_as_background(use("b1", "background")),
+            hp.async_as_background(use("n1", "normal")),
+            hp.async_as_background(use("i1", "interactive")),
+            hp.async_as_background(use("b2", "background")),
+            hp.async_as_background(use("i2", "interactive")),
+        ]
+        await asyncio.sleep(0)
+        assert got == []
+
+        semaphore.release()
+        await asyncio.gather(*ts)
+        assert got == ["i1", "i2", "n1", "b1", "b2"]
+        assert not semaphore.locked()
+
+    async it "skips waiters that were cancelled":
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire()
+
+        cancelled = hp.async_as_background(semaphore.acquire("interactive"))
+        waiting = hp.async_as_background(semaphore.acquire("background"))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.wait([cancelled])
+
+        semaphore.release()
+        assert await waiting is True
+        assert semaphore.locked()
+
+        semaphore.release()
+        assert not semaphore.locked()
+
+    async it "can be entered with a priority":
+        semaphore = PrioritySemaphore(1)
+        got = []
+
+        async def use(name, priority):
+            async with semaphore.using(priority):
+                got.append(name)
+
+        async with semaphore:
+            assert semaphore.locked()
+            ts = [
+                hp.async_as_background(use("b1", "background")),
+                hp.async_as_background(use("i1", "interactive")),
+            ]
+            await asyncio.sleep(0)
+            assert got == []
+
+        await asyncio.gather(*ts)
+        assert got == ["i1", "b1"]
+        assert not semaphore.locked()
@@ -67,6 +67,166 @@ describe "Receiver":
                 await asyncio.sleep(0)
                 assert V.receiver.results == {}
 
+            async it "counts collisions and keeps the newest result", V:
+                key = V.register(V.source, V.sequence, V.target)
+                assert V.receiver.collisions == 0
+
+                # Registering the same result again is not a collision
+                V.register(V.source, V.sequence, V.target)
+                assert V.receiver.collisions == 0
+
+                first = V.result
+                second = hp.create_future()
+                packet = LIFXPacket(source=V.source, sequence=V.sequence, target=V.target)
+                V.receiver.register(packet, second, V.original)
+                assert V.receiver.collisions == 1
+                assert V.receiver.results == {key: (V.original, second)}
+
+                # The first result being done doesn't forget the second one
+                first.set_result([])
+                await asyncio.sleep(0)
+                assert V.receiver.results == {key: (V.original, second)}
+
+                # And done results aren't collisions
+                second.cancel()
+                V.receiver.register(packet, hp.create_future(), V.original)
+                assert V.receiver.collisions == 1
+
+            async it "forgets targets that have no results", V:
+                V.register(V.source, V.sequence, V.target)
+                assert list(V.receiver.rings) == [(V.source, V.target)]
+
+                V.result.set_result([])
+                assert V.receiver.find(V.source, V.sequence, V.target) is None
+                assert V.receiver.rings == {}
+
+            async it "keeps results with the same sequence and target but different sources", V:
+                first = V.result
+                second = hp.create_future()
+
+                V.register(V.source, V.sequence, V.target)
+                packet = LIFXPacket(source=V.source + 1, sequence=V.sequence, target=V.target)
+                V.receiver.register(packet, second, V.original)
+                assert V.receiver.collisions == 0
+
+                assert V.receiver.results == {
+                    (V.source, V.sequence, V.target): (V.original, first),
+                    (V.source + 1, V.sequence, V.target): (V.original, second),
+                }
+                assert V.receiver.find(V.source, V.sequence, V.target)[2] is first
+                assert V.receiver.find(V.source + 1, V.sequence, V.target)[2] is second
+
+            async it "only expires results that are done with a timing wheel", V:
+                V.receiver.wheel = [[] for _ in range(4)]
+
+                def turn(times):
+                    for _ in range(times):
+                        if V.receiver.wheel_handle is not None:
+                            V.receiver.wheel_handle.cancel()
+                        V.receiver.turn_wheel()
+
+                V.register(V.source, V.sequence, V.target)
+                entry = V.receiver.find(V.source, V.sequence, V.target)
+                assert V.receiver.wheel_handle is not None
+
+                # Results that aren't done stay on the wheel
+                turn(3)
+                assert V.receiver.find(V.source, V.sequence, V.target) is entry
+                assert V.receiver.wheel_handle is not None
+                turn(8)
+                assert V.receiver.find(V.source, V.sequence, V.target) is entry
+
+                # Until they are done
+                V.result.set_result([])
+                turn(4)
+                assert V.receiver.rings == {}
+
+                # And the wheel stops turning when there is nothing on it
+                assert V.receiver.wheel_handle is None
+
+        describe "expects":
+            async it "says yes if we have a result for the key or the broadcast key", V:
+                assert not V.receiver.expects(V.source, V.sequence, V.target)
+
+                V.register(V.source, V.sequence, V.target)
+                assert V.receiver.expects(V.source, V.sequence, V.target)
+                assert not V.receiver.expects(V.source, V.sequence + 1, V.target)
+
+                other = binascii.unhexlify("d073d50000010000")
+                assert not V.receiver.expects(V.source, V.sequence, other)
+                V.register(V.source, V.sequence, V.receiver.blank_target)
+                assert V.receiver.expects(V.source, V.sequence, other)
+
+            async it "says yes to everything if we have a message_catcher", V:
+                V.receiver.message_catcher = pytest.helpers.AsyncMock(name="message_catcher")
+                assert V.receiver.expects(V.source, V.sequence, V.target)
+
+            async it "says no to zero source and sequence unless allowed", V:
+                V.register(0, 0, V.target)
+                assert not V.receiver.expects(0, 0, V.target)
+                assert V.receiver.expects(0, 0, V.target, allow_zero=True)
+
+        describe "resolve":
+            async it "gives the packet to the result and says if it did", V:
+                assert not V.receiver.resolve(V.packet, V.addr)
+                assert len(V.result.add_packet.mock_calls) == 0
+
+                V.register(V.source, V.sequence, V.receiver.blank_target)
+                assert V.receiver.resolve(V.packet, V.addr)
+                V.result.add_packet.assert_called_once_with(V.packet)
+
+                assert V.packet.Information.remote_addr is V.addr
+                assert V.packet.Information.sender_message is V.original
+
+            async it "frees the slot as soon as the result is done", V:
+                V.register(V.source, V.sequence, V.target)
+                V.result.add_packet.side_effect = lambda pkt: V.result.set_result([pkt])
+
+                V.receiver.wheel_handle.cancel()
+                assert V.receiver.resolve(V.packet, V.addr)
+                assert V.receiver.rings == {}
+
+            async it "doesn't use the message_catcher", V:
+                message_catcher = pytest.helpers.AsyncMock(name="message_catcher")
+                V.receiver.message_catcher = message_catcher
+                assert not V.receiver.resolve(V.packet, V.addr)
+                assert len(message_catcher.mock_calls) == 0
+
+            async it "gives replies to watchers", V:
+                got = []
+                watcher = got.append
+                V.receiver.add_watcher(watcher)
+
+                assert not V.receiver.resolve(V.packet, V.addr)
+                assert got == []
+
+                V.register(V.source, V.sequence, V.target)
+                assert V.receiver.resolve(V.packet, V.addr)
+                assert got == [V.packet]
+
+                V.receiver.remove_watcher(watcher)
+                V.receiver.remove_watcher(watcher)
+                assert V.receiver.resolve(V.packet, V.addr)
+                assert got == [V.packet]
+
+            async it "doesn't give acks to watchers and keeps going if a watcher fails", V:
+                got = []
+                V.receiver.add_watcher(mock.Mock(name="watcher", side_effect=ValueError("NOPE")))
+                V.receiver.add_watcher(got.append)
+
+                ack = mock.Mock(
+                    name="ack",
+                    source=V.source,
+                    sequence=V.sequence,
+                    target=V.target,
+                    represents_ack=True,
+                )
+
+                V.register(V.source, V.sequence, V.target)
+                assert V.receiver.resolve(ack, V.addr)
+                assert V.receiver.resolve(V.packet, V.addr)
+                assert got == [V.packet]
+
         describe "recv":
             async it "finds result based on source, sequence, target", V:
                 V.register(V.source, V.sequence, V.target)
@@ -0,0 +1,120 @@
+# coding: spec
+
+from photons_transport.comms.reply_cache import ReplyCache, DEFAULT_TTLS
+
+from photons_messages import DeviceMessages, LightMessages, MultiZoneMessages
+
+from unittest import mock
+import pytest
+
+
+@pytest.fixture()
+def reply():
+    return DeviceMessages.StateLabel(label="kitchen")
+
+
+describe "ReplyCache":
+    it "has default ttls":
+        cache = ReplyCache()
+        assert cache.ttls == DEFAULT_TTLS
+        assert cache.ttls["GetVersion"] is None
+        assert cache.ttls["GetLabel"] == 300
+
+        cache = ReplyCache({"GetPower": 2})
+        assert cache.ttls == {"GetPower": 2}
+
+    it "remembers replies for messages it has a ttl for", reply:
+        cache = ReplyCache()
+
+        assert cache.get(DeviceMessages.GetLabel(), "d073d5000001") is None
+        assert cache.misses == 1
+
+        with mock.patch("time.time", lambda: 10):
+            cache.add(DeviceMessages.GetLabel(), "d073d5000001", [reply])
+
+        with mock.patch("time.time", lambda: 309):
+            got = cache.get(DeviceMessages.GetLabel(), "d073d5000001")
+            assert got == [reply]
+            assert got[0] is reply
+            assert cache.hits == 1
+
+            assert cache.get(DeviceMessages.GetLabel(), "d073d5000002") is None
+            assert cache.misses == 2
+
+        with mock.patch("time.time", lambda: 310):
+            assert cache.get(DeviceMessages.GetLabel(), "d073d5000001") is None
+            assert cache.misses == 3
+
+        assert cache.entries == {"d073d5000001": {}}
+
+    it "remembers replies without a ttl forever", reply:
+        cache = ReplyCache()
+        version = DeviceMessages.StateVersion(vendor=1, product=55)
+
+        with mock.patch("time.time", lambda: 10):
+            cache.add(DeviceMessages.GetVersion(), "d073d5000001", [version])
+
+        with mock.patch("time.time", lambda: 10000000):
+            assert cache.get(DeviceMessages.GetVersion(), "d073d5000001") == [version]
+
+    it "ignores messages it doesn't have a ttl for and empty replies", reply:
+        cache = ReplyCache()
+
+        cache.add(DeviceMessages.GetPower(), "d073d5000001", [DeviceMessages.StatePower()])
+        cache.add(DeviceMessages.GetLabel(), "d073d5000001", [])
+        assert cache.entries == {}
+
+        assert cache.get(DeviceMessages.GetPower(), "d073d5000001") is None
+        assert cache.hits == 0
+        assert cache.misses == 0
+
+    it "uses the payload of the message in the key":
+        cache = ReplyCache({"GetColorZones": None})
+
+        first = MultiZoneMessages.GetColorZones(start_index=0, end_index=7)
+        second = MultiZoneMessages.GetColorZones(start_index=8, end_index=15)
+
+        cache.add(first, "d073d5000001", [mock.sentinel.first])
+        assert cache.get(first, "d073d5000001") == [mock.sentinel.first]
+        assert cache.get(second, "d073d5000001") is None
+
+    it "forgets replies when the matching Set message is sent", reply:
+        cache = ReplyCache()
+        group = DeviceMessages.StateGroup(label="g")
+
+        for serial in ("d073d5000001", "d073d5000002"):
+            cache.add(DeviceMessages.GetLabel(), serial, [reply])
+            cache.add(DeviceMessages.GetGroup(), serial, [group])
+
+        cache.add(DeviceMessages.SetLabel(label="other"), "d073d5000001", [])
+        assert cache.get(DeviceMessages.GetLabel(), "d073d5000001") == [reply]
+
+        cache.forget_changes(DeviceMessages.SetLabel(label="other"), "d073d5000001")
+        cache.forget_changes(LightMessages.SetColor(), "d073d5000001")
+        cache.forget_changes(DeviceMessages.GetGroup(), "d073d5000001")
+
+        assert cache.get(DeviceMessages.GetLabel(), "d073d5000001") is None
+        assert cache.get(DeviceMessages.GetGroup(), "d073d5000001") == [group]
+        assert cache.get(DeviceMessages.GetLabel(), "d073d5000002") == [reply]
+
+        cache.invalidate("d073d5000001", "GetGroup")
+        assert "d073d5000001" not in cache.entries
+
+        cache.invalidate("d073d5000002")
+        assert cache.entries == {}
+
+    it "forgets replies for every device when there is no serial", reply:
+        cache = ReplyCache()
+        group = DeviceMessages.StateGroup(label="g")
+
+        for serial in ("d073d5000001", "d073d5000002"):
+            cache.add(DeviceMessages.GetLabel(), serial, [reply])
+            cache.add(DeviceMessages.GetGroup(), serial, [group])
+
+        cache.forget_changes(DeviceMessages.SetLabel(label="other"), None)
+        for serial in ("d073d5000001", "d073d5000002"):
+            assert cache.get(DeviceMessages.GetLabel(), serial) is None
+            assert cache.get(DeviceMessages.GetGroup(), serial) == [group]
+
+        cache.invalidate(None)
+        assert cache.entries == {}
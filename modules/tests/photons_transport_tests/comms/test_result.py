@@ -81,6 +81,42 @@ describe "Result":
 
             return V()
 
+        async it "records the time until the first reply with the retry options", V:
+            record_rtt = mock.Mock(name="record_rtt")
+            V.result.sent_at = time.time() - 0.2
+
+            add_result = mock.Mock(name="add_result")
+
+            with mock.patch.object(
+                V.result.retry_options, "record_rtt", record_rtt
+            ), mock.patch.object(V.result, "add_result", add_result):
+                V.pkt.represents_ack = True
+                V.result.add_packet(V.pkt)
+                V.pkt.represents_ack = False
+                V.result.add_packet(V.pkt)
+
+            record_rtt.assert_called_once_with(mock.ANY)
+            assert record_rtt.mock_calls[0][1][0] == pytest.approx(0.2, abs=0.1)
+
+        async it "doesn't record a round trip time if the request wasn't sent", V:
+            record_rtt = mock.Mock(name="record_rtt")
+
+            with mock.patch.object(V.result.retry_options, "record_rtt", record_rtt):
+                V.pkt.represents_ack = True
+                V.result.add_packet(V.pkt)
+
+            assert len(record_rtt.mock_calls) == 0
+
+        async it "doesn't record a round trip time for broadcasts", V:
+            record_rtt = mock.Mock(name="record_rtt")
+            result = Result(V.request, True, RetryOptions())
+
+            with mock.patch.object(result.retry_options, "record_rtt", record_rtt):
+                V.pkt.represents_ack = True
+                result.add_packet(V.pkt)
+
+            assert len(record_rtt.mock_calls) == 0
+
         async it "adds as an ack if the packet is an ack", V:
             add_ack = mock.Mock(name="add_ack")
             add_result = mock.Mock(name="add_result")
@@ -15,11 +15,16 @@ from photons_messages import (
     protocol_register,
 )
 from photons_transport.session.memory import MemoryRetryOptions
+from photons_transport.comms.reply_cache import ReplyCache
+from photons_transport.comms.template import PacketTemplate
+from photons_transport.comms.pacing import DeviceWindows
+from photons_transport.errors import FailedToFindDevice
 from photons_control import test_helpers as chp
 from photons_products import Products
 
 from delfick_project.errors_pytest import assertRaises
 from unittest import mock
+import asyncio
 import pytest
 import time
 
@@ -157,6 +162,15 @@ describe "Sending a single messages":
             )
             device.compare_received([DiscoveryMessages.GetService()], keep_duplicates=True)
 
+        async it "doesn't unpack templated packets", sender, device:
+            original = DeviceMessages.EchoRequest(echoing=b"hi")
+            template = PacketTemplate.from_packet(original.simplify())
+            packet = template.make("d073d5001337", 2, 1)
+
+            result = await sender.send_single(original, packet, timeout=1)
+            assertSamePackets(result, (DeviceMessages.EchoResponse, {"echoing": b"hi"}))
+            assert packet._unpacked is None
+
     describe "timeouts":
         async it "can retry until it gets a timeout", send_single, sender, device, FakeTime, MockedCallLater:
             original = DeviceMessages.EchoRequest(echoing=b"hi")
@@ -213,6 +227,22 @@ describe "Sending a single messages":
                 ],
             )
 
+        async it "spaces out retries to the same device", send_single, sender, device, FakeTime, MockedCallLater:
+            original = DeviceMessages.EchoRequest(echoing=b"hi")
+            sender.device_windows = DeviceWindows(gap=0.3)
+
+            with FakeTime() as t:
+                async with MockedCallLater(t):
+                    with assertRaises(TimedOut, "Waiting for reply to a packet"):
+                        with device.offline():
+                            await send_single(original, timeout=1)
+
+            times = [received[0] for received in sender.received]
+            assert len(times) > 1
+            assert times[0] == 0
+            gaps = [round(b - a, 3) for a, b in zip(times, times[1:])]
+            assert all(gap >= 0.3 for gap in gaps), gaps
+
         async it "can give up on getting multiple messages that have a set length", send_single, sender, device, FakeTime, MockedCallLater:
             original = MultiZoneMessages.GetColorZones(start_index=0, end_index=255)
 
@@ -460,3 +490,222 @@ describe "Sending a single messages":
             )
 
             assertSent(sender, (0, device.serial, original.Payload.__name__, original.payload))
+
+    describe "sharing sends":
+
+        @pytest.fixture()
+        def send_many(self, sender):
+            async def send_many(*originals, **kwargs):
+                ts = []
+                for sequence, original in enumerate(originals, start=1):
+                    packet = original.clone()
+                    packet.update(target="d073d5001337", sequence=sequence, source=2)
+                    ts.append(
+                        hp.async_as_background(
+                            sender.send_single(original, packet.simplify(), **kwargs)
+                        )
+                    )
+                return await asyncio.gather(*ts)
+
+            return send_many
+
+        async it "shares a send between identical get messages", send_many, sender, device:
+            results = await send_many(
+                DeviceMessages.GetPower(),
+                DeviceMessages.GetPower(),
+                DeviceMessages.GetLabel(),
+                timeout=1,
+            )
+
+            assertSamePackets(results[0], DeviceMessages.StatePower)
+            assertSamePackets(results[1], DeviceMessages.StatePower)
+            assertSamePackets(results[2], DeviceMessages.StateLabel)
+            assert results[0] is not results[1]
+            assert results[0][0] is results[1][0]
+
+            device.compare_received(
+                [DeviceMessages.GetPower(), DeviceMessages.GetLabel()], keep_duplicates=True
+            )
+            assert sender.single_flight.coalesced == 1
+            assert sender.single_flight.in_flight == {}
+
+        async it "doesn't share sends with different payloads or for set messages", send_many, sender, device:
+            await send_many(
+                MultiZoneMessages.GetColorZones(start_index=0, end_index=7),
+                MultiZoneMessages.GetColorZones(start_index=8, end_index=15),
+                DeviceMessages.SetLabel(label="one"),
+                DeviceMessages.SetLabel(label="one"),
+                DeviceMessages.EchoRequest(echoing=b"hi"),
+                DeviceMessages.EchoRequest(echoing=b"hi"),
+                timeout=1,
+            )
+
+            device.compare_received(
+                [
+                    MultiZoneMessages.GetColorZones(start_index=0, end_index=7),
+                    MultiZoneMessages.GetColorZones(start_index=8, end_index=15),
+                    DeviceMessages.SetLabel(label="one"),
+                    DeviceMessages.SetLabel(label="one"),
+                    DeviceMessages.EchoRequest(echoing=b"hi"),
+                    DeviceMessages.EchoRequest(echoing=b"hi"),
+                ],
+                keep_duplicates=True,
+            )
+            assert sender.single_flight.coalesced == 0
+
+        async it "gives the error to everything waiting", send_many, sender, device, FakeTime, MockedCallLater:
+            with FakeTime() as t:
+                async with MockedCallLater(t):
+                    with device.offline():
+                        ts = [
+                            hp.async_as_background(send_many(DeviceMessages.GetPower(), timeout=1)),
+                            hp.async_as_background(send_many(DeviceMessages.GetPower(), timeout=1)),
+                        ]
+                        await hp.wait_for_all_futures(*ts)
+
+            for t in ts:
+                with assertRaises(TimedOut, "Waiting for reply to a packet", sent_pkt_type=20):
+                    await t
+            assert sender.single_flight.coalesced == 1
+
+        async it "sends again if the shared send is cancelled", send_many, sender, device:
+
+            async def intercept(pkt, source):
+                if not first.cancelled():
+                    return False
+
+            device.set_intercept_got_message(intercept)
+
+            packet = DeviceMessages.GetPower(target="d073d5001337", sequence=1, source=2)
+            first = hp.async_as_background(
+                sender.send_single(DeviceMessages.GetPower(), packet.simplify(), timeout=1)
+            )
+            await asyncio.sleep(0)
+
+            second = hp.async_as_background(send_many(DeviceMessages.GetPower(), timeout=1))
+            await asyncio.sleep(0.05)
+            assert sender.single_flight.coalesced == 1
+            first.cancel()
+
+            assertSamePackets((await second)[0], DeviceMessages.StatePower)
+            assert first.cancelled()
+            assert sender.single_flight.coalesced == 1
+
+    describe "reply cache":
+        async it "doesn't have a reply cache by default", sender:
+            assert sender.reply_cache is None
+
+        async it "can give replies from the reply cache", send_single, sender, device:
+            sender.reply_cache = ReplyCache()
+
+            first = await send_single(DeviceMessages.GetLabel(), timeout=1)
+            second = await send_single(DeviceMessages.GetLabel(), timeout=1)
+            assertSamePackets(first, DeviceMessages.StateLabel)
+            assert second == first
+            assert sender.reply_cache.hits == 1
+
+            await send_single(DeviceMessages.GetLabel(), timeout=1, use_reply_cache=False)
+            await send_single(DeviceMessages.GetPower(), timeout=1)
+            await send_single(DeviceMessages.GetPower(), timeout=1)
+
+            device.compare_received(
+                [
+                    DeviceMessages.GetLabel(),
+                    DeviceMessages.GetLabel(),
+                    DeviceMessages.GetPower(),
+                    DeviceMessages.GetPower(),
+                ],
+                keep_duplicates=True,
+            )
+
+        async it "forgets replies when the Set message is acknowledged", send_single, sender, device:
+            sender.reply_cache = ReplyCache()
+
+            await send_single(DeviceMessages.GetLabel(), timeout=1)
+            await send_single(DeviceMessages.SetLabel(label="other"), timeout=1)
+            got = await send_single(DeviceMessages.GetLabel(), timeout=1)
+
+            assert got[0].label == "other"
+            assert sender.reply_cache.hits == 0
+
+        async it "forgets replies for Set messages that don't use the cache", send_single, sender, device:
+            sender.reply_cache = ReplyCache()
+
+            await send_single(DeviceMessages.GetLabel(), timeout=1)
+            await send_single(
+                DeviceMessages.SetLabel(label="other"), timeout=1, use_reply_cache=False
+            )
+            got = await send_single(DeviceMessages.GetLabel(), timeout=1)
+            assert got[0].label == "other"
+
+            assert list(sender.reply_cache.entries) == ["d073d5001337"]
+
+            async def broadcast(original, packet, **kwargs):
+                assert kwargs["broadcast"] is True
+                return []
+
+            msg = DeviceMessages.SetLabel(label="again")
+            packet = msg.clone()
+            packet.update(target=None, sequence=2, source=2)
+            with mock.patch.object(sender, "_send_single", broadcast):
+                await sender.send_single(msg, packet, timeout=1, broadcast=True)
+
+            assert sender.reply_cache.entries == {}
+            assert sender.reply_cache.hits == 0
+
+        async it "forgets replies before the Set message is sent", send_single, sender, device:
+            sender.reply_cache = ReplyCache()
+            await send_single(DeviceMessages.GetLabel(), timeout=1)
+
+            got = []
+            _send_single = sender._send_single
+
+            async def send(original, packet, **kwargs):
+                got.append(sender.reply_cache.get(DeviceMessages.GetLabel(), "d073d5001337"))
+                return await _send_single(original, packet, **kwargs)
+
+            with mock.patch.object(sender, "_send_single", send):
+                await send_single(DeviceMessages.SetLabel(label="other"), timeout=1)
+
+            assert got == [None]
+            assert sender.reply_cache.hits == 0
+
+        async it "is made from the target", _setup:
+            target, _ = _setup
+            target.reply_cache = True
+            async with target.session() as sender:
+                assert isinstance(sender.reply_cache, ReplyCache)
+
+    describe "without replies":
+        async it "writes messages that don't want a reply without a writer", send_single, sender, device:
+            original = DeviceMessages.SetPower(level=65535, ack_required=False, res_required=False)
+
+            with mock.patch("photons_transport.comms.base.Writer", mock.NonCallableMock()):
+                result = await send_single(original, timeout=1)
+
+            assert result == []
+            assert sender.receiver.results == {}
+
+            while not device.received:
+                await asyncio.sleep(0)
+
+            device.compare_received([DeviceMessages.SetPower(level=65535)])
+            assert device.attrs.power == 65535
+
+        async it "can be used directly", sender, device:
+            packet = DeviceMessages.SetLabel(
+                label="hello", target=device.serial, source=2, sequence=1, ack_required=True
+            )
+
+            assert await sender.send_no_reply(packet, packet) == []
+
+            while not device.received:
+                await asyncio.sleep(0)
+
+            device.compare_received([DeviceMessages.SetLabel(label="hello")])
+            assert sender.receiver.results == {}
+
+        async it "complains if it can't find the device", sender:
+            packet = DeviceMessages.SetPower(level=0, target="d073d5000099", source=2, sequence=1)
+            with assertRaises(FailedToFindDevice, serial="d073d5000099"):
+                await sender.send_no_reply(packet, packet)
@@ -0,0 +1,104 @@
+# coding: spec
+
+from photons_transport.comms.template import PacketTemplate, TemplatedPacket
+
+from photons_messages import LightMessages, DeviceMessages, Waveform
+
+from unittest import mock
+import pytest
+
+
+def normal(packet, serial, source, sequence):
+    clone = packet.clone()
+    clone.update(dict(target=serial, source=source, sequence=sequence))
+    return clone
+
+
+describe "PacketTemplate":
+
+    @pytest.fixture()
+    def messages(self):
+        return [
+            LightMessages.SetWaveformOptional(
+                transient=1,
+                hue=100,
+                brightness=0.5,
+                cycles=2,
+                period=1,
+                skew_ratio=0.2,
+                waveform=Waveform.SINE,
+                set_hue=1,
+                set_saturation=0,
+                set_brightness=1,
+                set_kelvin=0,
+            ),
+            DeviceMessages.SetLabel(label="kitchen", ack_required=False),
+            DeviceMessages.GetPower(),
+        ]
+
+    it "makes the same bytes as updating a clone", messages:
+        for msg in messages:
+            simple = msg.simplify()
+            template = PacketTemplate.from_packet(simple)
+            assert template is not None
+
+            for serial, source, sequence in [
+                ("d073d5000001", 1, 2),
+                ("d073d5001337", 4294967295, 255),
+            ]:
+                pkt = template.make(serial, source, sequence)
+                expected = normal(simple, serial, source, sequence)
+
+                assert pkt.tobytes() == expected.tobytes(serial)
+                assert pkt.serial == expected.serial == serial
+                assert pkt.target == expected.target
+                assert pkt.source == source
+                assert pkt.sequence == sequence
+                assert pkt.pkt_type == expected.pkt_type
+                assert pkt.tagged is expected.tagged is False
+                assert pkt.protocol == 1024
+                assert pkt.res_required == expected.res_required
+                assert pkt.ack_required == expected.ack_required
+                assert pkt.payload == expected.payload
+                assert pkt | type(msg)
+                assert not pkt | DeviceMessages.EchoRequest
+                assert pkt.unpacked.pack() == expected.pack()
+
+    it "only packs the message once":
+        simple = DeviceMessages.SetPower(level=65535).simplify()
+        template = PacketTemplate.from_packet(simple)
+
+        with mock.patch.object(type(simple), "tobytes") as tobytes:
+            pkts = [template.make(f"d073d500000{i}", 2, i) for i in range(5)]
+            assert [p.serial for p in pkts] == [f"d073d500000{i}" for i in range(5)]
+            assert [p.tobytes()[23] for p in pkts] == list(range(5))
+
+        assert len(tobytes.mock_calls) == 0
+
+    it "doesn't make templates for packets it can't represent":
+        assert PacketTemplate.from_packet(mock.Mock(name="packet")) is None
+
+        dynamic = DeviceMessages.SetLabel(label=lambda pkt, serial: serial)
+        assert PacketTemplate.from_packet(dynamic) is None
+
+        bad = DeviceMessages.SetPower(level=0).simplify()
+        bad.pkt_type = 9000000
+        assert PacketTemplate.from_packet(bad) is None
+
+describe "TemplatedPacket":
+    it "can change sequence on a clone without changing the original":
+        simple = DeviceMessages.GetPower().simplify()
+        pkt = PacketTemplate.from_packet(simple).make("d073d5000001", 1, 2)
+
+        clone = pkt.clone()
+        assert isinstance(clone, TemplatedPacket)
+        assert clone == pkt
+
+        clone.sequence = 3
+        assert clone.sequence == 3
+        assert pkt.sequence == 2
+        assert clone != pkt
+
+        assert clone.unpacked.sequence == 3
+        assert clone.actual("sequence") == 3
+        assert clone.actual("res_required") is True
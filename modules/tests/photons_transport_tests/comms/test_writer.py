@@ -5,6 +5,7 @@ from photons_transport.comms.writer import Writer
 from photons_app import helpers as hp
 
 from unittest import mock
+import asyncio
 import pytest
 
 describe "Writer":
@@ -73,6 +74,27 @@ describe "Writer":
         modify_sequence.assert_called_once_with()
         register.assert_called_once_with()
         write.assert_called_once_with()
+        result.mark_sent.assert_called_once_with()
+
+    async it "doesn't include waiting for the device window in the round trip time", V:
+        V.did_broadcast = False
+        V.writer.clone.tobytes.return_value = b"bts"
+
+        async def pace(serial):
+            await asyncio.sleep(0.3)
+
+        V.session.device_windows.pace = pace
+        V.transport.spawn = pytest.helpers.AsyncMock(name="spawn")
+        V.transport.write = pytest.helpers.AsyncMock(name="write")
+
+        result = await V.writer()
+        assert V.receiver.register.mock_calls == [mock.call(V.writer.clone, result, V.original)]
+
+        pkt = mock.NonCallableMock(name="pkt", represents_ack=True, spec=["represents_ack"])
+        result.add_packet(pkt)
+
+        V.retry_options.record_rtt.assert_called_once_with(mock.ANY)
+        assert V.retry_options.record_rtt.mock_calls[0][1][0] < 0.1
 
     describe "modify_sequence":
         async it "modifies sequence after first modify_sequence", V:
@@ -138,3 +160,26 @@ describe "Writer":
 
             V.transport.spawn.assert_called_once_with(V.original, timeout=V.connect_timeout)
             V.transport.write.assert_called_once_with(t, bts, V.original)
+
+        async it "waits for the device window before writing", V:
+            V.did_broadcast = False
+            V.writer.clone.tobytes.return_value = b"bts"
+
+            called = []
+            t = mock.Mock(name="t")
+
+            async def pace(serial):
+                called.append(("pace", serial))
+
+            async def write(*args):
+                called.append(("write", args))
+
+            V.session.device_windows.pace = pace
+            V.transport.spawn = pytest.helpers.AsyncMock(name="spawn", return_value=t)
+            V.transport.write = write
+
+            assert await V.writer.write() == b"bts"
+            assert called == [
+                ("pace", V.writer.clone.serial),
+                ("write", (t, b"bts", V.original)),
+            ]
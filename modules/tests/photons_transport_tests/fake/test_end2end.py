@@ -1,5 +1,6 @@
 # coding: spec
 
+from photons_transport.session.sharded import ShardedNetworkSession, shard_index
 from photons_transport.targets import MemoryTarget, LanTarget
 from photons_transport.fake import FakeDevice
 
@@ -8,6 +9,9 @@ from photons_app import helpers as hp
 from photons_messages import DiscoveryMessages, Services, DeviceMessages, protocol_register
 
 from collections import defaultdict
+from unittest import mock
+import json
+import time
 
 
 describe "Fake device":
@@ -45,6 +49,171 @@ describe "Fake device":
 
             assert dict(got) == {"d073d5000001": [{"echoing": b"hi" + b"\x00" * 62}]}
 
+    async it "works with a shared socket":
+        device = FakeDevice("d073d5000001", [], use_sockets=True)
+
+        options = {"final_future": hp.create_future(), "protocol_register": protocol_register}
+        await device.start()
+        device_port = device.services[0].state_service.port
+
+        try:
+            lantarget = LanTarget.create(options, {"shared_socket": True})
+            async with lantarget.session() as sender:
+                await sender.add_service(
+                    device.serial, Services.UDP, host="127.0.0.1", port=device_port
+                )
+
+                msgs = [
+                    DeviceMessages.EchoRequest(echoing=b"hi"),
+                    DeviceMessages.EchoRequest(echoing=b"there"),
+                ]
+
+                got = defaultdict(list)
+                async for pkt in sender(msgs, device.serial):
+                    got[pkt.serial].append(pkt.payload.as_dict())
+
+                assert dict(got) == {
+                    "d073d5000001": [
+                        {"echoing": b"hi" + b"\x00" * 62},
+                        {"echoing": b"there" + b"\x00" * 59},
+                    ]
+                }
+
+                sock = sender.udp_engine.sock
+                assert sock is not None
+                assert all(
+                    t.transport.result() is sock for t in sender.found[device.serial].values()
+                )
+
+            assert sender.udp_engine.sock is None
+        finally:
+            await device.finish()
+
+    async it "can find devices from a discovery cache", tmp_path:
+        device = FakeDevice("d073d5000001", [], use_sockets=True)
+
+        options = {"final_future": hp.create_future(), "protocol_register": protocol_register}
+        await device.start()
+        device_port = device.services[0].state_service.port
+
+        path = tmp_path / "cache.json"
+        udp = {"UDP": {"host": "127.0.0.1", "port": device_port}}
+        last_seen = time.time() - 100
+        path.write_text(
+            json.dumps(
+                {
+                    "d073d5000001": {"services": udp, "last_seen": last_seen},
+                    "d073d5000002": {"services": udp, "last_seen": last_seen},
+                }
+            )
+        )
+
+        async def broadcast_search(*args, **kwargs):
+            assert False, "Shouldn't broadcast"
+
+        try:
+            lantarget = LanTarget.create(options, {"discovery_options": {"cache_file": str(path)}})
+            async with lantarget.session() as sender:
+                sender.discovery_cache_check_timeout = 0.1
+
+                with mock.patch.object(sender, "_broadcast_search", broadcast_search):
+                    msg = DeviceMessages.EchoRequest(echoing=b"hi")
+
+                    got = defaultdict(list)
+                    async for pkt in sender(msg, device.serial):
+                        got[pkt.serial].append(pkt.payload.as_dict())
+
+                    assert dict(got) == {"d073d5000001": [{"echoing": b"hi" + b"\x00" * 62}]}
+
+                    await sender.discovery_cache_tasks.finish()
+
+                # The device that didn't reply is forgotten
+                assert sender.found.serials == ["d073d5000001"]
+
+            cache = json.loads(path.read_text())
+            assert list(cache) == ["d073d5000001"]
+            assert cache["d073d5000001"]["services"] == udp
+            assert cache["d073d5000001"]["last_seen"] > last_seen
+        finally:
+            await device.finish()
+
+    async it "can find known devices without broadcasting":
+        device = FakeDevice("d073d5000001", [], use_sockets=True)
+
+        options = {"final_future": hp.create_future(), "protocol_register": protocol_register}
+        await device.start()
+        device_port = device.services[0].state_service.port
+
+        async def broadcast_search(serials, timeout, **kwargs):
+            assert serials == ["d073d5000002"]
+            return []
+
+        try:
+            lantarget = LanTarget.create(options, {"targeted_discovery": True})
+            async with lantarget.session() as sender:
+                await sender.add_service(
+                    device.serial, Services.UDP, host="127.0.0.1", port=device_port
+                )
+
+                with mock.patch.object(sender, "_broadcast_search", broadcast_search):
+                    found, missing = await sender.find_specific_serials(
+                        [device.serial, "d073d5000002"]
+                    )
+
+                assert found.serials == [device.serial]
+                assert missing == ["d073d5000002"]
+        finally:
+            await device.finish()
+
+    async it "works with shards":
+        device1 = FakeDevice("d073d5000001", [], use_sockets=True)
+        device2 = FakeDevice("d073d5000002", [], use_sockets=True)
+
+        options = {"final_future": hp.create_future(), "protocol_register": protocol_register}
+        await device1.start()
+        await device2.start()
+
+        try:
+            lantarget = LanTarget.create(options, {"shards": 2})
+            async with lantarget.session() as sender:
+                assert isinstance(sender, ShardedNetworkSession)
+
+                for device in (device1, device2):
+                    await sender.add_service(
+                        device.serial,
+                        Services.UDP,
+                        host="127.0.0.1",
+                        port=device.services[0].state_service.port,
+                    )
+
+                assert shard_index(device1.serial, 2) == 1
+                assert shard_index(device2.serial, 2) == 0
+
+                seen = []
+                sender.receiver.add_watcher(lambda pkt: seen.append(pkt.serial))
+
+                msg = DeviceMessages.EchoRequest(echoing=b"hi")
+
+                got = defaultdict(list)
+                async for pkt in sender(msg, [device1.serial, device2.serial]):
+                    assert pkt.Information.sender_message is not None
+                    got[pkt.serial].append(pkt.payload.as_dict())
+
+                assert dict(got) == {
+                    "d073d5000001": [{"echoing": b"hi" + b"\x00" * 62}],
+                    "d073d5000002": [{"echoing": b"hi" + b"\x00" * 62}],
+                }
+                assert sorted(seen) == ["d073d5000001", "d073d5000002"]
+                assert sorted(sender.shards) == [0, 1]
+
+                processes = [shard.process for shard in sender.shards.values()]
+                assert all(process.is_alive() for process in processes)
+
+            assert not any(process.is_alive() for process in processes)
+        finally:
+            await device1.finish()
+            await device2.finish()
+
     async it "works without sockets":
         device = FakeDevice("d073d5000001", [], use_sockets=False)
 
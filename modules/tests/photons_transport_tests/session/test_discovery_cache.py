@@ -0,0 +1,112 @@
+# coding: spec
+
+from photons_transport.session.discovery_cache import DiscoveryCache
+
+from photons_messages import Services
+
+from unittest import mock
+import json
+import time
+import os
+
+describe "DiscoveryCache":
+    it "is empty if there is no file", tmp_path:
+        cache = DiscoveryCache(str(tmp_path / "cache.json"))
+        assert cache.devices == {}
+        assert cache.fresh() == {}
+
+    it "ignores files and entries that aren't valid", tmp_path:
+        path = tmp_path / "cache.json"
+
+        path.write_text("{nope")
+        assert DiscoveryCache(str(path)).devices == {}
+
+        path.write_text("[]")
+        assert DiscoveryCache(str(path)).devices == {}
+
+        path.write_text(
+            json.dumps(
+                {
+                    "d073d5000001": {
+                        "services": {"UDP": {"host": "192.168.0.1", "port": 56700}},
+                        "last_seen": 20,
+                    },
+                    "d073d5000002": {"services": {"UDP": {"host": "192.168.0.2"}}},
+                    "d073d5000003": "nope",
+                }
+            )
+        )
+        assert DiscoveryCache(str(path)).devices == {
+            "d073d5000001": {
+                "services": {"UDP": {"host": "192.168.0.1", "port": 56700}},
+                "last_seen": 20.0,
+            }
+        }
+
+    it "can record, forget and save devices", tmp_path:
+        path = str(tmp_path / "one" / "cache.json")
+        cache = DiscoveryCache(path)
+
+        with mock.patch("time.time", lambda: 30):
+            cache.add("d073d5000001", Services.UDP, "192.168.0.1", 56700)
+            cache.add("d073d5000001", Services.RESERVED1, "192.168.0.1", 56700)
+            cache.add("d073d5000002", Services.UDP, "192.168.0.2", 56701)
+
+        cache.remove("d073d5000002")
+        cache.remove("d073d5000003")
+        assert cache.changed
+
+        cache.save()
+        assert not cache.changed
+
+        with open(path) as fle:
+            assert json.load(fle) == {
+                "d073d5000001": {
+                    "services": {"UDP": {"host": "192.168.0.1", "port": 56700}},
+                    "last_seen": 30,
+                }
+            }
+        assert not os.path.exists(f"{path}.tmp")
+
+        assert DiscoveryCache(path).devices == cache.devices
+
+    it "only changes when devices move or were last seen a while ago", tmp_path:
+        cache = DiscoveryCache(str(tmp_path / "cache.json"))
+
+        with mock.patch("time.time", lambda: 100):
+            cache.add("d073d5000001", Services.UDP, "192.168.0.1", 56700)
+        cache.save()
+
+        with mock.patch("time.time", lambda: 150):
+            cache.add("d073d5000001", Services.UDP, "192.168.0.1", 56700)
+        assert not cache.changed
+        assert cache.devices["d073d5000001"]["last_seen"] == 100
+
+        with mock.patch("time.time", lambda: 151):
+            cache.add("d073d5000001", Services.UDP, "192.168.0.2", 56700)
+        assert cache.changed
+        assert cache.devices["d073d5000001"]["last_seen"] == 151
+        cache.save()
+
+        with mock.patch("time.time", lambda: 211):
+            cache.add("d073d5000001", Services.UDP, "192.168.0.2", 56700)
+        assert cache.changed
+        assert cache.devices["d073d5000001"]["last_seen"] == 211
+
+    it "only says devices seen within max_age are fresh", tmp_path:
+        cache = DiscoveryCache(str(tmp_path / "cache.json"), max_age=10)
+
+        now = time.time()
+        with mock.patch("time.time", lambda: now - 20):
+            cache.add("d073d5000001", Services.UDP, "192.168.0.1", 56700)
+        cache.add("d073d5000002", Services.UDP, "192.168.0.2", 56700)
+
+        assert cache.fresh() == {
+            "d073d5000002": {Services.UDP: {"host": "192.168.0.2", "port": 56700}}
+        }
+
+        cache.max_age = None
+        assert cache.fresh() == {
+            "d073d5000001": {Services.UDP: {"host": "192.168.0.1", "port": 56700}},
+            "d073d5000002": {Services.UDP: {"host": "192.168.0.2", "port": 56700}},
+        }
@@ -11,6 +11,7 @@ from delfick_project.errors_pytest import assertRaises
 from unittest import mock
 import binascii
 import pytest
+import os
 
 
 @pytest.fixture()
@@ -367,6 +368,28 @@ describe "DiscoveryOptions":
             mock.call("d073d5000002", Services.UDP, host="192.168.7.8", port=56),
         ]
 
+describe "DiscoveryOptions cache":
+    it "has no discovery cache by default":
+        options = do.DiscoveryOptions.FieldSpec().empty_normalise()
+        assert not options.has_discovery_cache
+        assert options.make_discovery_cache() is None
+
+    it "can make a discovery cache", tmp_path:
+        path = str(tmp_path / "cache.json")
+        options = do.DiscoveryOptions.FieldSpec().empty_normalise(cache_file=path)
+        assert options.has_discovery_cache
+
+        cache = options.make_discovery_cache()
+        assert cache.path == path
+        assert cache.max_age == 60 * 60 * 24
+
+        options = do.DiscoveryOptions.FieldSpec().empty_normalise(
+            cache_file="~/cache.json", cache_max_age=20
+        )
+        cache = options.make_discovery_cache()
+        assert cache.path == os.path.expanduser("~/cache.json")
+        assert cache.max_age == 20
+
 describe "NoDiscoveryOptions":
     it "overrides serial_filter and hardcoded_discovery with None":
         with modified_env(
@@ -390,6 +413,10 @@ describe "NoDiscoveryOptions":
         options = do.NoDiscoveryOptions.FieldSpec().empty_normalise()
         assert not options.hardcoded_discovery
 
+    it "says no discovery cache":
+        options = do.NoDiscoveryOptions.FieldSpec().empty_normalise(cache_file="/tmp/nope.json")
+        assert not options.has_discovery_cache
+
     it "wants all serials":
         options = do.NoDiscoveryOptions.FieldSpec().empty_normalise()
         assert options.want("d073d5000001")
@@ -516,3 +543,21 @@ describe "discovery_options_spec":
         assert options.hardcoded_discovery == {
             "d073d5000001": {Services.UDP: {"host": "192.168.0.1", "port": 56700}}
         }
+
+    it "can override global cache options", meta, spec:
+        options = do.DiscoveryOptions.FieldSpec().empty_normalise(
+            cache_file="/tmp/one.json", cache_max_age=20
+        )
+        meta.everything["discovery_options"] = options
+
+        res = spec.normalise(meta, sb.NotSpecified)
+        assert (res.cache_file, res.cache_max_age) == ("/tmp/one.json", 20)
+
+        res = spec.normalise(meta, {"cache_file": "/tmp/two.json"})
+        assert (res.cache_file, res.cache_max_age) == ("/tmp/two.json", 20)
+
+        res = spec.normalise(meta, {"cache_file": "", "cache_max_age": 30})
+        assert (res.cache_file, res.cache_max_age) == ("", 30)
+        assert not res.has_discovery_cache
+
+        assert (options.cache_file, options.cache_max_age) == ("/tmp/one.json", 20)
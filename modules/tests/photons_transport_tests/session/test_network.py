@@ -2,7 +2,12 @@
 
 from photons_transport.session.discovery_options import NoDiscoveryOptions, NoEnvDiscoveryOptions
 from photons_transport.errors import NoDesiredService, UnknownService, InvalidBroadcast
-from photons_transport.session.network import NetworkSession, UDPRetryOptions
+from photons_transport.session.network import (
+    NetworkSession,
+    UDPRetryOptions,
+    AdaptiveUDPRetryOptions,
+)
+from photons_transport.session.discovery_cache import DiscoveryCache
 from photons_transport.transports.udp import UDP
 from photons_transport.comms.base import Found
 
@@ -28,8 +33,15 @@ describe "NetworkSession":
             def transport_target(s):
                 transport_target = mock.Mock(
                     name="target",
-                    spec=["script", "final_future", "default_broadcast", "discovery_options"],
+                    spec=[
+                        "script",
+                        "final_future",
+                        "default_broadcast",
+                        "discovery_options",
+                        "targeted_discovery",
+                    ],
                 )
+                transport_target.targeted_discovery = False
                 transport_target.final_future = s.final_future
                 transport_target.default_broadcast = s.default_broadcast
                 transport_target.discovery_options = (
@@ -90,6 +102,24 @@ describe "NetworkSession":
             assert isinstance(uro2, UDPRetryOptions)
 
             assert uro1 is not uro2
+            assert not isinstance(uro1, AdaptiveUDPRetryOptions)
+
+        async it "returns AdaptiveUDPRetryOptions if the target wants adaptive retries", V:
+            V.transport_target.adaptive_retries = True
+
+            kwargs = {"host": "192.168.0.3", "port": 56700}
+            transport = await V.session.make_transport("d073d5", Services.UDP, kwargs)
+            packet = mock.NonCallableMock(name="packet", spec=[])
+
+            uro1 = V.session.retry_options_for(packet, transport)
+            assert isinstance(uro1, AdaptiveUDPRetryOptions)
+            assert isinstance(uro1, UDPRetryOptions)
+            assert uro1.serial == "d073d5"
+            assert uro1.estimator is V.session.rtt_estimator
+
+            uro1.record_rtt(0.2)
+            uro2 = V.session.retry_options_for(packet, transport)
+            assert uro2.timeouts[0] == pytest.approx((0.6, 0.6))
 
     describe "determine_needed_transport":
         async it "says udp", V:
@@ -507,6 +537,149 @@ describe "NetworkSession":
             assert fn == [binascii.unhexlify("d073d5000001")]
             assert V.session.found.serials == ["d073d5000001"]
 
+    describe "targeted search":
+
+        def unhex(self, *serials):
+            return sorted(binascii.unhexlify(serial) for serial in serials)
+
+        async it "is only used for specific serials when the target asks for it", V:
+            a = mock.Mock(name="a")
+            _targeted_search = pytest.helpers.AsyncMock(name="_targeted_search", return_value=[])
+            _broadcast_search = pytest.helpers.AsyncMock(name="_broadcast_search", return_value=[])
+
+            with mock.patch.multiple(
+                V.session, _targeted_search=_targeted_search, _broadcast_search=_broadcast_search
+            ):
+                await V.session._do_search(["d073d5000001"], 20, a=a)
+                _broadcast_search.assert_called_once_with(["d073d5000001"], 20, a=a)
+                _broadcast_search.reset_mock()
+
+                V.transport_target.targeted_discovery = True
+                await V.session._do_search(["d073d5000001"], 20, a=a)
+                _targeted_search.assert_called_once_with(["d073d5000001"], 20, a=a)
+
+                await V.session._do_search(None, 20, a=a)
+                _broadcast_search.assert_called_once_with(None, 20, a=a)
+
+        async it "asks known devices first and only broadcasts for the rest", V:
+            for serial in ("d073d5000001", "d073d5000003"):
+                await V.session.add_service(serial, Services.UDP, host="192.168.0.1", port=56700)
+
+            a = mock.Mock(name="a")
+            _unicast_search = pytest.helpers.AsyncMock(
+                name="_unicast_search", return_value={"d073d5000001"}
+            )
+            _broadcast_search = pytest.helpers.AsyncMock(
+                name="_broadcast_search", return_value=self.unhex("d073d5000002")
+            )
+
+            with mock.patch.multiple(
+                V.session, _unicast_search=_unicast_search, _broadcast_search=_broadcast_search
+            ):
+                fn = await V.session._targeted_search(["d073d5000001", "d073d5000002"], 20, a=a)
+
+            _unicast_search.assert_called_once_with(["d073d5000001"], 1)
+            _broadcast_search.assert_called_once_with(["d073d5000002"], mock.ANY, a=a)
+            assert 19 < _broadcast_search.mock_calls[0][1][1] <= 20
+
+            assert sorted(fn) == self.unhex("d073d5000001", "d073d5000002", "d073d5000003")
+
+        async it "doesn't broadcast if all the devices reply", V:
+            await V.session.add_service(
+                "d073d5000001", Services.UDP, host="192.168.0.1", port=56700
+            )
+
+            _unicast_search = pytest.helpers.AsyncMock(
+                name="_unicast_search", return_value={"d073d5000001"}
+            )
+            _broadcast_search = pytest.helpers.AsyncMock(name="_broadcast_search")
+
+            with mock.patch.multiple(
+                V.session, _unicast_search=_unicast_search, _broadcast_search=_broadcast_search
+            ):
+                fn = await V.session._targeted_search(["d073d5000001"], 0.5)
+
+            _unicast_search.assert_called_once_with(["d073d5000001"], 0.5)
+            assert len(_broadcast_search.mock_calls) == 0
+            assert fn == self.unhex("d073d5000001")
+
+        async it "doesn't say a device was found if it didn't reply", V:
+            await V.session.add_service(
+                "d073d5000001", Services.UDP, host="192.168.0.1", port=56700
+            )
+
+            _unicast_search = pytest.helpers.AsyncMock(name="_unicast_search", return_value=set())
+            _broadcast_search = pytest.helpers.AsyncMock(name="_broadcast_search", return_value=[])
+
+            with mock.patch.multiple(
+                V.session, _unicast_search=_unicast_search, _broadcast_search=_broadcast_search
+            ):
+                fn = await V.session._targeted_search(["d073d5000001"], 20)
+
+            _broadcast_search.assert_called_once_with(["d073d5000001"], mock.ANY)
+            assert fn == []
+
+        async it "uses addresses from the discovery cache", V, tmp_path:
+            V.session.discovery_cache = DiscoveryCache(str(tmp_path / "cache.json"))
+            V.session.discovery_cache.add("d073d5000001", Services.UDP, "192.168.0.3", 56)
+            V.session.checked_discovery_cache = True
+
+            _unicast_search = pytest.helpers.AsyncMock(
+                name="_unicast_search", return_value={"d073d5000001"}
+            )
+            _broadcast_search = pytest.helpers.AsyncMock(name="_broadcast_search", return_value=[])
+
+            with mock.patch.multiple(
+                V.session, _unicast_search=_unicast_search, _broadcast_search=_broadcast_search
+            ):
+                fn = await V.session._targeted_search(["d073d5000001", "d073d5000002"], 20)
+
+            _unicast_search.assert_called_once_with(["d073d5000001"], 1)
+            _broadcast_search.assert_called_once_with(["d073d5000002"], mock.ANY)
+            assert fn == self.unhex("d073d5000001")
+
+            assert V.session.found["d073d5000001"] == {
+                Services.UDP: await V.session.make_transport(
+                    "d073d5000001", Services.UDP, {"host": "192.168.0.3", "port": 56}
+                )
+            }
+
+        async it "records where devices reply from when asking them directly", V:
+
+            async def run(*args, **kwargs):
+                s1 = DiscoveryMessages.StateService(
+                    service=Services.UDP, port=56, target="d073d5000001"
+                )
+                s1.Information.update(
+                    remote_addr=("192.168.0.3", 56700),
+                    sender_message=DiscoveryMessages.GetService(),
+                )
+                yield s1
+
+            script = mock.Mock(name="script", spec=["run"])
+            script.run = pytest.helpers.MagicAsyncMock(name="run", side_effect=run)
+            V.transport_target.script.return_value = script
+
+            seen = await V.session._unicast_search(["d073d5000001", "d073d5000002"], 1)
+            assert seen == {"d073d5000001"}
+
+            V.transport_target.script.assert_called_once_with(
+                DiscoveryMessages.GetService(ack_required=False, res_required=True)
+            )
+            script.run.assert_called_once_with(
+                ["d073d5000001", "d073d5000002"],
+                V.session,
+                accept_found=True,
+                message_timeout=1,
+                error_catcher=[],
+            )
+
+            assert V.session.found["d073d5000001"] == {
+                Services.UDP: await V.session.make_transport(
+                    "d073d5000001", Services.UDP, {"host": "192.168.0.3", "port": 56}
+                )
+            }
+
     describe "make_transport":
         async it "complains if the service isn't a valid Service", V:
             serial = "d073d5000001"
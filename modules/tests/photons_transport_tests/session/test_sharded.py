@@ -0,0 +1,253 @@
+# coding: spec
+
+from photons_transport.session.sharded import (
+    ShardedNetworkSession,
+    ShardReply,
+    Worker,
+    Shard,
+    shard_index,
+    write_frame,
+    read_frame,
+)
+from photons_transport.comms.template import PacketTemplate
+from photons_transport.errors import ShardStopped, FailedToFindDevice
+from photons_transport.session.network import NetworkSession
+from photons_transport.targets import LanTarget
+
+from photons_app.errors import TimedOut
+from photons_app import helpers as hp
+
+from photons_messages import DeviceMessages, LightMessages, Services, protocol_register
+
+from delfick_project.errors_pytest import assertRaises
+import asyncio
+from unittest import mock
+import socket
+import pickle
+import pytest
+import gc
+
+
+@pytest.fixture()
+def options():
+    return {"final_future": hp.create_future(), "protocol_register": protocol_register}
+
+
+describe "shard_index":
+    it "spreads consecutive serials over the shards":
+        serials = [f"d073d500000{i}" for i in range(1, 7)]
+        assert [shard_index(serial, 3) for serial in serials] == [0, 1, 2, 0, 1, 2]
+        assert [shard_index(serial, 1) for serial in serials] == [0] * 6
+
+describe "frames":
+    async it "can send objects over a stream":
+        one, two = socket.socketpair()
+        _, writer = await asyncio.open_connection(sock=one)
+        reader, other = await asyncio.open_connection(sock=two)
+
+        try:
+            write_frame(writer, ("send", 1, b"\x00\x01", {"timeout": 1}))
+            write_frame(writer, ("stop",))
+
+            assert await read_frame(reader) == ("send", 1, b"\x00\x01", {"timeout": 1})
+            assert await read_frame(reader) == ("stop",)
+        finally:
+            writer.close()
+            other.close()
+
+describe "LanTarget":
+    async it "only makes a sharded session if there is more than one shard", options:
+        for shards, kls in ((0, NetworkSession), (1, NetworkSession), (3, ShardedNetworkSession)):
+            target = LanTarget.create(options, {"shards": shards})
+            async with target.session() as sender:
+                assert type(sender) is kls
+
+describe "Shard":
+
+    @pytest.fixture()
+    def shard(self):
+        shard = Shard(0, {})
+        shard.writer = mock.Mock(name="writer", spec=["write"])
+        shard.read_task = hp.create_future()
+        shard.started = hp.create_future()
+        shard.started.set_result(True)
+        return shard
+
+    def frames(self, shard):
+        result = []
+        for call in shard.writer.write.mock_calls:
+            result.append(pickle.loads(call[1][0][4:]))
+        shard.writer.write.reset_mock()
+        return result
+
+    async def send(self, shard, packet):
+        task = hp.async_as_background(shard.send(packet, {"timeout": 1}))
+        await asyncio.sleep(0)
+        assert len(shard.pending) == 1
+        for fut in shard.pending.values():
+            fut.set_result([])
+        assert await task == []
+
+    async it "only gives the worker a template once", shard:
+        msg = DeviceMessages.SetPower(level=65535).simplify()
+        template = PacketTemplate.from_packet(msg)
+
+        with mock.patch.object(type(msg), "tobytes") as tobytes:
+            await self.send(shard, template.make("d073d5000001", 2, 1))
+            await self.send(shard, template.make("d073d5000002", 2, 1))
+
+        assert len(tobytes.mock_calls) == 0
+
+        assert self.frames(shard) == [
+            ("template", 1, template.bts),
+            ("send", 2, 1, "d073d5000001", 2, {"timeout": 1}),
+            ("send", 3, 1, "d073d5000002", 2, {"timeout": 1}),
+        ]
+
+        del template
+        gc.collect()
+
+        other = PacketTemplate.from_packet(DeviceMessages.GetPower().simplify())
+        await self.send(shard, other.make("d073d5000001", 2, 1))
+
+        assert self.frames(shard) == [
+            ("forget_template", 1),
+            ("template", 4, other.bts),
+            ("send", 5, 4, "d073d5000001", 2, {"timeout": 1}),
+        ]
+
+    async it "gives the worker the bytes of packets without a template", shard:
+        msg = DeviceMessages.SetLabel(label="bob", target="d073d5000001", source=2, sequence=1)
+        await self.send(shard, msg)
+        assert self.frames(shard) == [
+            ("send", 1, msg.tobytes("d073d5000001"), "d073d5000001", 2, {"timeout": 1})
+        ]
+
+describe "ShardReply":
+    it "only unpacks the reply when more than the header is wanted":
+        reply = LightMessages.StateLightPower(
+            level=65535, target="d073d5000001", source=2, sequence=3
+        )
+        bts = reply.pack().tobytes()
+
+        transport_target = mock.Mock(name="transport_target", protocol_register=protocol_register)
+        pkt = ShardedNetworkSession.reply_from_shard(
+            mock.Mock(name="session", transport_target=transport_target),
+            "original",
+            "d073d5000001",
+            ("pkt", bts, ("127.0.0.1", 56700)),
+        )
+
+        assert isinstance(pkt, ShardReply)
+        assert pkt | LightMessages.StateLightPower
+        assert not pkt | DeviceMessages.StatePower
+        assert (pkt.serial, pkt.source, pkt.sequence) == ("d073d5000001", 2, 3)
+        assert pkt.Information.sender_message == "original"
+        assert pkt.tobytes() == bts
+        assert pkt._unpacked is None
+
+        assert pkt.level == 65535
+        assert pkt.unpacked.pack() == reply.pack()
+        assert pkt.unpacked.Information.remote_addr == ("127.0.0.1", 56700)
+        assert pkt.unpacked.Information.sender_message == "original"
+
+describe "ShardedNetworkSession":
+    async it "complains about devices it hasn't found", options:
+        target = LanTarget.create(options, {"shards": 2})
+        async with target.session() as sender:
+            msg = DeviceMessages.GetPower(target="d073d5000001", source=1, sequence=1)
+            with assertRaises(FailedToFindDevice, serial="d073d5000001"):
+                await sender.send_single(msg, msg, timeout=1)
+            assert sender.shards == {}
+
+    async it "gets errors from the shard", options:
+        target = LanTarget.create(options, {"shards": 2})
+        async with target.session() as sender:
+            await sender.add_service("d073d5000001", Services.UDP, host="127.0.0.1", port=1)
+
+            msg = DeviceMessages.GetPower()
+            errors = []
+            await sender(msg, "d073d5000001", message_timeout=0.2, error_catcher=errors)
+
+            assert len(errors) == 1
+            assert isinstance(errors[0], TimedOut)
+            assert errors[0].kwargs["serial"] == "d073d5000001"
+            assert errors[0].kwargs["sent_pkt_type"] == msg.pkt_type
+
+    async it "complains if a shard stops", options:
+        target = LanTarget.create(options, {"shards": 2})
+        async with target.session() as sender:
+            await sender.add_service("d073d5000001", Services.UDP, host="127.0.0.1", port=1)
+
+            shard = sender.shard_for("d073d5000001")
+            await shard.started
+            shard.process.kill()
+            await hp.wait_for_all_futures(shard.read_task)
+
+            errors = []
+            await sender(DeviceMessages.GetPower(), "d073d5000001", error_catcher=errors)
+            assert errors == [ShardStopped(shard=1)]
+
+    async it "gives messages that don't want a reply to a shard", options:
+        received = hp.create_future()
+
+        class Protocol(asyncio.DatagramProtocol):
+            def datagram_received(s, data, addr):
+                if not received.done():
+                    received.set_result(data)
+
+        loop = asyncio.get_event_loop()
+        transport, _ = await loop.create_datagram_endpoint(Protocol, local_addr=("127.0.0.1", 0))
+        port = transport.get_extra_info("sockname")[1]
+
+        async def send_no_reply(*args, **kwargs):
+            assert False, "Expected the shard to write the message"
+
+        target = LanTarget.create(options, {"shards": 2})
+        try:
+            async with target.session() as sender:
+                await sender.add_service("d073d5000001", Services.UDP, host="127.0.0.1", port=port)
+
+                msg = LightMessages.SetLightPower(
+                    level=65535, ack_required=False, res_required=False
+                )
+                with mock.patch.object(NetworkSession, "send_no_reply", send_no_reply):
+                    assert await sender(msg, "d073d5000001") == []
+
+                assert list(sender.shards) == [1]
+
+                data = await asyncio.wait_for(received, timeout=5)
+                pkt = LightMessages.SetLightPower.create(data)
+                assert pkt.serial == "d073d5000001"
+                assert pkt.level == 65535
+        finally:
+            transport.close()
+
+describe "Worker":
+    async it "gives every message a sequence from it's own session", options:
+        target = LanTarget.create(options)
+        session = NetworkSession(target)
+
+        sent = []
+
+        async def send_single(original, packet, **kwargs):
+            sent.append((packet.serial, packet.sequence))
+            return []
+
+        worker = Worker(None, {})
+        writer = mock.Mock(name="writer")
+        msg = DeviceMessages.GetPower(target="d073d5000001", source=1, sequence=1)
+        bts = msg.pack().tobytes()
+        template = worker.template(session, bts)
+
+        try:
+            with mock.patch.object(session, "send_single", send_single):
+                for ident, t in ((1, bts), (2, template)):
+                    await worker.send(session, writer, {}, ident, t, "d073d5000001", 1, {})
+
+            assert sent == [("d073d5000001", 1), ("d073d5000001", 2)]
+
+            # Retries use the same counter
+            assert session.seq("d073d5000001") == 3
+        finally:
+            await session.finish()
@@ -1,6 +1,10 @@
 # coding: spec
 
-from photons_transport.targets.item import Item, NoLimit
+from photons_transport.targets.item import Item, NoLimit, round_robin
+from photons_transport.comms.template import TemplatedPacket
+from photons_transport.comms.pacing import DeviceWindows
+from photons_transport.errors import InvalidPriority
+from photons_transport.comms.priority import Lanes, PrioritySemaphore
 from photons_transport.comms.base import Found
 
 from photons_app.errors import (
@@ -186,6 +190,27 @@ describe "Item":
                 c5.update.assert_called_once_with(dict(source=c5source, sequence=1))
                 c5.actual.assert_called_once_with("source")
 
+            async it "packs static messages once for all the serials":
+                sender = mock.Mock(name="sender", source=9001, spec=["source", "seq"])
+                sender.seq.side_effect = lambda serial: 3
+
+                get_power = DeviceMessages.GetPower()
+                with_source = DeviceMessages.SetPower(level=0, source=20)
+                serials = ["d073d5000001", "d073d5000002"]
+
+                packets = Item([get_power, with_source]).make_packets(sender, serials)
+                assert [o for o, _ in packets] == [get_power] * 2 + [with_source] * 2
+
+                for (original, packet), serial in zip(packets, serials * 2):
+                    source = 20 if original is with_source else 9001
+                    expected = original.clone()
+                    expected.update(dict(target=serial, source=source, sequence=3))
+
+                    assert isinstance(packet, TemplatedPacket)
+                    assert packet.serial == serial
+                    assert packet.source == source
+                    assert packet.tobytes(serial) == expected.tobytes(serial)
+
         describe "search":
 
             @pytest.fixture()
@@ -412,16 +437,40 @@ describe "Item":
 
                 assert V.sender.send_single.mock_calls == [
                     mock.call(
-                        V.o1, V.p1, timeout=10, no_retry=False, broadcast=None, connect_timeout=10
+                        V.o1,
+                        V.p1,
+                        timeout=10,
+                        no_retry=False,
+                        broadcast=None,
+                        connect_timeout=10,
+                        use_reply_cache=True,
                     ),
                     mock.call(
-                        V.o2, V.p2, timeout=10, no_retry=False, broadcast=None, connect_timeout=10
+                        V.o2,
+                        V.p2,
+                        timeout=10,
+                        no_retry=False,
+                        broadcast=None,
+                        connect_timeout=10,
+                        use_reply_cache=True,
                     ),
                     mock.call(
-                        V.o3, V.p3, timeout=10, no_retry=False, broadcast=None, connect_timeout=10
+                        V.o3,
+                        V.p3,
+                        timeout=10,
+                        no_retry=False,
+                        broadcast=None,
+                        connect_timeout=10,
+                        use_reply_cache=True,
                     ),
                     mock.call(
-                        V.o4, V.p4, timeout=10, no_retry=False, broadcast=None, connect_timeout=10
+                        V.o4,
+                        V.p4,
+                        timeout=10,
+                        no_retry=False,
+                        broadcast=None,
+                        connect_timeout=10,
+                        use_reply_cache=True,
                     ),
                 ]
 
@@ -446,6 +495,7 @@ describe "Item":
                 nr = mock.Mock(name="no_retry")
                 broadcast = mock.Mock(name="broadcast")
                 ct = mock.Mock(nme="connect_timeout")
+                urc = mock.Mock(name="use_reply_cache")
 
                 kwargs = {
                     "error_catcher": V.error_catcher,
@@ -453,6 +503,7 @@ describe "Item":
                     "no_retry": nr,
                     "broadcast": broadcast,
                     "connect_timeout": ct,
+                    "use_reply_cache": urc,
                 }
 
                 res = []
@@ -470,6 +521,7 @@ describe "Item":
                         no_retry=nr,
                         broadcast=broadcast,
                         connect_timeout=ct,
+                        use_reply_cache=urc,
                     ),
                     mock.call(
                         V.o2,
@@ -478,6 +530,7 @@ describe "Item":
                         no_retry=nr,
                         broadcast=broadcast,
                         connect_timeout=ct,
+                        use_reply_cache=urc,
                     ),
                     mock.call(
                         V.o3,
@@ -486,6 +539,7 @@ describe "Item":
                         no_retry=nr,
                         broadcast=broadcast,
                         connect_timeout=ct,
+                        use_reply_cache=urc,
                     ),
                     mock.call(
                         V.o4,
@@ -494,6 +548,7 @@ describe "Item":
                         no_retry=nr,
                         broadcast=broadcast,
                         connect_timeout=ct,
+                        use_reply_cache=urc,
                     ),
                 ]
 
@@ -529,6 +584,121 @@ describe "Item":
 
                 assert res == [V.results[i] for i in (0, 6)]
 
+            async it "takes turns between devices when there is a limit", item, V:
+                started = []
+
+                async def send_single(original, packet, **kwargs):
+                    started.append(original)
+                    return []
+
+                V.sender.send_single.side_effect = send_single
+                V.kwargs["limit"] = asyncio.Semaphore(1)
+
+                async for _ in item.write_messages(V.sender, V.packets, V.kwargs):
+                    pass
+
+                assert started == [V.o1, V.o3, V.o2, V.o4]
+
+            async it "gives free slots in the limit to the best priority first", item, V:
+                started = []
+                limit = PrioritySemaphore(1)
+
+                async def send_single(original, packet, **kwargs):
+                    started.append(original)
+                    return []
+
+                V.sender.send_single.side_effect = send_single
+
+                async def send(packets, priority):
+                    kwargs = {**V.kwargs, "limit": limit, "priority": priority}
+                    async for _ in item.write_messages(V.sender, packets, kwargs):
+                        pass
+
+                async with limit:
+                    ts = [
+                        hp.async_as_background(send(V.packets[:2], "background")),
+                        hp.async_as_background(send(V.packets[2:], "interactive")),
+                    ]
+                    await asyncio.sleep(0.01)
+                    assert started == []
+
+                await asyncio.gather(*ts)
+                assert started == [V.o3, V.o4, V.o1, V.o2]
+
+            async it "uses the device windows from the sender", item, V:
+                inflight = {V.serial1: 0, V.serial2: 0}
+                most = {V.serial1: 0, V.serial2: 0}
+
+                async def send_single(original, packet, **kwargs):
+                    inflight[packet.serial] += 1
+                    most[packet.serial] = max(most[packet.serial], inflight[packet.serial])
+                    await asyncio.sleep(0.01)
+                    inflight[packet.serial] -= 1
+                    return [original]
+
+                sender = mock.Mock(
+                    name="sender",
+                    stop_fut=V.sender.stop_fut,
+                    device_windows=DeviceWindows(inflight=1),
+                    spec=["send_single", "stop_fut", "device_windows"],
+                )
+                sender.send_single.side_effect = send_single
+
+                res = []
+                async for msg in item.write_messages(sender, V.packets, V.kwargs):
+                    res.append(msg)
+
+                assert set(res) == set([V.o1, V.o2, V.o3, V.o4])
+                assert most == {V.serial1: 1, V.serial2: 1}
+
+            async it "uses the lanes from the sender", item, V:
+                lanes = Lanes()
+                priorities = []
+
+                async def send_single(original, packet, **kwargs):
+                    priorities.append(list(lanes.active))
+                    return [original]
+
+                sender = mock.Mock(
+                    name="sender",
+                    stop_fut=V.sender.stop_fut,
+                    lanes=lanes,
+                    spec=["send_single", "stop_fut", "lanes"],
+                )
+                sender.send_single.side_effect = send_single
+
+                kwargs = {**V.kwargs, "priority": "interactive"}
+                async for msg in item.write_messages(sender, V.packets, kwargs):
+                    pass
+
+                assert priorities == [[1, 0, 0]] * 4
+                assert lanes.active == [0, 0, 0]
+
+            async it "complains about an unknown priority", item, V:
+                kwargs = {**V.kwargs, "priority": "urgent"}
+                with assertRaises(InvalidPriority, got="urgent"):
+                    async for msg in item.write_messages(V.sender, V.packets, kwargs):
+                        pass
+                assert len(V.sender.send_single.mock_calls) == 0
+
+        describe "round_robin":
+            it "takes turns between serials keeping the order for each serial":
+                packets = [
+                    ("o1", mock.Mock(name="p1", serial="one")),
+                    ("o2", mock.Mock(name="p2", serial="one")),
+                    ("o3", mock.Mock(name="p3", serial="one")),
+                    ("o4", mock.Mock(name="p4", serial="two")),
+                    ("o5", mock.Mock(name="p5", serial="three")),
+                    ("o6", mock.Mock(name="p6", serial="two")),
+                ]
+
+                got = [o for o, _ in round_robin(packets)]
+                assert got == ["o1", "o4", "o5", "o2", "o6", "o3"]
+
+            it "returns the packets as is for one serial":
+                packets = [("o1", mock.Mock(name="p1", serial="one"))]
+                assert round_robin(packets) == packets
+
         describe "private find":
 
             @pytest.fixture()
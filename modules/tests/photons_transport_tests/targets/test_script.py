@@ -1,6 +1,7 @@
 # coding: spec
 
 from photons_transport.targets.script import SenderWrapper, ScriptRunner
+from photons_transport.comms.priority import PrioritySemaphore
 
 from photons_app.errors import PhotonsAppError, BadRunWithResults
 from photons_app import helpers as hp
@@ -16,7 +17,7 @@ class Sem:
         self.limit = limit
 
     def __eq__(self, other):
-        return isinstance(other, asyncio.Semaphore) and other._value == self.limit
+        return isinstance(other, PrioritySemaphore) and other.value == self.limit
 
 
 describe "SenderWrapper":
@@ -1,6 +1,7 @@
 # coding: spec
 
-from photons_transport import RetryOptions
+from photons_transport.retry_options import RTTEstimator
+from photons_transport import RetryOptions, AdaptiveRetryOptions
 
 from photons_app import helpers as hp
 
@@ -114,3 +115,60 @@ describe "RetryOptions":
                 (8.6, (2.4, 1.2)),
                 # 9 - takes 3 bringing us over 11 so no other tick
             ]
+
+describe "RTTEstimator":
+    it "has no rto until it has a round trip time":
+        estimator = RTTEstimator()
+        assert estimator.rto("d073d5000001") is None
+
+    it "smooths round trip times like RFC 6298":
+        estimator = RTTEstimator()
+
+        estimator.add("d073d5000001", 0.2)
+        assert estimator.estimates["d073d5000001"] == (0.2, 0.1)
+        assert estimator.rto("d073d5000001") == pytest.approx(0.6)
+
+        estimator.add("d073d5000001", 0.4)
+        srtt, rttvar = estimator.estimates["d073d5000001"]
+        assert rttvar == pytest.approx(0.75 * 0.1 + 0.25 * 0.2)
+        assert srtt == pytest.approx(0.875 * 0.2 + 0.125 * 0.4)
+        assert estimator.rto("d073d5000001") == pytest.approx(srtt + 4 * rttvar)
+
+        assert estimator.rto("d073d5000002") is None
+
+    it "keeps the rto within bounds":
+        estimator = RTTEstimator()
+
+        estimator.add("d073d5000001", 0.001)
+        assert estimator.rto("d073d5000001") == 0.1
+
+        estimator.add("d073d5000002", 10)
+        assert estimator.rto("d073d5000002") == 5
+
+describe "AdaptiveRetryOptions":
+    it "uses the default timeouts until there is a round trip time":
+        estimator = RTTEstimator()
+        options = AdaptiveRetryOptions(estimator, "d073d5000001")
+        assert options.timeouts == RetryOptions.timeouts
+
+        options = AdaptiveRetryOptions(estimator, None)
+        options.record_rtt(0.1)
+        assert estimator.estimates == {}
+        assert options.timeouts == RetryOptions.timeouts
+
+    it "uses the rto for the serial":
+        estimator = RTTEstimator()
+        options = AdaptiveRetryOptions(estimator, "d073d5000001")
+
+        options.record_rtt(0.1)
+        assert estimator.estimates == {"d073d5000001": (0.1, 0.05)}
+
+        rto = estimator.rto("d073d5000001")
+        assert rto == pytest.approx(0.3)
+        assert options.timeouts == [(rto, rto), (rto * 2, rto * 5), (rto * 4, rto * 13)]
+
+    it "can be given timeouts":
+        timeouts = mock.Mock(name="timeouts")
+        options = AdaptiveRetryOptions(RTTEstimator(), "d073d5000001", timeouts=timeouts)
+        options.record_rtt(0.1)
+        assert options.timeouts is timeouts
@@ -1,6 +1,6 @@
 # coding: spec
 
-from photons_transport.transports.udp import UDP
+from photons_transport.transports.udp import UDP, SharedUDP, UDPEngine
 
 from photons_app import helpers as hp
 
@@ -147,3 +147,119 @@ describe "UDP":
             assert not await V.transport.is_transport_active(V.original_message, transport)
         finally:
             await device.finish()
+
+
+describe "UDPEngine":
+
+    @pytest.fixture()
+    def V(self):
+        class V:
+            host = "127.0.0.1"
+            port = pytest.helpers.free_port()
+
+            session = mock.Mock(name="session", spec=["received_data_now"])
+            original_message = mock.Mock(name="original_message")
+
+            @hp.memoized_property
+            def engine(s):
+                return UDPEngine(s.session)
+
+        return V()
+
+    async it "starts one socket", V:
+        sock = V.engine.start()
+        try:
+            assert V.engine.start() is sock
+            assert not sock.getblocking()
+        finally:
+            V.engine.close()
+
+        assert V.engine.sock is None
+        assert V.engine.start() is not sock
+        V.engine.close()
+
+    async it "sends everything written in the same tick together", V:
+        received = []
+        done = hp.create_future()
+
+        def translate(bts, addr):
+            received.append(bts)
+            if len(received) == 3:
+                done.set_result(True)
+            return []
+
+        device = FakeDevice(V.port, translate)
+        await device.start()
+
+        V.engine.start()
+        try:
+            for bts in (b"one", b"two", b"three"):
+                V.engine.sendto(bts, (V.host, V.port))
+
+            assert len(V.engine.outgoing) == 3
+            assert V.engine.flush_handle is not None
+
+            await done
+            assert received == [b"one", b"two", b"three"]
+            assert len(V.engine.outgoing) == 0
+        finally:
+            V.engine.close()
+            await device.finish()
+
+    async it "gives received data to the session without making tasks", V:
+        received = []
+        done = hp.create_future()
+
+        def receive(data, addr):
+            assert addr == (V.host, V.port)
+            received.append(data)
+            if len(received) == 3:
+                done.set_result(True)
+
+        V.session.received_data_now.side_effect = receive
+
+        device = FakeDevice(V.port, lambda bts, addr: [b"reply1", b"reply2", b"reply3"])
+        await device.start()
+
+        V.engine.start()
+        try:
+            V.engine.sendto(b"request", (V.host, V.port))
+            await done
+            assert received == [b"reply1", b"reply2", b"reply3"]
+        finally:
+            V.engine.close()
+            await device.finish()
+
+    describe "SharedUDP":
+        async it "writes using the engine of the session", V:
+            received = []
+            done = hp.create_future()
+
+            def translate(bts, addr):
+                received.append(bts)
+                done.set_result(True)
+                return []
+
+            device = FakeDevice(V.port, translate)
+            await device.start()
+
+            V.session.udp_engine = V.engine
+            transport = SharedUDP(V.session, V.host, V.port, serial="d073d5000001")
+
+            try:
+                t = await transport.spawn(V.original_message, timeout=1)
+                assert t is V.engine.sock
+                assert await transport.is_transport_active(V.original_message, t)
+
+                await transport.write(t, b"hello", V.original_message)
+                await done
+                assert received == [b"hello"]
+
+                # Closing the transport doesn't close the shared socket
+                await transport.close()
+                assert V.engine.sock is t
+            finally:
+                V.engine.close()
+                await device.finish()
+
+            assert not await transport.is_transport_active(V.original_message, t)
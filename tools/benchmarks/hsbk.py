@@ -0,0 +1,76 @@
+"""
+Compare turning HSBK colours into bytes with encode_colors against fill and ColorCache.
+
+Usage::
+
+    $ python tools/benchmarks/hsbk.py [--number 2000]
+"""
+from photons_canvas.points.simple_messages import encode_colors, fill, ColorCache
+
+import argparse
+import random
+import timeit
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def random_colors(count):
+    return [
+        (random.random() * 360, random.random(), random.random(), random.randrange(1500, 9000))
+        for _ in range(count)
+    ]
+
+
+def per_second(func, number):
+    return number / timeit.timeit(func, number=number)
+
+
+def measure(name, size, number):
+    if name == "random":
+        # New colours every time so the ColorCache doesn't already know them
+        batches = [random_colors(size) for _ in range(number)]
+    else:
+        batches = [[(100, 1, 0.5, 3500)] * size] * number
+
+    def with_cache():
+        colors = next(cached)
+        return b"".join(fill(c) for c in colors)
+
+    def with_encode():
+        return encode_colors(next(encoded))
+
+    ColorCache.clear()
+    cached = iter(batches)
+    encoded = iter(batches)
+
+    yield "list", per_second(with_cache, number), per_second(with_encode, number)
+
+    if np is not None:
+        ColorCache.clear()
+        cached = iter(batches)
+        encoded = iter([np.array(colors, dtype=float) for colors in batches])
+        yield "array", per_second(with_cache, number), per_second(with_encode, number)
+
+
+def main(number):
+    if np is None:
+        print("numpy is not installed, encode_colors uses fill for each colour")
+
+    print(f"{'colours':<16} {'input':>6} {'ColorCache':>12} {'encode':>12} {'speedup':>8}")
+
+    for size in (64, 82):
+        for name in ("random", "repeated"):
+            for kind, slow, fast in measure(name, size, number):
+                print(
+                    f"{f'{size} {name}':<16} {kind:>6} {slow:>10.0f}/s {fast:>10.0f}/s"
+                    f" {fast / slow:>7.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--number", type=int, default=2000, help="iterations per measurement")
+    main(parser.parse_args().number)
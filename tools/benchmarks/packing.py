@@ -0,0 +1,88 @@
+"""
+Compare pack/unpack throughput of the compiled codec with packing field by field.
+
+Usage::
+
+    $ python tools/benchmarks/packing.py [--number 2000]
+"""
+from photons_messages import LightMessages, TileMessages, MultiZoneMessages
+from photons_protocol.codec import PacketCodec
+
+from unittest import mock
+import argparse
+import timeit
+
+
+def messages():
+    colors = [
+        {"hue": i * 4, "saturation": 1, "brightness": 0.5, "kelvin": 3500} for i in range(82)
+    ]
+
+    yield LightMessages.SetColor(
+        hue=100,
+        saturation=1,
+        brightness=0.5,
+        kelvin=3500,
+        duration=1,
+        source=1,
+        sequence=1,
+        target="d073d5000001",
+    )
+
+    yield TileMessages.Set64(
+        tile_index=0,
+        length=1,
+        x=0,
+        y=0,
+        width=8,
+        duration=0,
+        colors=colors[:64],
+        source=1,
+        sequence=1,
+        target="d073d5000001",
+    )
+
+    yield MultiZoneMessages.StateExtendedColorZones(
+        zones_count=82,
+        zone_index=0,
+        colors_count=82,
+        colors=colors,
+        source=1,
+        sequence=1,
+        target="d073d5000001",
+    )
+
+
+def per_second(func, number):
+    return number / timeit.timeit(func, number=number)
+
+
+def measure(msg, number):
+    kls = type(msg)
+    bts = msg.tobytes(None)
+
+    def pack():
+        msg.tobytes(None)
+
+    def unpack():
+        kls.create(bts)
+
+    return per_second(pack, number), per_second(unpack, number)
+
+
+def main(number):
+    print(f"{'message':<26} {'':>8} {'field by field':>16} {'compiled':>12} {'speedup':>8}")
+
+    for msg in messages():
+        with mock.patch.object(PacketCodec, "for_kls", lambda *a: None):
+            slow = measure(msg, number)
+        fast = measure(msg, number)
+
+        for name, s, f in zip(("pack/s", "unpack/s"), slow, fast):
+            print(f"{msg.__class__.__name__:<26} {name:>8} {s:>16.0f} {f:>12.0f} {f / s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--number", type=int, default=2000, help="iterations per measurement")
+    main(parser.parse_args().number)